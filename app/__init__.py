@@ -1,13 +1,26 @@
 """FastAPI应用初始化 - MVC架构"""
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 # 导入配置
 from app.settings.config import config
 
+# 全局日志配置（仅在此处配置一次，各模块通过logging.getLogger(__name__)获取记录器）
+logging.basicConfig(
+    level=config.LOG_LEVEL,
+    format="%(asctime)s %(levelname)s %(name)s %(message)s"
+)
+logger = logging.getLogger(__name__)
+
 # 导入数据库配置和操作
 from app.database import init_db, close_db, check_database_connection
+from app.agents.agents import close_http_client
+from app.agents.mcp_tool import close_pdf_renderer
+from app.utils.chart_generator import get_chart_process_pool, shutdown_chart_process_pool
 
 # 导入API路由和响应函数
 from app.api import api_router
@@ -17,20 +30,26 @@ from app.settings.response import success_response
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时
-    print("正在检查数据库连接...")
+    # 启动时：先初始化一次，再用SELECT 1确认连接可用
+    logger.info("正在初始化数据库连接...")
+    await init_db()
+    logger.info("数据库连接初始化完成")
+    
+    logger.info("正在检查数据库连接...")
     db_available = await check_database_connection()
     if not db_available:
-        print("警告: 数据库连接失败")
+        logger.warning("数据库连接失败")
     
-    print("正在初始化数据库连接...")
-    await init_db()
-    print("数据库连接初始化完成")
+    # 图表渲染进程池，避免matplotlib渲染阻塞事件循环
+    app.state.chart_pool = get_chart_process_pool()
     yield
     # 关闭时
-    print("正在关闭数据库连接...")
+    logger.info("正在关闭数据库连接...")
     await close_db()
-    print("数据库连接已关闭")
+    logger.info("数据库连接已关闭")
+    await close_http_client()
+    shutdown_chart_process_pool()
+    await asyncio.to_thread(close_pdf_renderer)
 
 
 # 初始化FastAPI应用，启用API文档接口
@@ -39,18 +58,24 @@ fastapi_app = FastAPI(
     description="智能消费分析助手应用 - FastAPI + Tortoise ORM架构",
     version="1.0.0",
     lifespan=lifespan,  # 添加生命周期管理
+    default_response_class=ORJSONResponse,  # 使用orjson序列化响应
     docs_url="/docs",  # Swagger UI文档地址
     redoc_url="/redoc",  # ReDoc文档地址
     debug=config.DEBUG
 )
 
-# 配置CORS
+# 配置CORS：ALLOW_ORIGINS为逗号分隔的来源列表，启动时解析一次
+allow_origins = [origin.strip() for origin in config.ALLOW_ORIGINS.split(",") if origin.strip()]
+if "*" in allow_origins:
+    allow_origins = ["*"]
+
 fastapi_app.add_middleware(
     CORSMiddleware,
-    allow_origins=[config.ALLOW_ORIGINS],  # 从配置中读取
+    allow_origins=allow_origins,  # 从配置中读取
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],  # 显式列出方法，预检响应头可预先生成
     allow_headers=["*"],
+    max_age=config.CORS_MAX_AGE,  # 浏览器缓存预检结果的秒数
 )
 
 # 注册API路由
@@ -74,11 +99,5 @@ async def health_check():
 
 # 控制器将通过单独的路由模块注册，避免循环导入
 
-# 导入数据库配置
-from app.database import check_database_connection
-
-# 导入模型模块（目前为空）
-import app.models
-
 # 导出FastAPI应用实例
 app = fastapi_app
\ No newline at end of file
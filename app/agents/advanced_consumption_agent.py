@@ -1,58 +1,63 @@
 """高级消费分析Agent - 支持自定义分析需求和自主工具调用"""
 import os
-import json
-from typing import List, Dict, Any, Optional
+import re
+import logging
+import asyncio
+import functools
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional, Pattern, Tuple, ClassVar
 from datetime import datetime, timedelta, date
-from app.models.consumption import Consumption
+import httpx
+import numpy as np
+import orjson
+import pandas as pd
+from app.models.consumption import Consumption, ConsumptionView
+from app.agents.agents import agenerate
 from app.agents.base_agent import BaseAgent
-from app.agents.consumption_mcp_tool import get_consumption_mcp_tool
+from app.agents.consumption_mcp_tool import REASONABLE_RATIOS, get_consumption_mcp_tool
 from app.dao.consumption_dao import ConsumptionDAO
+from app.utils.chart_generator import render_all_charts, to_chart_record
+from app.utils.date_utils import parse_date
 
+logger = logging.getLogger(__name__)
 
-class AdvancedConsumptionAgent(BaseAgent):
-    """
-    高级消费分析Agent
-    支持用户自定义分析需求、时间范围、自动规划和工具调用
-    """
-    
-    def __init__(self):
-        """
-        初始化高级消费分析Agent
-        """
-        super().__init__("消费分析专家")
-        
-        # 初始化MCP工具
-        self.mcp_tool = get_consumption_mcp_tool()
-        
-        # 添加提示词模板
-        self._init_prompt_templates()
-        
-        # 注册工具
-        self._register_tools()
-        
-        # 初始化DAO
-        self.consumption_dao = ConsumptionDAO()
-        
-        # 初始化工作目录
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        workspace_dir = os.path.normpath(os.path.join(current_dir, '..', '..', 'workspace'))
-        
-        # 初始化图表生成器
-        from app.utils.chart_generator import get_chart_generator
-        self.chart_generator = get_chart_generator(workspace_dir)
-        
-        # 初始化动态图表生成器
-        from app.utils.dynamic_chart_generator import DynamicChartGenerator
-        self.dynamic_chart_generator = DynamicChartGenerator(workspace_dir)
-    
-    def _init_prompt_templates(self):
-        """
-        初始化提示词模板
-        """
-        # 自定义分析提示词模板
-        self.add_prompt_template(
-            "custom_analysis",
-            """
+# 工作目录在导入时计算并创建一次
+WORKSPACE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'workspace'))
+os.makedirs(WORKSPACE_DIR, exist_ok=True)
+
+
+# 各工具读取和写入的共享数据键，用于推导任务之间的依赖关系
+TOOL_DATA_DEPENDENCIES = {
+    "fetch_consumption_data": ((), ("consumptions",)),
+    "filter_data": (("consumptions",), ("consumptions",)),
+    "generate_charts": (("consumptions",), ("chart_paths",)),
+    "analyze_data": (("consumptions",), ("analysis_result",)),
+    "generate_suggestions": (("analysis_result",), ("suggestions",)),
+    "market_research": ((), ("market_info",)),
+    "generate_report": (("analysis_result", "chart_paths"), ("report_paths",)),
+}
+
+# 模拟市场调研数据（模块级只读常量，避免每次调用重建；合理消费占比与MCP工具共用一份）
+_RESEARCH_DATA = MappingProxyType({
+    "合理消费占比参考": REASONABLE_RATIOS,
+    "季节性消费趋势": "冬季娱乐消费通常增加15-20%",
+    "年度消费建议": "建议每月储蓄收入的20-30%"
+})
+
+# 写入分析提示词的最大消费记录数
+MAX_PROMPT_RECORDS = 500
+
+# 失败时需要短路下游任务的关键工具
+CRITICAL_TOOLS = frozenset({"fetch_consumption_data"})
+
+# 产出消费数据的工具，结果为空时同样短路下游任务
+DATA_SOURCE_TOOLS = frozenset({"fetch_consumption_data", "filter_data"})
+
+
+# 提示词模板（进程内常量，所有Agent实例共享）
+PROMPT_TEMPLATES = MappingProxyType({
+    # 自定义分析提示词模板
+    "custom_analysis": """
             请根据用户的分析需求和以下消费记录数据，进行个性化分析：
             
             用户分析需求：{analysis_needs}
@@ -67,13 +72,9 @@ class AdvancedConsumptionAgent(BaseAgent):
             4. 可能的改进机会
             
             请使用清晰的结构和小标题，确保分析结果有针对性且实用。
-            """
-        )
-        
-        # 任务规划提示词模板
-        self.add_prompt_template(
-            "task_planning",
-            """
+            """,
+    # 任务规划提示词模板
+    "task_planning": """
             作为消费分析专家，请基于用户的分析需求生成详细的任务规划。
             
             用户需求：{analysis_needs}
@@ -88,14 +89,11 @@ class AdvancedConsumptionAgent(BaseAgent):
             3. 提供正确的工具参数格式
             4. 按照逻辑顺序排列
             
-            请严格按照JSON格式输出任务规划，只包含任务数组。
-            """
-        )
-        
-        # 数据筛选提示词模板
-        self.add_prompt_template(
-            "data_filtering",
-            """
+            只返回一个JSON对象，不要包含任何其他文字，格式如下：
+            {{"tasks": [{{"task_id": "1", "task_name": "任务描述", "tool": "工具名称", "params": {{}}}}]}}
+            """,
+    # 数据筛选提示词模板
+    "data_filtering": """
             用户分析需求：{analysis_needs}
             
             基于用户需求，请确定：
@@ -103,9 +101,119 @@ class AdvancedConsumptionAgent(BaseAgent):
             2. 是否需要添加额外的数据维度？
             3. 是否需要数据聚合方式？（如按日、周、月聚合）
             
-            请以JSON格式返回筛选条件和聚合方式。
+            只返回一个JSON对象，不要包含任何其他文字，格式如下：
+            {{"filters": {{"categories": [], "min_amount": null, "max_amount": null, "keywords": []}}, "aggregation": "day|week|month"}}
             """
-        )
+})
+
+
+# 默认任务规划：(任务ID, 任务名称, 工具, 需要从请求上下文填入的参数名)
+DEFAULT_PLAN: Tuple[Tuple[str, str, str, Tuple[str, ...]], ...] = (
+    ("1", "获取消费数据", "fetch_consumption_data", ("user_id", "start_date", "end_date")),
+    ("2", "生成可视化图表", "generate_charts", ()),
+    ("3", "进行个性化分析", "analyze_data", ("analysis_needs",)),
+    ("4", "生成最终报告", "generate_report", ("user_id", "start_date", "end_date")),
+)
+
+
+def _build_default_plan(context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    根据请求上下文填充默认任务规划
+    
+    Args:
+        context: 包含user_id、start_date、end_date、analysis_needs的字典
+    
+    Returns:
+        任务规划列表（每次返回新对象，后续流程可以原地修改）
+    """
+    return [
+        {
+            "task_id": task_id,
+            "task_name": task_name,
+            "tool": tool,
+            "params": {key: context[key] for key in param_keys}
+        }
+        for task_id, task_name, tool, param_keys in DEFAULT_PLAN
+    ]
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_keyword_pattern(keywords: Tuple[str, ...]) -> Optional[Pattern[str]]:
+    """
+    将关键词列表编译为单个小写正则（按关键词组合缓存）
+    
+    Args:
+        keywords: 关键词元组
+    
+    Returns:
+        编译后的正则，关键词为空时返回None
+    """
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(keyword.lower()) for keyword in keywords))
+
+
+def _push_down_filters(plan: List[Dict[str, Any]]):
+    """
+    将紧跟在fetch_consumption_data之后的filter_data筛选条件合并到获取任务的参数中
+    筛选任务本身保留（对已筛选的数据再执行一次结果不变）
+    
+    Args:
+        plan: 任务规划列表（原地修改）
+    """
+    for current, following in zip(plan, plan[1:]):
+        if current.get("tool") != "fetch_consumption_data" or following.get("tool") != "filter_data":
+            continue
+        filter_params = following.get("params", {}) or following.get("tool_params", {})
+        filters = filter_params.get("filters") if isinstance(filter_params, dict) else None
+        # 只下推字典形式的筛选条件，格式异常时仍只影响非关键的筛选任务，不拖累数据获取
+        if not filters or not isinstance(filters, dict):
+            continue
+        params_key = "params" if current.get("params") or "tool_params" not in current else "tool_params"
+        current[params_key] = {**(current.get(params_key) or {}), "filters": filters}
+
+
+class AdvancedConsumptionAgent(BaseAgent):
+    """
+    高级消费分析Agent
+    支持用户自定义分析需求、时间范围、自动规划和工具调用
+    """
+    
+    # 工具信息JSON在进程内只计算一次，所有实例共享
+    _tools_info_cache: ClassVar[Optional[str]] = None
+    
+    def __init__(self):
+        """
+        初始化高级消费分析Agent
+        """
+        super().__init__("消费分析专家")
+        
+        # 初始化MCP工具
+        self.mcp_tool = get_consumption_mcp_tool()
+        
+        # 添加提示词模板
+        self._init_prompt_templates()
+        
+        # 注册工具
+        self._register_tools()
+        
+        # 初始化DAO
+        self.consumption_dao = ConsumptionDAO()
+        
+        # 初始化图表生成器
+        from app.utils.chart_generator import get_chart_generator
+        self.chart_generator = get_chart_generator(WORKSPACE_DIR)
+        
+        # 初始化动态图表生成器
+        from app.utils.dynamic_chart_generator import DynamicChartGenerator
+        self.dynamic_chart_generator = DynamicChartGenerator(WORKSPACE_DIR)
+    
+    def _init_prompt_templates(self):
+        """
+        初始化提示词模板
+        """
+        for key, template in PROMPT_TEMPLATES.items():
+            self.add_prompt_template(key, template)
     
     def _register_tools(self):
         """
@@ -125,8 +233,12 @@ class AdvancedConsumptionAgent(BaseAgent):
     
     def _get_tools_info(self):
         """
-        获取所有可用工具的详细信息，用于提示词模板
+        获取所有可用工具的详细信息，用于提示词模板（结果缓存在类上）
         """
+        cls = type(self)
+        if cls._tools_info_cache is not None:
+            return cls._tools_info_cache
+        
         tools_info = []
         for tool_name, tool_func in self.mcp_tool.available_tools.items():
             # 获取工具函数的文档字符串
@@ -160,11 +272,12 @@ class AdvancedConsumptionAgent(BaseAgent):
             }
             tools_info.append(tool_info)
         
-        return json.dumps(tools_info, ensure_ascii=False, indent=2)
+        cls._tools_info_cache = orjson.dumps(tools_info, option=orjson.OPT_INDENT_2).decode()
+        return cls._tools_info_cache
     
-    def plan(self, analysis_needs: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    async def plan(self, analysis_needs: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
         """
-        为用户需求生成任务规划
+        为用户需求生成任务规划（使用Ollama的JSON模式约束输出）
         
         Args:
             analysis_needs: 用户的分析需求
@@ -172,7 +285,7 @@ class AdvancedConsumptionAgent(BaseAgent):
             end_date: 结束日期
             
         Returns:
-            任务规划列表
+            任务规划列表，解析失败时返回空列表
         """
         # 使用LLM生成任务规划
         prompt = self.format_prompt(
@@ -183,18 +296,24 @@ class AdvancedConsumptionAgent(BaseAgent):
             tools_info=self.tools_info
         )
         
-        # 调用LLM生成任务规划
-        response = self.invoke_llm(prompt)
-        
+        # JSON模式下模型只会输出合法JSON，不再需要从文字中截取
         try:
-            # 解析JSON响应
-            plan = json.loads(response)
-            return plan
-        except json.JSONDecodeError:
-            # 如果解析失败，返回默认计划
+            response = await agenerate(prompt, format="json")
+            plan = orjson.loads(response)
+        except (orjson.JSONDecodeError, httpx.HTTPError) as e:
+            logger.warning(f"任务规划生成失败，使用默认计划: {str(e)}")
+            return []
+        
+        # JSON模式通常输出对象，兼容直接返回数组的情况
+        if isinstance(plan, dict):
+            plan = plan.get("tasks")
+        if not isinstance(plan, list) or not all(isinstance(task, dict) for task in plan):
+            logger.warning("任务规划格式不正确，使用默认计划")
             return []
+        return plan
             
-    async def fetch_consumption_data(self, user_id: int, start_date: str, end_date: str) -> List[Consumption]:
+    async def fetch_consumption_data(self, user_id: int, start_date: str, end_date: str,
+                                     filters: Dict[str, Any] = None) -> List[ConsumptionView]:
         """
         获取消费数据（异步方法）
         
@@ -202,17 +321,26 @@ class AdvancedConsumptionAgent(BaseAgent):
             user_id: 用户ID
             start_date: 开始日期 (YYYY-MM-DD)
             end_date: 结束日期 (YYYY-MM-DD)
+            filters: 筛选条件（可选），与filter_data相同，直接下推到数据库查询
         
         Returns:
             消费记录列表
         """
         # 转换日期字符串为日期对象
-        start = datetime.strptime(start_date, "%Y-%m-%d").date()
-        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+        start = parse_date(start_date)
+        end = parse_date(end_date)
+        filters = filters or {}
         
         # 从数据库获取数据（异步调用）
         # 使用正确的方法名get_by_date_range并使用await
-        consumptions = await self.consumption_dao.get_by_date_range(user_id, start, end)
+        # 只查询分析需要的字段，返回轻量只读视图而非完整ORM对象
+        consumptions = await self.consumption_dao.get_views_by_date_range(
+            user_id, start, end,
+            categories=filters.get("categories"),
+            min_amount=filters.get("min_amount"),
+            max_amount=filters.get("max_amount"),
+            keywords=filters.get("keywords")
+        )
         
         # 添加到记忆
         self.add_memory({
@@ -239,38 +367,53 @@ class AdvancedConsumptionAgent(BaseAgent):
         if not filters:
             return consumptions
         
-        filtered = []
-        for consumption in consumptions:
-            match = True
-            
-            # 按类别筛选
-            if "categories" in filters and consumption.category not in filters["categories"]:
-                match = False
-            
-            # 按金额范围筛选
-            if "min_amount" in filters and consumption.amount < filters["min_amount"]:
-                match = False
-            if "max_amount" in filters and consumption.amount > filters["max_amount"]:
-                match = False
-            
-            # 按描述关键词筛选
-            if "keywords" in filters:
-                keywords_match = False
-                for keyword in filters["keywords"]:
-                    if keyword.lower() in consumption.description.lower():
-                        keywords_match = True
-                        break
-                if not keywords_match:
-                    match = False
-            
-            if match:
-                filtered.append(consumption)
+        if not consumptions:
+            return []
         
-        return filtered
+        # 一次性构建DataFrame，所有筛选条件以向量化掩码完成
+        df = pd.DataFrame({
+            "category": [consumption.category for consumption in consumptions],
+            "amount": [float(consumption.amount) for consumption in consumptions],
+            # 消费模型没有描述字段时使用商户名，与数据库下推的关键词条件保持一致
+            "description": [
+                getattr(consumption, 'description', None) or consumption.merchant_name or ''
+                for consumption in consumptions
+            ]
+        })
+        mask = np.ones(len(df), dtype=bool)
+        
+        # 预先取出筛选条件，避免重复字典查找
+        categories = filters.get("categories")
+        # 计划中的金额上下限可能为null，视为不限
+        min_amount = filters.get("min_amount")
+        max_amount = filters.get("max_amount")
+        if min_amount is None:
+            min_amount = -np.inf
+        if max_amount is None:
+            max_amount = np.inf
+        keywords = filters.get("keywords")
+        
+        # 按类别筛选
+        if categories is not None:
+            mask &= df["category"].isin(categories).to_numpy()
+        
+        # 按金额范围筛选
+        if min_amount != -np.inf or max_amount != np.inf:
+            mask &= df["amount"].between(min_amount, max_amount).to_numpy()
+        
+        # 按描述关键词筛选（描述只转一次小写，所有关键词合并为一个预编译正则）
+        if keywords is not None:
+            pattern = _compile_keyword_pattern(tuple(keywords))
+            if pattern is not None:
+                mask &= df["description"].str.lower().str.contains(pattern, regex=True).to_numpy()
+            else:
+                mask[:] = False
+        
+        return [consumption for consumption, keep in zip(consumptions, mask) if keep]
     
-    def generate_charts(self, consumptions: List[Consumption], analysis_needs: str = None) -> Dict[str, str]:
+    async def generate_charts(self, consumptions: List[Consumption], analysis_needs: str = None) -> Dict[str, str]:
         """
-        生成图表
+        生成图表（异步方法，渲染在事件循环之外进行）
         
         Args:
             consumptions: 消费记录
@@ -281,19 +424,22 @@ class AdvancedConsumptionAgent(BaseAgent):
         """
         # 如果有分析需求，使用动态图表生成
         if analysis_needs and self.dynamic_chart_generator:
-            print(f"使用动态图表生成器，根据需求：{analysis_needs}")
+            logger.info(f"使用动态图表生成器，根据需求：{analysis_needs}")
             try:
-                # 生成符合分析需求的图表
-                chart_paths = self.dynamic_chart_generator.generate_charts_by_needs(
+                # 生成符合分析需求的图表（依赖LLM客户端，无法跨进程，放到线程中执行）
+                chart_paths = await asyncio.to_thread(
+                    self.dynamic_chart_generator.generate_charts_by_needs,
                     consumptions, analysis_needs
                 )
                 return chart_paths
             except Exception as e:
-                print(f"动态图表生成失败，回退到默认图表: {str(e)}")
+                logger.warning(f"动态图表生成失败，回退到默认图表: {str(e)}")
                 # 出错时回退到默认图表生成
         
-        # 无分析需求或动态生成失败时，使用默认图表生成器
-        chart_paths = self.chart_generator.generate_all_charts(consumptions)
+        # 无分析需求或动态生成失败时，使用默认图表生成器，在进程池中渲染以绕开GIL
+        # ORM对象无法可靠地序列化，先投影为只包含绘图字段的轻量记录
+        records = [to_chart_record(consumption) for consumption in consumptions]
+        chart_paths = await render_all_charts(self.chart_generator.output_dir, records)
         return chart_paths
     
     def analyze_data(self, consumptions: List[Consumption], analysis_needs: str) -> str:
@@ -340,8 +486,11 @@ class AdvancedConsumptionAgent(BaseAgent):
         # 构建报告内容
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
+        # 报告内容按片段收集，最后一次性拼接
+        parts = []
+        
         # 基础信息部分
-        markdown_content = f"""
+        parts.append(f"""
 # 消费分析报告
 
 ## 基本信息
@@ -349,71 +498,60 @@ class AdvancedConsumptionAgent(BaseAgent):
 - **分析周期**: {start_date} 至 {end_date}
 - **生成时间**: {timestamp}
 
-"""
+""")
         
         # 添加分析结果部分
-        markdown_content += """
+        parts.append("""
 ## 分析结果
 
-"""
+""")
         
         # 添加图表部分
         if chart_paths:
-            markdown_content += """
+            parts.append("""
 ## 可视化图表
 
-"""
+""")
             
             # 处理不同类型的chart_paths
             try:
                 if isinstance(chart_paths, list):
                     # 如果是列表，使用默认图表名称
                     chart_types = ['消费类别分布', '消费趋势分析', '收支总览']
-                    for i, chart_path in enumerate(chart_paths):
-                        chart_type = chart_types[i] if i < len(chart_types) else f'图表{i+1}'
-                        chart_filename = os.path.basename(chart_path)
-                        # 确保图表引用路径包含charts前缀
-                        markdown_content += f"""
-### {chart_type}
-
-![{chart_type}](charts/{chart_filename})
-
-"""
+                    chart_items = (
+                        (chart_types[i] if i < len(chart_types) else f'图表{i+1}', chart_path)
+                        for i, chart_path in enumerate(chart_paths)
+                    )
                 elif isinstance(chart_paths, dict):
                     # 如果是字典，使用键作为图表类型
-                    for chart_type, chart_path in chart_paths.items():
-                        chart_filename = os.path.basename(chart_path)
-                        # 确保图表引用路径包含charts前缀
-                        markdown_content += f"""
-### {chart_type}
-
-![{chart_type}](charts/{chart_filename})
-
-"""
+                    chart_items = chart_paths.items()
                 else:
+                    chart_items = None
+                
+                if chart_items is None:
                     # 其他类型，添加警告
-                    markdown_content += "图表数据格式不正确\n\n"
+                    parts.append("图表数据格式不正确\n\n")
+                else:
+                    for chart_type, chart_path in chart_items:
+                        # 确保图表引用路径包含charts前缀
+                        parts.append(f"\n### {chart_type}\n\n![{chart_type}](charts/{os.path.basename(chart_path)})\n\n")
             except Exception as e:
                 # 捕获任何处理图表时的错误
-                markdown_content += f"处理图表时出错: {str(e)}\n\n"
+                parts.append(f"处理图表时出错: {str(e)}\n\n")
         
         # 添加分析结果部分
-        markdown_content += """
+        parts.append("""
 ## 详细分析
 
-"""
-        markdown_content += analysis_result or "暂无分析结果"
-        
-        # 确保工作目录存在
-        workspace_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'workspace')
-        if not os.path.exists(workspace_dir):
-            os.makedirs(workspace_dir)
+""")
+        parts.append(analysis_result or "暂无分析结果")
+        markdown_content = "".join(parts)
         
         # 保存并转换为PDF，使用更精确的时间戳确保文件名唯一
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]  # 包含毫秒
         # 强制使用时间戳格式，确保每个文件都有唯一名称
         filename_prefix = f"consumption_analysis_{user_id}_{start_date}_{end_date}_{timestamp}"
-        print(f"生成报告文件名前缀: {filename_prefix}")
+        logger.debug(f"生成报告文件名前缀: {filename_prefix}")
         
         try:
             # 使用项目中现有的MCP工具来生成PDF
@@ -426,17 +564,17 @@ class AdvancedConsumptionAgent(BaseAgent):
             markdown_path = result.get("md_path", "保存失败")
             pdf_path = result.get("pdf_path", "生成失败")
             
-            print(f"Markdown文件已保存: {markdown_path}")
-            print(f"PDF文件已生成: {pdf_path}")
+            logger.info(f"Markdown文件已保存: {markdown_path}")
+            logger.info(f"PDF文件已生成: {pdf_path}")
             
         except Exception as e:
-            print(f"生成报告失败: {e}")
+            logger.error(f"生成报告失败: {e}")
             # 如果MCP工具失败，回退到简单的Markdown保存
-            markdown_path = os.path.join(workspace_dir, f"{filename_prefix}.md")
+            markdown_path = os.path.join(WORKSPACE_DIR, f"{filename_prefix}.md")
             try:
-                with open(markdown_path, 'w', encoding='utf-8') as f:
+                with open(markdown_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
                     f.write(markdown_content)
-                print(f"回退到简单保存: {markdown_path}")
+                logger.info(f"回退到简单保存: {markdown_path}")
             except Exception:
                 markdown_path = "保存失败"
             pdf_path = "生成失败"
@@ -520,31 +658,20 @@ class AdvancedConsumptionAgent(BaseAgent):
         Returns:
             市场调研数据字典
         """
-        # 模拟市场调研数据
-        research_data = {
-            "合理消费占比参考": {
-                "食品餐饮": "25-30%",
-                "住房缴费": "20-35%",
-                "交通出行": "10-15%",
-                "娱乐休闲": "5-10%",
-                "购物消费": "10-20%",
-                "医疗健康": "5-8%",
-                "教育培训": "5-15%",
-                "其他支出": "5-10%"
-            },
-            "季节性消费趋势": "冬季娱乐消费通常增加15-20%",
-            "年度消费建议": "建议每月储蓄收入的20-30%"
-        }
-        
         # 如果指定了类别，只返回相关数据
         if category:
+            ratio = REASONABLE_RATIOS.get(category, "无特定参考值")
             result = {
                 "category": category,
-                "reasonable_ratio": research_data["合理消费占比参考"].get(category, "无特定参考值"),
-                "industry_standard": research_data["合理消费占比参考"].get(category, "无特定参考值")
+                "reasonable_ratio": ratio,
+                "industry_standard": ratio
             }
         else:
-            result = research_data
+            # 逐层复制只读常量（包括内层的占比表），返回值可序列化，修改也不影响共享数据
+            result = {
+                key: dict(value) if isinstance(value, Mapping) else value
+                for key, value in _RESEARCH_DATA.items()
+            }
         
         # 添加到记忆
         self.add_memory({
@@ -565,15 +692,116 @@ class AdvancedConsumptionAgent(BaseAgent):
         Returns:
             格式化的字符串
         """
-        lines = []
-        for consumption in consumptions:
-            # 使用模型中实际存在的字段名
-            line = f"交易时间: {consumption.transaction_time}, 类别: {consumption.category}, "
-            line += f"金额: {consumption.amount}元, 交易类型: {consumption.transaction_type}, "
-            line += f"商户名称: {consumption.merchant_name}"
-            lines.append(line)
+        total_count = len(consumptions)
+        if total_count > MAX_PROMPT_RECORDS:
+            # 记录过多时只保留金额最高的部分，保持原有顺序，控制提示词长度
+            top = set(sorted(range(total_count), key=lambda i: consumptions[i].amount, reverse=True)[:MAX_PROMPT_RECORDS])
+            consumptions = [consumption for i, consumption in enumerate(consumptions) if i in top]
+        
+        # 使用模型中实际存在的字段名，每条记录只构造一次字符串
+        formatted = "\n".join(
+            f"交易时间: {c.transaction_time}, 类别: {c.category}, 金额: {c.amount}元, "
+            f"交易类型: {c.transaction_type}, 商户名称: {c.merchant_name}"
+            for c in consumptions
+        )
+        if total_count > MAX_PROMPT_RECORDS:
+            formatted += f"\n（共{total_count}条记录，仅列出金额最高的{MAX_PROMPT_RECORDS}条）"
+        return formatted
+    
+    async def _execute_task(self, task: Dict[str, Any], data_deps, order_deps,
+                            execution_status: Dict[str, Any], result_data: Dict[str, Any],
+                            user_id: int, start_date: str, end_date: str, analysis_needs: str) -> bool:
+        """
+        等待依赖任务完成后执行单个任务，同步工具放到线程池中运行以免阻塞事件循环
+        
+        Args:
+            task: 任务字典
+            data_deps: 提供本任务输入数据的任务集合
+            order_deps: 仅需保证执行顺序的任务集合
+            execution_status: 任务执行状态字典
+            result_data: 任务间共享的结果数据
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            analysis_needs: 用户的分析需求
+        
+        Returns:
+            下游任务是否可以继续执行
+        """
+        data_ready = all(await asyncio.gather(*data_deps))
+        if order_deps:
+            await asyncio.gather(*order_deps)
+        
+        task_id = task.get("task_id", task.get("id"))
+        task_name = task.get("task_name", task.get("description"))
+        tool_name = task.get("tool")
+        params = task.get("params", {}) or task.get("tool_params", {})
         
-        return "\n".join(lines)
+        # 关键任务失败或没有数据时，跳过依赖其结果的任务，避免无意义的LLM调用
+        if not data_ready:
+            logger.info(f"跳过任务 {task_id}: 上游任务失败或没有数据")
+            execution_status[task_id] = "跳过: 上游任务失败或没有数据"
+            return False
+        
+        try:
+            logger.debug(f"执行任务 {task_id}: {task_name}")
+            
+            # 根据工具名称调用相应的方法
+            if tool_name == "fetch_consumption_data":
+                # 获取消费数据
+                params = {**params, "user_id": user_id, "start_date": start_date, "end_date": end_date}
+                consumptions = await self.fetch_consumption_data(**params)
+                result_data["consumptions"] = consumptions
+                
+            elif tool_name == "filter_data":
+                # 过滤数据
+                params = {**params, "consumptions": result_data.get("consumptions", [])}
+                filtered_consumptions = self.filter_data(**params)
+                result_data["consumptions"] = filtered_consumptions
+                
+            elif tool_name == "generate_charts":
+                # 生成图表（添加分析需求参数以支持动态图表生成）
+                params = {**params, "consumptions": result_data.get("consumptions", []), "analysis_needs": analysis_needs}
+                chart_paths = await self.generate_charts(**params)
+                result_data["chart_paths"] = chart_paths
+                
+            elif tool_name == "analyze_data":
+                # 分析数据
+                params = {**params, "consumptions": result_data.get("consumptions", []), "analysis_needs": analysis_needs}
+                analysis_result = await asyncio.to_thread(self.analyze_data, **params)
+                result_data["analysis_result"] = analysis_result
+                
+            elif tool_name == "generate_suggestions":
+                # 生成建议
+                params = {**params, "analysis_result": result_data.get("analysis_result", "")}
+                suggestions = await asyncio.to_thread(self.generate_suggestions, **params)
+                result_data["suggestions"] = suggestions
+                
+            elif tool_name == "market_research":
+                # 市场研究
+                market_info = self.market_research(**params)
+                result_data["market_info"] = market_info
+                
+            elif tool_name == "generate_report":
+                # 生成报告
+                params = {**params, "analysis_result": result_data.get("analysis_result", ""), 
+                         "chart_paths": result_data.get("chart_paths", {}), "user_id": user_id}
+                report_paths = await asyncio.to_thread(self.generate_report, **params)
+                result_data["report_paths"] = report_paths
+            
+            # 更新任务执行状态
+            execution_status[task_id] = "成功"
+            
+        except Exception as e:
+            logger.error(f"任务 {task_id} 执行失败: {str(e)}")
+            execution_status[task_id] = f"失败: {str(e)}"
+            return tool_name not in CRITICAL_TOOLS
+        
+        # 获取或筛选后没有任何消费记录时，下游分析没有意义
+        if tool_name in DATA_SOURCE_TOOLS and not result_data.get("consumptions"):
+            result_data["message"] = "该时间范围内没有消费记录"
+            return False
+        return True
     
     async def analyze_by_custom_needs(self, user_id: int, start_date: str, end_date: str, 
                                analysis_needs: str) -> Dict[str, Any]:
@@ -590,111 +818,52 @@ class AdvancedConsumptionAgent(BaseAgent):
             分析结果字典
         """
         # 生成任务规划
-        plan = self.plan(analysis_needs, start_date, end_date)
+        plan = await self.plan(analysis_needs, start_date, end_date)
         
         # 确保有任务规划
         if not plan:
             # 使用默认任务规划
-            plan = [
-                {
-                    "task_id": "1",
-                    "task_name": "获取消费数据",
-                    "tool": "fetch_consumption_data",
-                    "params": {
-                        "user_id": user_id,
-                        "start_date": start_date,
-                        "end_date": end_date
-                    }
-                },
-                {
-                    "task_id": "2",
-                    "task_name": "生成可视化图表",
-                    "tool": "generate_charts",
-                    "params": {}
-                },
-                {
-                    "task_id": "3",
-                    "task_name": "进行个性化分析",
-                    "tool": "analyze_data",
-                    "params": {
-                        "analysis_needs": analysis_needs
-                    }
-                },
-                {
-                    "task_id": "4",
-                    "task_name": "生成最终报告",
-                    "tool": "generate_report",
-                    "params": {
-                        "user_id": user_id,
-                        "start_date": start_date,
-                        "end_date": end_date
-                    }
-                }
-            ]
+            plan = _build_default_plan({
+                "user_id": user_id,
+                "start_date": start_date,
+                "end_date": end_date,
+                "analysis_needs": analysis_needs
+            })
         
         # 初始化任务执行状态
         execution_status = {}
         result_data = {}
         
-        # 执行任务规划
+        # 紧随数据获取的筛选条件下推到数据库查询，减少需要实例化的记录
+        _push_down_filters(plan)
+        
+        # 按数据依赖构建任务图：无依赖关系的任务（如图表生成与数据分析）并发执行
+        scheduled = []
+        last_writer = {}  # 数据键 -> 最近一次写入该键的任务
+        readers = {}  # 数据键 -> 最近一次写入之后读取该键的任务
         for task in plan:
-            task_id = task.get("task_id", task.get("id"))
-            task_name = task.get("task_name", task.get("description"))
-            tool_name = task.get("tool")
-            params = task.get("params", {}) or task.get("tool_params", {})
+            reads, writes = TOOL_DATA_DEPENDENCIES.get(task.get("tool"), ((), ()))
+            data_deps = {last_writer[key] for key in reads if key in last_writer}
+            order_deps = set()
+            for key in writes:
+                if key in last_writer:
+                    order_deps.add(last_writer[key])
+                order_deps.update(readers.get(key, ()))
             
-            try:
-                print(f"执行任务 {task_id}: {task_name}")
-                
-                # 根据工具名称调用相应的方法
-                if tool_name == "fetch_consumption_data":
-                    # 获取消费数据
-                    params = {**params, "user_id": user_id, "start_date": start_date, "end_date": end_date}
-                    consumptions = await self.fetch_consumption_data(**params)
-                    result_data["consumptions"] = consumptions
-                    
-                elif tool_name == "filter_data":
-                    # 过滤数据
-                    params = {**params, "consumptions": result_data.get("consumptions", [])}
-                    filtered_consumptions = self.filter_data(**params)
-                    result_data["consumptions"] = filtered_consumptions
-                    
-                elif tool_name == "generate_charts":
-                    # 生成图表（添加分析需求参数以支持动态图表生成）
-                    params = {**params, "consumptions": result_data.get("consumptions", []), "analysis_needs": analysis_needs}
-                    chart_paths = self.generate_charts(**params)
-                    result_data["chart_paths"] = chart_paths
-                    
-                elif tool_name == "analyze_data":
-                    # 分析数据
-                    params = {**params, "consumptions": result_data.get("consumptions", []), "analysis_needs": analysis_needs}
-                    analysis_result = self.analyze_data(**params)
-                    result_data["analysis_result"] = analysis_result
-                    
-                elif tool_name == "generate_suggestions":
-                    # 生成建议
-                    params = {**params, "analysis_result": result_data.get("analysis_result", "")}
-                    suggestions = self.generate_suggestions(**params)
-                    result_data["suggestions"] = suggestions
-                    
-                elif tool_name == "market_research":
-                    # 市场研究
-                    market_info = self.market_research(**params)
-                    result_data["market_info"] = market_info
-                    
-                elif tool_name == "generate_report":
-                    # 生成报告
-                    params = {**params, "analysis_result": result_data.get("analysis_result", ""), 
-                             "chart_paths": result_data.get("chart_paths", {}), "user_id": user_id}
-                    report_paths = self.generate_report(**params)
-                    result_data["report_paths"] = report_paths
-                
-                # 更新任务执行状态
-                execution_status[task_id] = "成功"
-                
-            except Exception as e:
-                print(f"任务 {task_id} 执行失败: {str(e)}")
-                execution_status[task_id] = f"失败: {str(e)}"
+            scheduled_task = asyncio.ensure_future(self._execute_task(
+                task, data_deps, order_deps - data_deps, execution_status, result_data,
+                user_id, start_date, end_date, analysis_needs
+            ))
+            scheduled.append(scheduled_task)
+            
+            for key in reads:
+                readers.setdefault(key, []).append(scheduled_task)
+            for key in writes:
+                last_writer[key] = scheduled_task
+                readers[key] = []
+        
+        # 执行任务规划
+        await asyncio.gather(*scheduled)
                 
         # 构建最终结果
         final_result = {
@@ -1,7 +1,20 @@
 from langchain_ollama import OllamaLLM
 import os
+import asyncio
+import logging
+import hashlib
+import sqlite3
+import time
+import threading
+import functools
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+import httpx
 from app.settings.config import config
 
+logger = logging.getLogger(__name__)
+
 # 初始化本地部署的大模型（使用Ollama部署的qwen2.5:7b）
 llm = OllamaLLM(
     model=config.LLM_MODEL,  # 从配置中获取模型名称
@@ -9,6 +22,124 @@ llm = OllamaLLM(
     temperature=config.LLM_TEMPERATURE  # 从配置中获取温度参数
 )
 
+# 大模型响应缓存：按提示词的SHA-256摘要存储(写入时间, 响应)，LRU淘汰 + TTL过期
+_response_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+
+def _get_cached_response(key: str) -> Optional[str]:
+    """读取未过期的缓存响应，命中时刷新LRU顺序"""
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] < config.LLM_CACHE_TTL:
+            _response_cache.move_to_end(key)
+            return entry[1]
+        # 已过期，丢弃旧数据生成的响应
+        del _response_cache[key]
+        return None
+
+
+def _put_cached_response(key: str, response: str):
+    """写入缓存响应，超出容量时淘汰最久未使用的条目"""
+    with _response_cache_lock:
+        _response_cache[key] = (time.monotonic(), response)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > config.LLM_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+
+def invoke_cached(prompt: str) -> str:
+    """
+    调用大模型，相同提示词在TTL内直接返回缓存的响应
+    
+    Args:
+        prompt: 提示词
+    
+    Returns:
+        模型响应
+    """
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    response = _get_cached_response(key)
+    if response is None:
+        # 调用模型时不持有锁，避免阻塞其他线程
+        response = llm.invoke(prompt)
+        _put_cached_response(key, response)
+    return response
+
+
+async def ainvoke_cached(prompt: str) -> str:
+    """
+    异步调用大模型，与invoke_cached共享响应缓存
+    
+    Args:
+        prompt: 提示词
+    
+    Returns:
+        模型响应
+    """
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    response = _get_cached_response(key)
+    if response is None:
+        response = await llm.ainvoke(prompt)
+        _put_cached_response(key, response)
+    return response
+
+
+# 共享的Ollama异步HTTP客户端（惰性创建），复用连接池避免每次调用重新建立连接
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    获取共享的Ollama异步HTTP客户端
+    
+    Returns:
+        httpx.AsyncClient实例
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=config.LLM_BASE_URL,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            timeout=60
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """关闭共享的Ollama异步HTTP客户端"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def agenerate(prompt: str, format: Optional[str] = None) -> str:
+    """
+    通过共享连接池异步调用Ollama的/api/generate接口
+    
+    Args:
+        prompt: 提示词
+        format: 输出格式约束，传入"json"时Ollama会约束解码只生成合法JSON
+    
+    Returns:
+        模型生成的文本
+    """
+    payload = {
+        "model": config.LLM_MODEL,
+        "prompt": prompt,
+        "stream": False,
+        "options": {"temperature": config.LLM_TEMPERATURE}
+    }
+    if format:
+        payload["format"] = format
+    response = await get_http_client().post("/api/generate", json=payload)
+    response.raise_for_status()
+    return response.json()["response"]
+
+
 # 分类提示词模板
 classification_prompt = """
 请将以下商户名分类到给定的类别中，直接返回类别名称，不要添加任何其他解释或内容。
@@ -20,31 +151,150 @@ classification_prompt = """
 # 示例分类列表（根据实际业务需求调整）
 CATEGORIES = ["餐饮美食", "购物零售", "交通出行", "娱乐休闲", "医疗健康", "教育培训", "生活服务", "其他"]
 
-def classify_transaction(counterparty_name, categories_list):
-    """
-    使用大模型对单条交易记录进行分类
-    :param counterparty_name: 商户名
-    :param categories_list: 分类列表
-    :return: 分类字符串
-    """
-    # 1. 格式化提示词
-    prompt = classification_prompt.format(
+
+def _build_classification_prompt(counterparty_name, categories_list):
+    """格式化分类提示词"""
+    return classification_prompt.format(
         categories=", ".join(categories_list),
         counterparty=counterparty_name
     )
+
+
+def _normalize_category(response, categories_list):
+    """处理模型响应：如果模型返回了不在列表中的分类，则归为“其他”"""
+    predicted_category = response.strip()
+    if predicted_category not in categories_list:
+        predicted_category = "其他"
+    return predicted_category
+
+
+# 商户分类的持久化缓存（SQLite），跨进程复用已分类的商户结果
+CLASSIFICATION_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'workspace', 'merchant_category_cache.db'
+)
+_cache_conn: Optional[sqlite3.Connection] = None
+_cache_lock = threading.Lock()
+
+
+def _categories_key(categories_tuple: Tuple[str, ...]) -> str:
+    """分类列表的稳定摘要，分类列表变化时缓存自动失效"""
+    return hashlib.sha1("\x1f".join(categories_tuple).encode("utf-8")).hexdigest()
+
+
+def _get_cache_conn() -> sqlite3.Connection:
+    """获取（必要时创建）持久化缓存连接"""
+    global _cache_conn
+    if _cache_conn is None:
+        os.makedirs(os.path.dirname(CLASSIFICATION_CACHE_PATH), exist_ok=True)
+        _cache_conn = sqlite3.connect(CLASSIFICATION_CACHE_PATH, check_same_thread=False)
+        _cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS merchant_category ("
+            "name TEXT NOT NULL, categories_key TEXT NOT NULL, category TEXT NOT NULL, ts TEXT NOT NULL, "
+            "PRIMARY KEY (name, categories_key))"
+        )
+        _cache_conn.commit()
+    return _cache_conn
+
+
+def _load_cached_category(counterparty_name: str, categories_tuple: Tuple[str, ...]) -> Optional[str]:
+    """从持久化缓存读取分类结果，未命中或缓存不可用时返回None"""
+    try:
+        with _cache_lock:
+            row = _get_cache_conn().execute(
+                "SELECT category FROM merchant_category WHERE name = ? AND categories_key = ?",
+                (counterparty_name, _categories_key(categories_tuple))
+            ).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.warning(f"读取分类缓存失败: {e}")
+        return None
+
+
+def _store_cached_category(counterparty_name: str, categories_tuple: Tuple[str, ...], category: str):
+    """将分类结果写回持久化缓存"""
+    try:
+        with _cache_lock:
+            conn = _get_cache_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO merchant_category (name, categories_key, category, ts) VALUES (?, ?, ?, ?)",
+                (counterparty_name, _categories_key(categories_tuple), category, datetime.now().isoformat())
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"写入分类缓存失败: {e}")
+
+
+@functools.lru_cache(maxsize=100_000)
+def _classify_cached(counterparty_name: str, categories_tuple: Tuple[str, ...]) -> str:
+    """带进程内LRU缓存和持久化缓存的单条分类"""
+    cached = _load_cached_category(counterparty_name, categories_tuple)
+    if cached is not None:
+        return cached
+    
+    # 1. 格式化提示词
+    prompt = _build_classification_prompt(counterparty_name, categories_tuple)
     
     # 2. 调用大模型 - OllamaLLM直接返回字符串
     response = llm.invoke(prompt)
     
     # 3. 处理响应，确保返回结果在预定义的分类中
-    # 由于OllamaLLM直接返回字符串，不需要访问.content属性
-    predicted_category = response.strip()
+    category = _normalize_category(response, categories_tuple)
+    _store_cached_category(counterparty_name, categories_tuple, category)
+    return category
+
+
+def classify_transaction(counterparty_name, categories_list):
+    """
+    使用大模型对单条交易记录进行分类（结果按商户名缓存）
+    :param counterparty_name: 商户名
+    :param categories_list: 分类列表
+    :return: 分类字符串
+    """
+    return _classify_cached(counterparty_name, tuple(categories_list))
+
+
+async def classify_transaction_async(counterparty_name, categories_list):
+    """
+    使用大模型对单条交易记录进行分类（异步版本，复用共享连接池）
+    :param counterparty_name: 商户名
+    :param categories_list: 分类列表
+    :return: 分类字符串
+    """
+    categories_tuple = tuple(categories_list)
+    # sqlite读写是同步阻塞调用，放到线程中执行，不阻塞事件循环
+    cached = await asyncio.to_thread(_load_cached_category, counterparty_name, categories_tuple)
+    if cached is not None:
+        return cached
     
-    # 4. 做一个简单的后处理：如果模型返回了不在列表中的分类，则归为"其他"
-    if predicted_category not in categories_list:
-        predicted_category = "其他"
-        
-    return predicted_category
+    prompt = _build_classification_prompt(counterparty_name, categories_tuple)
+    response = await agenerate(prompt)
+    category = _normalize_category(response, categories_tuple)
+    await asyncio.to_thread(_store_cached_category, counterparty_name, categories_tuple, category)
+    return category
+
+
+async def classify_transactions(counterparty_names: List[str], categories_list: List[str],
+                                concurrency: int = 8) -> List[str]:
+    """
+    批量并发分类交易记录，重复的商户名只调用一次大模型
+    :param counterparty_names: 商户名列表
+    :param categories_list: 分类列表
+    :param concurrency: 最大并发请求数
+    :return: 与输入顺序一致的分类列表
+    """
+    # 去重（保持首次出现的顺序），相同商户只请求一次
+    unique_names = list(dict.fromkeys(counterparty_names))
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def _classify_one(name):
+        async with semaphore:
+            return await classify_transaction_async(name, categories_list)
+    
+    results = await asyncio.gather(*[_classify_one(name) for name in unique_names])
+    category_by_name = dict(zip(unique_names, results))
+    return [category_by_name[name] for name in counterparty_names]
+
 
 # 测试单条分类
 # result = classify_transaction("苹果官方商店", CATEGORIES)
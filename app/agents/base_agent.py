@@ -1,9 +1,76 @@
 """Agent基类模块 - 提供Agent的通用功能"""
 import os
+import re
+import mmap
+import sys
 import json
-from typing import Dict, Any, List, Optional
+import string
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, Callable
 from datetime import datetime
-from app.agents.agents import llm
+import orjson
+from app.agents.agents import invoke_cached, ainvoke_cached
+
+
+# 模型输出中JSON内容的起始位置（对象或数组）
+_JSON_START = re.compile(r"[\[{]")
+_JSON_DECODER = json.JSONDecoder()
+_FORMATTER = string.Formatter()
+
+
+def _compile_template(template: str) -> Callable[[Dict[str, Any]], str]:
+    """
+    预编译提示词模板：注册时拆分好字面量和占位符，格式化时只需按名称取值拼接
+    
+    Args:
+        template: str.format风格的模板字符串
+    
+    Returns:
+        接收参数字典、返回格式化结果的函数
+    """
+    pieces = []
+    for literal, field, spec, conversion in _FORMATTER.parse(template):
+        # 带格式说明、转换符或属性/索引访问的占位符交给str.format_map处理
+        if field is not None and (spec or conversion or not field.isidentifier()):
+            return template.format_map
+        pieces.append((literal, field))
+    pieces = tuple(pieces)
+    
+    def render(values: Dict[str, Any]) -> str:
+        return "".join(
+            literal if field is None else f"{literal}{values[field]}"
+            for literal, field in pieces
+        )
+    
+    return render
+
+
+
+def _strip_response(response: str) -> str:
+    """去掉模型响应首尾的空白，首尾字符都不是空白时直接返回原字符串，避免整串扫描和复制"""
+    if response and not response[0].isspace() and not response[-1].isspace():
+        return response
+    return response.strip()
+
+
+def _memory_row(timestamp: Optional[str], action: Optional[str], content: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将按列存储的一条记忆组装为字典
+    
+    Args:
+        timestamp: 时间戳
+        action: 动作类型（没有时为None）
+        content: 其余记忆内容
+    
+    Returns:
+        记忆字典
+    """
+    row = {"timestamp": timestamp}
+    if action is not None:
+        row["action"] = action
+    row.update(content)
+    return row
 
 
 class BaseAgent:
@@ -21,8 +88,14 @@ class BaseAgent:
         """
         self.agent_name = agent_name
         self.name = agent_name  # 添加name属性以确保子类可以访问
-        self.memory = []  # 简单的记忆存储
+        # 记忆按列存储：时间戳、动作类型和其余内容各一个列表，下标一一对应
+        self.memory_cols: Dict[str, List[Any]] = {"timestamp": [], "action": [], "content": []}
+        self._memory_file: Optional[str] = None  # 上次保存记忆的文件
+        self._flushed_upto = 0  # 已写入该文件的记忆条数
+        # execute_plan在工作线程中并行执行步骤，三列的追加和读取需要在锁内进行，保证下标对齐
+        self._memory_lock = threading.Lock()
         self.prompts = {}  # 提示词模板存储
+        self._compiled_prompts = {}  # 预编译的提示词模板
         self.tools = {}  # 可用工具存储
     
     def add_memory(self, content: Dict[str, Any]):
@@ -32,11 +105,41 @@ class BaseAgent:
         Args:
             content: 要存储的记忆内容，包含时间戳
         """
-        memory_item = {
-            "timestamp": datetime.now().isoformat(),
-            **content
-        }
-        self.memory.append(memory_item)
+        self._append_memory(datetime.now().isoformat(), content)
+    
+    def _append_memory(self, timestamp: Optional[str], content: Dict[str, Any]):
+        """
+        按列追加一条记忆，action单独成列，内容字典中不再重复保存该键
+        
+        Args:
+            timestamp: 时间戳
+            content: 记忆内容
+        """
+        rest = {key: value for key, value in content.items() if key != "action"}
+        with self._memory_lock:
+            self.memory_cols["timestamp"].append(timestamp)
+            self.memory_cols["action"].append(content.get("action"))
+            self.memory_cols["content"].append(rest)
+    
+    @property
+    def memory(self) -> List[Dict[str, Any]]:
+        """按行组装的全部记忆（兼容旧的列表格式）"""
+        return self.get_memory()
+    
+    @memory.setter
+    def memory(self, items: List[Dict[str, Any]]):
+        """从按行的记忆列表重建列存储"""
+        memory_cols = {"timestamp": [], "action": [], "content": []}
+        for item in items:
+            item = dict(item)
+            memory_cols["timestamp"].append(item.pop("timestamp", None))
+            memory_cols["action"].append(item.pop("action", None))
+            memory_cols["content"].append(item)
+        with self._memory_lock:
+            self.memory_cols = memory_cols
+            # 记忆被整体替换，下次保存时需要完整写入
+            self._memory_file = None
+            self._flushed_upto = 0
     
     def get_memory(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
@@ -48,9 +151,11 @@ class BaseAgent:
         Returns:
             记忆列表
         """
-        if limit:
-            return self.memory[-limit:]
-        return self.memory
+        with self._memory_lock:
+            columns = (self.memory_cols["timestamp"], self.memory_cols["action"], self.memory_cols["content"])
+            # 在锁内切片得到一致的快照（limit时只切片最后limit条）
+            columns = tuple(column[-limit:] if limit else column[:] for column in columns)
+        return [_memory_row(*row) for row in zip(*columns)]
     
     def add_prompt_template(self, key: str, template: str):
         """
@@ -60,7 +165,10 @@ class BaseAgent:
             key: 模板标识符
             template: 提示词模板字符串
         """
+        # 模板标识符驻留，后续查找走指针比较
+        key = sys.intern(key)
         self.prompts[key] = template
+        self._compiled_prompts[key] = _compile_template(template)
     
     def get_prompt_template(self, key: str) -> Optional[str]:
         """
@@ -85,9 +193,10 @@ class BaseAgent:
         Returns:
             格式化后的提示词
         """
-        template = self.get_prompt_template(key)
-        if template:
-            return template.format(**kwargs)
+        compiled = self._compiled_prompts.get(key)
+        if compiled:
+            # 模板已在注册时解析，这里只做取值和拼接
+            return compiled(kwargs)
         return None
     
     def invoke_llm(self, prompt: str) -> str:
@@ -100,8 +209,20 @@ class BaseAgent:
         Returns:
             模型响应
         """
-        response = llm.invoke(prompt)
-        return response.strip()
+        # 相同提示词在缓存有效期内不再重复请求模型
+        return _strip_response(invoke_cached(prompt))
+    
+    async def ainvoke_llm(self, prompt: str) -> str:
+        """
+        异步调用大语言模型
+        
+        Args:
+            prompt: 提示词
+        
+        Returns:
+            模型响应
+        """
+        return _strip_response(await ainvoke_cached(prompt))
     
     def register_tool(self, tool_name: str, tool_func):
         """
@@ -152,6 +273,7 @@ class BaseAgent:
         4. tool_params: 工具参数（如果需要）
         5. priority: 优先级（高、中、低）
         6. expected_result: 预期结果
+        7. depends_on: 依赖的任务ID列表（没有依赖时为空列表，无依赖的任务会并发执行）
         """
         
         # 调用模型生成计划
@@ -159,19 +281,23 @@ class BaseAgent:
         
         # 解析JSON响应
         try:
-            # 提取JSON部分
-            start_idx = plan_json.find('{')
-            end_idx = plan_json.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                plan_json = plan_json[start_idx:end_idx]
-            plan = json.loads(plan_json)
+            # 从第一个JSON起始符开始解析，忽略前面的说明文字
+            start = _JSON_START.search(plan_json)
+            start_idx = start.start() if start else 0
+            try:
+                # 常见情况：JSON之后没有多余内容，直接用orjson解析
+                plan = orjson.loads(plan_json[start_idx:])
+            except orjson.JSONDecodeError:
+                # JSON后面还有说明文字时，解析到对象/数组结束即停止
+                plan, _ = _JSON_DECODER.raw_decode(plan_json, start_idx)
             # 确保返回的是列表
-            if isinstance(plan, dict) and 'tasks' in plan:
-                return plan['tasks']
-            elif isinstance(plan, list):
-                return plan
-            else:
-                return [plan]
+            match plan:
+                case {"tasks": list() as tasks}:
+                    return tasks
+                case list():
+                    return plan
+                case _:
+                    return [plan]
         except Exception as e:
             print(f"解析计划失败: {e}")
             # 返回默认计划
@@ -184,33 +310,39 @@ class BaseAgent:
                 "expected_result": "完成基本任务"
             }]
     
-    def execute_plan(self, plan: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def execute_plan(self, plan: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
-        执行计划
+        执行计划，没有依赖关系的任务并发执行
         
         Args:
-            plan: 任务计划列表
+            plan: 任务计划列表，任务可通过depends_on声明依赖的前序任务ID
         
         Returns:
             执行结果
         """
         results = {}
+        scheduled = {}
+        pending = []
         
-        for task in plan:
+        async def _run(task: Dict[str, Any], upstream: List[asyncio.Future]):
             task_id = task.get('id', 'unknown')
             description = task.get('description', '')
             tool_name = task.get('tool')
             tool_params = task.get('tool_params', {})
             
+            # 等待依赖的任务完成
+            if upstream:
+                await asyncio.gather(*upstream)
+            
             print(f"执行任务 {task_id}: {description}")
             
             try:
                 if tool_name:
-                    # 使用工具
-                    result = self.use_tool(tool_name, **tool_params)
+                    # 使用工具（同步工具放到线程中执行，避免阻塞事件循环）
+                    result = await asyncio.to_thread(self.use_tool, tool_name, **tool_params)
                 else:
                     # 直接处理
-                    result = self._process_task(task)
+                    result = await self._process_task_async(task)
                 
                 results[task_id] = {
                     "success": True,
@@ -226,8 +358,33 @@ class BaseAgent:
                 }
                 print(f"任务 {task_id} 执行失败: {e}")
         
+        for task in plan:
+            # 只允许依赖排在前面的任务，避免循环依赖导致死锁
+            upstream = [scheduled[dep] for dep in task.get('depends_on') or [] if dep in scheduled]
+            future = asyncio.ensure_future(_run(task, upstream))
+            scheduled[task.get('id', 'unknown')] = future
+            pending.append(future)
+        
+        await asyncio.gather(*pending)
         return results
     
+    async def _process_task_async(self, task: Dict[str, Any]) -> Any:
+        """
+        异步处理单个任务
+        
+        Args:
+            task: 任务字典
+            
+        Returns:
+            任务执行结果
+        """
+        tool_name = task.get("tool", task.get("工具名称"))
+        if tool_name and tool_name in self.tools:
+            return await asyncio.to_thread(self._process_task, task)
+        # 直接执行（思考）
+        prompt = task.get("description", task.get("描述", ""))
+        return await self.ainvoke_llm(prompt)
+    
     def _process_task(self, task: Dict[str, Any]) -> Any:
         """
         处理单个任务
@@ -257,13 +414,29 @@ class BaseAgent:
     
     def save_memory(self, filepath: str):
         """
-        保存记忆到文件
+        保存记忆到文件（JSONL格式，只追加上次保存之后新增的记忆）
         
         Args:
             filepath: 文件路径
         """
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.memory, f, ensure_ascii=False, indent=2)
+        # 换了文件时需要完整写入，否则只追加增量
+        if filepath != self._memory_file or not os.path.exists(filepath):
+            mode, start = 'wb', 0
+        else:
+            mode, start = 'ab', self._flushed_upto
+        
+        with self._memory_lock:
+            columns = tuple(
+                self.memory_cols[name][start:] for name in ("timestamp", "action", "content")
+            )
+        with open(filepath, mode) as f:
+            f.writelines(
+                orjson.dumps(_memory_row(*row)) + b"\n"
+                for row in zip(*columns)
+            )
+        
+        self._memory_file = filepath
+        self._flushed_upto = start + len(columns[0])
     
     def load_memory(self, filepath: str):
         """
@@ -272,6 +445,19 @@ class BaseAgent:
         Args:
             filepath: 文件路径
         """
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                self.memory = json.load(f)
\ No newline at end of file
+        if not os.path.exists(filepath):
+            return
+        
+        if os.path.getsize(filepath) == 0:
+            self.memory = []
+        else:
+            with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[:1] == b'[':
+                    # 兼容旧版整体保存为JSON数组的记忆文件
+                    self.memory = orjson.loads(mm[:])
+                else:
+                    self.memory = [orjson.loads(line) for line in iter(mm.readline, b'') if line.strip()]
+        
+        # 文件中已有这些记忆，之后保存到同一文件时只需追加
+        self._memory_file = filepath
+        self._flushed_upto = len(self.memory_cols["timestamp"])
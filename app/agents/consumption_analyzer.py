@@ -1,19 +1,22 @@
 """消费行为分析和任务规划模块"""
+import io
 import os
-from typing import List, Dict, Any
+import csv
+import asyncio
+from typing import List, Dict, Any, Optional
 from datetime import date, datetime
 from app.models.consumption import Consumption
-from app.agents.agents import llm
-from app.agents.mcp_tool import save_markdown_and_convert_to_pdf
-from app.utils.chart_generator import get_chart_generator
+from app.agents.agents import invoke_cached, ainvoke_cached
+from app.agents.mcp_tool import asave_markdown_and_convert_to_pdf, get_workspace_dir
+from app.utils.chart_generator import DEFAULT_CHART_TITLES, get_chart_generator, render_all_charts, to_chart_record
 
 
-# 消费分析提示词模板
-CONSUMPTION_ANALYSIS_PROMPT = """
-请根据以下消费记录数据，对用户的消费行为进行分析：
+# 提示词拆分为固定的指令前缀和动态的数据后缀：
+# 指令部分放在最前面且逐字节不变，Ollama可以复用该前缀的KV缓存，只需处理后面的数据部分
 
-用户消费记录：
-{consumption_data}
+# 消费分析提示词的固定指令（不要在此处插入任何动态内容）
+STATIC_ANALYSIS_SYSTEM = """
+请根据用户的消费记录数据，对用户的消费行为进行分析。
 
 请提供以下内容：
 1. 消费总览：总体消费趋势、主要支出类别
@@ -24,12 +27,9 @@ CONSUMPTION_ANALYSIS_PROMPT = """
 请使用简洁明了的语言进行分析，使用小标题分隔不同部分。
 """
 
-# 任务规划提示词模板
-TASK_PLANNING_PROMPT = """
-基于以下消费分析结果，请生成一个消费优化的任务规划：
-
-消费分析结果：
-{analysis_result}
+# 任务规划提示词的固定指令（不要在此处插入任何动态内容）
+STATIC_PLANNING_SYSTEM = """
+请基于消费分析结果，生成一个消费优化的任务规划。
 
 请规划一系列合理的步骤，帮助用户优化消费行为。每个步骤应该：
 1. 清晰明确的目标
@@ -41,9 +41,39 @@ TASK_PLANNING_PROMPT = """
 """
 
 
+# 消费记录CSV的表头（字段标签只出现一次，比逐条带标签的格式少很多输入token）
+CONSUMPTION_CSV_HEADER = ("日期", "类型", "金额(元)", "商户", "分类")
+
+
+def build_analysis_prompt(formatted_data: str) -> str:
+    """
+    构建消费分析提示词：固定指令在前，消费记录在后
+    
+    Args:
+        formatted_data: 格式化后的消费记录
+    
+    Returns:
+        完整提示词
+    """
+    return f"{STATIC_ANALYSIS_SYSTEM}\n用户消费记录：\n{formatted_data}\n"
+
+
+def build_planning_prompt(analysis_result: str) -> str:
+    """
+    构建任务规划提示词：固定指令在前，分析结果在后
+    
+    Args:
+        analysis_result: 消费分析结果
+    
+    Returns:
+        完整提示词
+    """
+    return f"{STATIC_PLANNING_SYSTEM}\n消费分析结果：\n{analysis_result}\n"
+
+
 def format_consumption_data(consumptions: List[Consumption]) -> str:
     """
-    将消费记录数据格式化为适合大模型处理的字符串
+    将消费记录数据格式化为适合大模型处理的紧凑CSV文本
     
     Args:
         consumptions: 消费记录列表
@@ -51,18 +81,21 @@ def format_consumption_data(consumptions: List[Consumption]) -> str:
     Returns:
         格式化后的消费记录字符串
     """
-    formatted_data = []
-    
-    for consumption in consumptions:
-        # 格式化每条消费记录
-        record = (f"- 日期: {consumption.transaction_time.strftime('%Y-%m-%d %H:%M:%S')}, "
-                 f"类型: {consumption.transaction_type}, "
-                 f"金额: {float(consumption.amount)}元, "
-                 f"商户: {consumption.merchant_name}, "
-                 f"分类: {consumption.category or '未分类'}")
-        formatted_data.append(record)
-    
-    return "\n".join(formatted_data)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CONSUMPTION_CSV_HEADER)
+    # 直接写入同一个缓冲区，不构建中间列表
+    writer.writerows(
+        (
+            f"{consumption.transaction_time:%Y-%m-%d %H:%M:%S}",
+            consumption.transaction_type,
+            float(consumption.amount),
+            consumption.merchant_name,
+            consumption.category or '未分类'
+        )
+        for consumption in consumptions
+    )
+    return buffer.getvalue()
 
 
 def analyze_consumption_patterns(consumptions: List[Consumption]) -> str:
@@ -79,10 +112,10 @@ def analyze_consumption_patterns(consumptions: List[Consumption]) -> str:
     formatted_data = format_consumption_data(consumptions)
     
     # 构建提示词
-    prompt = CONSUMPTION_ANALYSIS_PROMPT.format(consumption_data=formatted_data)
+    prompt = build_analysis_prompt(formatted_data)
     
-    # 调用大模型
-    analysis_result = llm.invoke(prompt)
+    # 调用大模型（相同数据的重复分析命中响应缓存）
+    analysis_result = invoke_cached(prompt)
     
     return analysis_result
 
@@ -98,10 +131,10 @@ def generate_task_plan(analysis_result: str) -> str:
         任务规划内容
     """
     # 构建提示词
-    prompt = TASK_PLANNING_PROMPT.format(analysis_result=analysis_result)
+    prompt = build_planning_prompt(analysis_result)
     
-    # 调用大模型
-    task_plan = llm.invoke(prompt)
+    # 调用大模型（相同分析结果的重复规划命中响应缓存）
+    task_plan = invoke_cached(prompt)
     
     return task_plan
 
@@ -127,75 +160,66 @@ def execute_agent_task(task_id: str, task_description: str) -> Dict[str, Any]:
     }
 
 
-def analyze_and_plan(user_id: int, consumptions: List[Consumption], save_to_files: bool = True) -> Dict[str, Any]:
+async def analyze_and_plan(user_id: int, consumptions: List[Consumption], save_to_files: bool = True,
+                           include_charts: Optional[bool] = None) -> Dict[str, Any]:
     """
-    综合分析消费数据并生成规划
+    综合分析消费数据并生成规划（图表渲染与大模型调用并行进行）
     
     Args:
         user_id: 用户ID
         consumptions: 消费记录列表
         save_to_files: 是否保存分析结果为文件（Markdown和PDF）
+        include_charts: 报告中是否包含图表，如果为None则与save_to_files一致
     
     Returns:
         包含分析、规划和文件路径的字典
     """
-    # 分析消费模式
-    analysis = analyze_consumption_patterns(consumptions)
-    
-    # 生成任务规划
-    plan = generate_task_plan(analysis)
-    
     # 初始化图表相关内容
     chart_sections = ""
     chart_paths = []
+    chart_future = None
+    if include_charts is None:
+        include_charts = save_to_files
     
-    # 保存为文件（如果启用）
     if save_to_files:
         # 生成文件名前缀，包含用户ID和时间戳
         filename_prefix = f"user_{user_id}_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    if include_charts:
+        # 使用MCP工具获取工作空间目录（报告只在最后保存和转换一次）
+        workspace_dir = get_workspace_dir()
         
-        # 使用MCP工具获取工作空间目录
-        temp_file_paths = save_markdown_and_convert_to_pdf("", filename_prefix)
-        workspace_dir = temp_file_paths["workspace_dir"]
-        
-        # 生成图表
+        # 先提交图表渲染（CPU密集，放到进程池），与下面的大模型网络等待重叠
         chart_generator = get_chart_generator(workspace_dir)
-        chart_paths = chart_generator.generate_all_charts(consumptions)
+        chart_future = asyncio.ensure_future(render_all_charts(
+            chart_generator.output_dir, [to_chart_record(c) for c in consumptions]
+        ))
+    
+    try:
+        # 分析消费模式
+        analysis = await ainvoke_cached(build_analysis_prompt(format_consumption_data(consumptions)))
         
-        # 构建图表部分的Markdown内容，使用更清晰的文件路径处理
-        chart_sections = "## 消费数据可视化\n\n"
+        # 生成任务规划（依赖分析结果）
+        plan = await ainvoke_cached(build_planning_prompt(analysis))
+    except BaseException:
+        # 大模型调用失败或请求被取消时一并取消图表渲染任务，避免任务无人等待
+        if chart_future is not None:
+            chart_future.cancel()
+        raise
+    
+    # 等待图表渲染完成（如果启用）
+    if include_charts:
+        chart_paths = await chart_future
         
-        # 确保图表路径正确处理
-        if chart_paths:
-            # 固定使用'charts'作为文件夹名称，因为图表生成器总是在工作空间下创建charts子目录
-            chart_folder_name = 'charts'
-            
-            # 添加消费类别分布图
-            if len(chart_paths) > 0:
-                chart_filename = os.path.basename(chart_paths[0])
-                # 强制使用charts前缀的路径
-                chart_path = f"charts/{chart_filename}"
-                chart_sections += "### 消费类别分布\n\n"
-                chart_sections += f"![消费类别分布]({chart_path})\n\n"
-                print(f"使用图表路径: {chart_path}")
-            
-            # 添加消费趋势图
-            if len(chart_paths) > 1:
-                chart_filename = os.path.basename(chart_paths[1])
-                # 强制使用charts前缀的路径
-                chart_path = f"charts/{chart_filename}"
-                chart_sections += "### 消费趋势分析\n\n"
-                chart_sections += f"![消费趋势分析]({chart_path})\n\n"
-                print(f"使用图表路径: {chart_path}")
-            
-            # 添加收支总览图
-            if len(chart_paths) > 2:
-                chart_filename = os.path.basename(chart_paths[2])
-                # 强制使用charts前缀的路径
-                chart_path = f"charts/{chart_filename}"
-                chart_sections += "### 收支总览\n\n"
-                chart_sections += f"![收支总览]({chart_path})\n\n"
-                print(f"使用图表路径: {chart_path}")
+        # 构建图表部分的Markdown内容：按生成顺序与章节标题一一对应
+        # 固定使用'charts'作为文件夹名称，因为图表生成器总是在工作空间下创建charts子目录
+        chart_sections = "".join([
+            "## 消费数据可视化\n\n",
+            *(
+                f"### {title}\n\n![{title}](charts/{os.path.basename(path)})\n\n"
+                for path, title in zip(chart_paths, DEFAULT_CHART_TITLES)
+            )
+        ])
     
     # 构建完整的分析报告Markdown内容
     full_report = f"""
@@ -228,14 +252,16 @@ def analyze_and_plan(user_id: int, consumptions: List[Consumption], save_to_file
     # 保存为文件（如果启用）
     if save_to_files:
         # 使用MCP工具保存并转换文件
-        file_paths = save_markdown_and_convert_to_pdf(full_report, filename_prefix)
+        file_paths = await asave_markdown_and_convert_to_pdf(full_report, filename_prefix)
         
         # 将文件路径添加到结果中
         result.update({
             "md_file_path": file_paths["md_path"],
             "pdf_file_path": file_paths["pdf_path"],
-            "workspace_dir": file_paths["workspace_dir"],
-            "chart_paths": chart_paths
+            "workspace_dir": file_paths["workspace_dir"]
         })
     
+    if include_charts:
+        result["chart_paths"] = chart_paths
+    
     return result
\ No newline at end of file
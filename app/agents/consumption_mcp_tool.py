@@ -1,11 +1,26 @@
 """消费分析MCP工具 - 为模型提供标准化的工具接口"""
 import os
-from typing import List, Dict, Any, Optional
+import functools
+from types import MappingProxyType, SimpleNamespace
+from typing import List, Dict, Any, Mapping, Optional, Final
 from datetime import datetime, date
-from app.models.consumption import Consumption
+import pandas as pd
 from app.dao.consumption_dao import ConsumptionDAO
-from app.utils.chart_generator import get_chart_generator
 from app.agents.mcp_tool import MCPTool
+from app.utils.date_utils import parse_date
+
+
+# 各类消费占收入的合理比例参考（模块级只读常量，消费分析Agent共用这一份数据）
+REASONABLE_RATIOS: Final[Mapping[str, str]] = MappingProxyType({
+    "食品餐饮": "25-30%",
+    "住房缴费": "20-35%",
+    "交通出行": "10-15%",
+    "娱乐休闲": "5-10%",
+    "购物消费": "10-20%",
+    "医疗健康": "5-8%",
+    "教育培训": "5-15%",
+    "其他支出": "5-10%"
+})
 
 
 class ConsumptionMCPTool(MCPTool):
@@ -29,10 +44,7 @@ class ConsumptionMCPTool(MCPTool):
         
         super().__init__(workspace_dir)
         
-        # 初始化DAO和图表生成器，确保正确导入依赖
-        from app.utils.chart_generator import get_chart_generator
-        self.consumption_dao = ConsumptionDAO()
-        self.chart_generator = get_chart_generator(workspace_dir)
+        # DAO和图表生成器在首次使用时才创建（见下方的cached_property）
         
         # 注册所有可用工具
         self.available_tools = {
@@ -53,6 +65,10 @@ class ConsumptionMCPTool(MCPTool):
                         "end_date": {
                             "type": "string",
                             "description": "结束日期，格式：YYYY-MM-DD"
+                        },
+                        "filters": {
+                            "type": "object",
+                            "description": "可选筛选条件，直接在数据库查询中应用，如{\"categories\": [\"餐饮美食\"], \"min_amount\": 10, \"keywords\": [\"咖啡\"]}"
                         }
                     },
                     "required": ["user_id", "start_date", "end_date"]
@@ -167,6 +183,17 @@ class ConsumptionMCPTool(MCPTool):
             }
         }
     
+    @functools.cached_property
+    def consumption_dao(self) -> ConsumptionDAO:
+        """消费记录DAO（首次访问时创建）"""
+        return ConsumptionDAO()
+    
+    @functools.cached_property
+    def chart_generator(self):
+        """图表生成器（首次访问时才导入matplotlib并创建）"""
+        from app.utils.chart_generator import get_chart_generator
+        return get_chart_generator(self.workspace_dir)
+    
     def get_available_tools(self) -> Dict[str, Any]:
         """
         获取所有可用工具的信息
@@ -190,8 +217,8 @@ class ConsumptionMCPTool(MCPTool):
         """
         try:
             # 转换日期字符串为日期对象
-            start = datetime.strptime(start_date, "%Y-%m-%d").date()
-            end = datetime.strptime(end_date, "%Y-%m-%d").date()
+            start = parse_date(start_date)
+            end = parse_date(end_date)
             
             # 从数据库获取数据
             consumptions = self.consumption_dao.get_by_user_and_date_range(user_id, start, end)
@@ -228,17 +255,12 @@ class ConsumptionMCPTool(MCPTool):
             if not filters:
                 return consumptions
             
-            filtered_data = []
-            for item in consumptions:
-                match = True
-                for key, value in filters.items():
-                    if key in item and item[key] != value:
-                        match = False
-                        break
-                if match:
-                    filtered_data.append(item)
-            
-            return filtered_data
+            # 筛选条件只展开一次；记录中不存在的字段不参与比较
+            conditions = tuple(filters.items())
+            return [
+                item for item in consumptions
+                if all(item.get(key, value) == value for key, value in conditions)
+            ]
         except Exception as e:
             return {"error": str(e)}
     
@@ -253,23 +275,22 @@ class ConsumptionMCPTool(MCPTool):
             图表路径字典
         """
         try:
-            # 转换回模型对象格式以便图表生成器使用
-            consumption_objects = []
-            for item in consumptions:
-                consumption = Consumption(
-                    id=item.get("id"),
-                    user_id=item.get("user_id"),
-                    amount=item.get("amount"),
-                    category=item.get("category"),
-                    description=item.get("description")
+            from app.utils.chart_generator import DEFAULT_CHART_TITLES
+            
+            # 图表只需要少量字段，批量转换为轻量记录，不再逐条构造ORM对象
+            df = pd.DataFrame(consumptions, columns=["category", "amount", "transaction_time", "transaction_type"])
+            # 时间字段整列向量化解析，替代逐条fromisoformat
+            transaction_times = pd.to_datetime(df["transaction_time"], errors="coerce")
+            records = [
+                SimpleNamespace(category=category, amount=amount, transaction_time=transaction_time,
+                                transaction_type=transaction_type)
+                for category, amount, transaction_time, transaction_type in zip(
+                    df["category"], df["amount"], transaction_times, df["transaction_type"]
                 )
-                if item.get("transaction_time"):
-                    consumption.transaction_time = datetime.fromisoformat(item.get("transaction_time"))
-                if item.get("created_at"):
-                    consumption.created_at = datetime.fromisoformat(item.get("created_at"))
-                consumption_objects.append(consumption)
+            ]
             
-            return self.chart_generator.generate_consumption_charts(consumption_objects)
+            chart_paths = self.chart_generator.generate_all_charts(records)
+            return dict(zip(DEFAULT_CHART_TITLES, chart_paths))
         except Exception as e:
             return {"error": str(e)}
     
@@ -286,15 +307,14 @@ class ConsumptionMCPTool(MCPTool):
         """
         try:
             # 这里可以添加更复杂的分析逻辑
-            # 目前返回数据摘要作为示例
-            total_amount = sum(item.get("amount", 0) for item in consumptions)
-            category_summary = {}
-            
-            for item in consumptions:
-                category = item.get("category", "其他")
-                if category not in category_summary:
-                    category_summary[category] = 0
-                category_summary[category] += item.get("amount", 0)
+            # 目前返回数据摘要作为示例，汇总使用pandas向量化计算
+            df = pd.DataFrame(consumptions, columns=["category", "amount"])
+            df["category"] = df["category"].fillna("其他")
+            df["amount"] = df["amount"].fillna(0).astype(float)
+            # sort=False保持分类首次出现的顺序
+            by_category = df.groupby("category", sort=False)["amount"].sum()
+            # 总额由各分类小计求和得到，不再对整列数据做第二次遍历
+            total_amount = by_category.sum()
             
             analysis = f"""
             # 消费数据分析结果
@@ -306,9 +326,10 @@ class ConsumptionMCPTool(MCPTool):
             ## 分类统计
             """
             
-            for category, amount in category_summary.items():
-                percentage = (amount / total_amount * 100) if total_amount > 0 else 0
-                analysis += f"- {category}: {amount:.2f}元 ({percentage:.1f}%)\n"
+            analysis += "".join(
+                f"- {category}: {amount:.2f}元 ({(amount / total_amount * 100) if total_amount > 0 else 0:.1f}%)\n"
+                for category, amount in by_category.items()
+            )
             
             analysis += f"\n## 用户需求分析\n根据您的需求 '{analysis_needs}'，系统已完成相关数据的整理和统计。"
             
@@ -338,26 +359,14 @@ class ConsumptionMCPTool(MCPTool):
         Returns:
             市场调研数据
         """
-        research_data = {
-            "合理消费占比参考": {
-                "食品餐饮": "25-30%",
-                "住房缴费": "20-35%",
-                "交通出行": "10-15%",
-                "娱乐休闲": "5-10%",
-                "购物消费": "10-20%",
-                "医疗健康": "5-8%",
-                "教育培训": "5-15%",
-                "其他支出": "5-10%"
-            }
-        }
-        
         if category:
             return {
                 "category": category,
-                "reasonable_ratio": research_data["合理消费占比参考"].get(category, "无特定参考值")
+                "reasonable_ratio": REASONABLE_RATIOS.get(category, "无特定参考值")
             }
         
-        return research_data
+        # 每次返回新的字典，调用方修改返回值不影响共享的参考数据
+        return {"合理消费占比参考": dict(REASONABLE_RATIOS)}
     
     def generate_report(self, analysis_result: str, chart_paths: Dict[str, str], 
                        user_id: int, start_date: str, end_date: str) -> Dict[str, str]:
@@ -389,9 +398,16 @@ class ConsumptionMCPTool(MCPTool):
 ## 可视化图表
 """
             
-            # 添加图表
+            # 添加图表：每个图表目录只列一次目录，代替逐个文件stat
+            present = set()
+            for chart_dir in {os.path.dirname(chart_path) for chart_path in chart_paths.values()}:
+                try:
+                    with os.scandir(chart_dir or ".") as entries:
+                        present.update((chart_dir, entry.name) for entry in entries)
+                except OSError:
+                    continue
             for chart_name, chart_path in chart_paths.items():
-                if os.path.exists(chart_path):
+                if os.path.split(chart_path) in present:
                     report_content += f"\n### {chart_name}\n![{chart_name}]({chart_path})\n"
             
             # 保存报告
@@ -403,8 +419,8 @@ class ConsumptionMCPTool(MCPTool):
             return {"error": str(e)}
 
 
-# 创建全局MCP工具实例
-consumption_mcp_tool = ConsumptionMCPTool()
+# 全局MCP工具实例（首次获取时创建）
+_consumption_mcp_tool: Optional[ConsumptionMCPTool] = None
 
 
 def get_consumption_mcp_tool() -> ConsumptionMCPTool:
@@ -414,4 +430,7 @@ def get_consumption_mcp_tool() -> ConsumptionMCPTool:
     Returns:
         ConsumptionMCPTool实例
     """
-    return consumption_mcp_tool
\ No newline at end of file
+    global _consumption_mcp_tool
+    if _consumption_mcp_tool is None:
+        _consumption_mcp_tool = ConsumptionMCPTool()
+    return _consumption_mcp_tool
@@ -1,9 +1,369 @@
 """模型控制程序(MCP)工具模块 - 用于文档格式转换和文件管理"""
+import gc
 import os
-import markdown
-from weasyprint import HTML
+import re
+import sys
+import asyncio
+import hashlib
+import threading
+import aiofiles
+from markdown_it import MarkdownIt
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from app.settings.config import config
+
+try:
+    from playwright.sync_api import sync_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+try:
+    from weasyprint import HTML
+    WEASYPRINT_AVAILABLE = True
+except (ImportError, OSError):
+    # WeasyPrint在缺少pango等系统库时导入会抛出OSError
+    WEASYPRINT_AVAILABLE = False
+
+
+# Markdown解析器：CommonMark规则自带代码块，额外启用表格并允许嵌入HTML
+# （生成PDF时不启用目录和属性插件，避免额外的DOM节点和属性增加排版开销）
+_MARKDOWN_PARSER = MarkdownIt('commonmark', {'html': True}).enable('table')
+
+# 外部样式表链接（PDF只使用内联的基本样式，外链会触发串行的网络/文件请求）
+_STYLESHEET_LINK_RE = re.compile(r'<link[^>]+rel=["\']stylesheet["\'][^>]*>', re.IGNORECASE)
+
+# 报告HTML的头部（含基本的CSS样式）和尾部，只构建一次
+_HTML_HEAD = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <title>消费分析报告</title>
+            <style>
+                body {
+                    font-family: 'SimSun', 'Arial', sans-serif;
+                    line-height: 1.6;
+                    color: #333;
+                    max-width: 900px;
+                    margin: 0 auto;
+                    padding: 20px;
+                }
+                h1, h2, h3 {
+                    color: #2c3e50;
+                    border-bottom: 1px solid #eee;
+                    padding-bottom: 10px;
+                }
+                code {
+                    font-family: 'Courier New', monospace;
+                    background-color: #f5f5f5;
+                    padding: 2px 4px;
+                    border-radius: 3px;
+                }
+                pre {
+                    background-color: #f5f5f5;
+                    padding: 15px;
+                    border-radius: 5px;
+                    overflow-x: auto;
+                }
+                table {
+                    border-collapse: collapse;
+                    width: 100%;
+                    margin: 20px 0;
+                }
+                th, td {
+                    border: 1px solid #ddd;
+                    padding: 8px 12px;
+                    text-align: left;
+                }
+                th {
+                    background-color: #f2f2f2;
+                }
+                blockquote {
+                    border-left: 4px solid #ddd;
+                    padding-left: 16px;
+                    margin-left: 0;
+                    color: #666;
+                }
+                img {
+                    max-width: 100%;
+                    height: auto;
+                    display: block;
+                    margin: 20px auto;
+                }
+            </style>
+        </head>
+        <body>
+            """
+_HTML_TAIL = """
+        </body>
+        </html>
+        """
+
+# 分段缓存的最大条目数
+SEGMENT_CACHE_SIZE = 4096
+
+# 以缩进或列表标记开头的段落属于上一段的延续（如空行分隔的列表项），不能单独转换
+_CONTINUATION_RE = re.compile(r"^(?:\s|[-*+]\s|\d+[.)]\s)")
+# 链接引用定义（[id]: url）对整篇文档生效，出现时不能分段转换
+_REFERENCE_DEF_RE = re.compile(r"^ {0,3}\[[^\]]+\]:", re.M)
+# 可以跨越空行的HTML块（<script>/<pre>/<style>/<textarea>和注释）的起止标记
+_HTML_BLOCK_OPEN_RE = re.compile(r"^ {0,3}(?:<(?:script|pre|style|textarea)(?=[\s>]|$)|(<!--))", re.I | re.M)
+_HTML_BLOCK_CLOSE_RE = re.compile(r"</(?:script|pre|style|textarea)>", re.I)
+_HTML_COMMENT_CLOSE_RE = re.compile(r"-->")
+
+
+def _html_block_state(block: str, close_re: Optional[re.Pattern]) -> Optional[re.Pattern]:
+    """
+    扫描一个段落，返回段落结束时仍未闭合的HTML块的结束标记（没有未闭合的HTML块时返回None）
+    
+    Args:
+        block: 段落内容
+        close_re: 进入该段落时未闭合的HTML块的结束标记
+    
+    Returns:
+        离开该段落时未闭合的HTML块的结束标记
+    """
+    pos = 0
+    while True:
+        if close_re is not None:
+            match = close_re.search(block, pos)
+            if match is None:
+                return close_re
+            close_re, pos = None, match.end()
+        else:
+            match = _HTML_BLOCK_OPEN_RE.search(block, pos)
+            if match is None:
+                return None
+            close_re = _HTML_COMMENT_CLOSE_RE if match.group(1) else _HTML_BLOCK_CLOSE_RE
+            pos = match.end()
+
+
+def _split_markdown_segments(markdown_content: str) -> List[str]:
+    """
+    按空行把Markdown拆分为可以独立转换的段落
+    代码块、跨越空行的HTML块内部和列表的延续部分会合并到上一段；
+    含链接引用定义的文档不拆分，保证逐段转换后拼接与整体转换结果一致
+    
+    Args:
+        markdown_content: Markdown内容
+    
+    Returns:
+        段落列表
+    """
+    if _REFERENCE_DEF_RE.search(markdown_content):
+        return [markdown_content]
+    
+    segments = []
+    in_fence = False
+    html_close = None
+    for block in markdown_content.split("\n\n"):
+        if segments and (in_fence or html_close is not None or _CONTINUATION_RE.match(block)):
+            segments[-1] += "\n\n" + block
+        else:
+            segments.append(block)
+        # 代码块围栏出现奇数次，说明代码块在此段内开始或结束
+        if html_close is None and (block.count("```") + block.count("~~~")) % 2:
+            in_fence = not in_fence
+        elif not in_fence:
+            html_close = _html_block_state(block, html_close)
+    # 除最后一段外保留段尾换行（HTML块原样输出源码，缺少换行会与整体转换结果不同）
+    return [segment + "\n" for segment in segments[:-1]] + segments[-1:]
+
+
+class ChromiumLaunchError(RuntimeError):
+    """Chromium浏览器无法启动（如未执行 playwright install chromium）"""
+
+
+class ChromiumPDFRenderer:
+    """
+    基于Chromium（Playwright）的PDF渲染器，复用同一个浏览器实例
+    Playwright同步API绑定创建它的线程，因此所有渲染都在一个专用线程中执行
+    """
+    
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-chromium")
+        self._playwright = None
+        self._browser = None
+    
+    def _ensure_browser(self):
+        """在渲染线程中按需启动浏览器"""
+        if self._browser is None:
+            try:
+                self._playwright = sync_playwright().start()
+                self._browser = self._playwright.chromium.launch()
+            except Exception as e:
+                if self._playwright is not None:
+                    self._playwright.stop()
+                    self._playwright = None
+                raise ChromiumLaunchError(f"Chromium启动失败: {e}") from e
+        return self._browser
+    
+    def _render(self, html_content: str, base_dir: str, pdf_path: Optional[str]) -> bytes:
+        """
+        在渲染线程中执行：先打开base_dir再在内存中替换文档内容，
+        文档URL仍位于base_dir下，相对路径的图片可以解析，无需写临时HTML文件
+        """
+        page = self._ensure_browser().new_page()
+        try:
+            page.goto(f"file://{base_dir}/")
+            page.set_content(html_content, wait_until="load")
+            return page.pdf(path=pdf_path, print_background=True)
+        finally:
+            page.close()
+    
+    def render(self, html_content: str, base_dir: str, pdf_path: Optional[str] = None) -> bytes:
+        """
+        渲染PDF（可在任意线程调用，阻塞直到渲染完成）
+        
+        Args:
+            html_content: 完整的HTML内容
+            base_dir: 解析相对路径资源的目录
+            pdf_path: PDF输出路径，如果为None则只返回PDF字节
+        
+        Returns:
+            PDF字节内容
+        """
+        return self._executor.submit(self._render, html_content, base_dir, pdf_path).result()
+    
+    def _close(self):
+        """在渲染线程中关闭浏览器"""
+        if self._browser is not None:
+            self._browser.close()
+            self._playwright.stop()
+            self._browser = None
+            self._playwright = None
+    
+    def close(self):
+        """关闭浏览器并结束渲染线程"""
+        self._executor.submit(self._close).result()
+        self._executor.shutdown(wait=True)
+
+
+# 共享的Chromium渲染器（首次使用时创建，由应用生命周期关闭）
+_chromium_renderer: Optional[ChromiumPDFRenderer] = None
+_chromium_renderer_lock = threading.Lock()
+# Chromium启动失败后置为True，本进程后续直接使用WeasyPrint，不再重复尝试启动
+_chromium_unavailable = False
+
+
+def _disable_chromium(error: Exception):
+    """
+    记录Chromium不可用并关闭共享渲染器（之后的渲染回退到WeasyPrint）
+    
+    Args:
+        error: 启动失败的异常
+    """
+    global _chromium_renderer, _chromium_unavailable
+    print(f"警告: {error}，PDF渲染改用WeasyPrint")
+    with _chromium_renderer_lock:
+        _chromium_unavailable = True
+        if _chromium_renderer is not None:
+            _chromium_renderer.close()
+            _chromium_renderer = None
+
+
+def get_chromium_renderer() -> ChromiumPDFRenderer:
+    """
+    获取共享的Chromium PDF渲染器
+    
+    Returns:
+        ChromiumPDFRenderer实例
+    """
+    global _chromium_renderer
+    with _chromium_renderer_lock:
+        if _chromium_renderer is None:
+            _chromium_renderer = ChromiumPDFRenderer()
+        return _chromium_renderer
+
+
+# WeasyPrint工作进程内的图片缓存，在该进程处理的多次转换之间共享
+_weasyprint_cache: Dict[str, Any] = {}
+
+
+def _init_weasyprint_worker():
+    """
+    WeasyPrint工作进程初始化：预先导入依赖并渲染一个极小的文档，
+    让字体配置（fontconfig/pango）缓存在进程启动时就完成加载
+    """
+    HTML(string="<p>warmup</p>").write_pdf()
+
+
+def _render_weasyprint_pdf(html_content: str, base_url: str, pdf_path: Optional[str] = None) -> Optional[bytes]:
+    """
+    在工作进程中使用WeasyPrint渲染PDF
+    
+    Args:
+        html_content: 完整的HTML内容
+        base_url: 解析相对路径图片的基础URL
+        pdf_path: PDF输出路径，如果为None则返回PDF字节
+    
+    Returns:
+        未指定输出路径时返回PDF字节，否则返回None
+    """
+    # 图表文件名带时间戳，缓存会不断增长，超过上限时整体清空
+    if len(_weasyprint_cache) > 256:
+        _weasyprint_cache.clear()
+    try:
+        # 使用base_url参数确保图片正确加载，图片缓存在多次转换之间复用
+        return HTML(string=html_content, base_url=base_url).write_pdf(pdf_path, cache=_weasyprint_cache)
+    finally:
+        # 排版过程产生大量循环引用的DOM和布局对象，渲染后立即回收，避免常驻进程内存持续增长
+        del html_content
+        gc.collect()
+
+
+# WeasyPrint渲染进程池（首次使用时创建，由应用生命周期关闭）
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+_pdf_process_pool_lock = threading.Lock()
+
+
+def get_pdf_process_pool() -> ProcessPoolExecutor:
+    """
+    获取WeasyPrint渲染进程池（WeasyPrint是持有GIL的纯计算，使用进程才能利用多核）
+    
+    Returns:
+        进程池实例
+    """
+    global _pdf_process_pool
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is None:
+            pool_kwargs = {}
+            if sys.version_info >= (3, 11) and config.PDF_WORKER_MAX_TASKS > 0:
+                # 工作进程处理一定数量的任务后重建，释放内存碎片（Python 3.11+支持）
+                pool_kwargs["max_tasks_per_child"] = config.PDF_WORKER_MAX_TASKS
+            _pdf_process_pool = ProcessPoolExecutor(
+                max_workers=config.PROCESS_POOL_WORKERS,
+                initializer=_init_weasyprint_worker,
+                **pool_kwargs
+            )
+        return _pdf_process_pool
+
+
+def close_pdf_renderer():
+    """关闭共享的Chromium PDF渲染器和WeasyPrint渲染进程池"""
+    global _chromium_renderer, _pdf_process_pool
+    with _chromium_renderer_lock:
+        if _chromium_renderer is not None:
+            _chromium_renderer.close()
+            _chromium_renderer = None
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is not None:
+            _pdf_process_pool.shutdown(wait=True)
+            _pdf_process_pool = None
+
+
+def _timestamp() -> str:
+    """
+    生成文件名使用的时间戳
+    
+    Returns:
+        形如20240101_120000的时间戳
+    """
+    return datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
 class MCPTool:
@@ -11,13 +371,20 @@ class MCPTool:
     模型控制程序工具类，提供文档转换和文件管理功能
     """
     
-    def __init__(self, workspace_dir: Optional[str] = None):
+    def __init__(self, workspace_dir: Optional[str] = None, pdf_engine: Optional[str] = None):
         """
         初始化MCP工具
         
         Args:
             workspace_dir: 工作空间目录路径，如果为None则使用默认路径
+            pdf_engine: PDF渲染引擎（chromium或weasyprint），如果为None则使用配置中的PDF_ENGINE
         """
+        # PDF渲染引擎，chromium不可用时回退到weasyprint
+        self.pdf_engine = (pdf_engine or config.PDF_ENGINE).lower()
+        # Markdown分段转换结果缓存（段落内容摘要 -> HTML片段），LRU淘汰
+        self._seg_cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._seg_cache_lock = threading.Lock()
+        
         # 设置工作空间目录
         self.workspace_dir = workspace_dir or os.path.join(
             os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
@@ -26,6 +393,46 @@ class MCPTool:
         
         # 确保工作空间目录存在
         self._ensure_workspace_exists()
+        
+        # 工作空间的绝对路径和对应的基础URL只计算一次，用于解析报告中相对路径的图片
+        self._base_dir = os.path.abspath(self.workspace_dir)
+        self._base_url = f"file://{self._base_dir}/"
+        # 解析符号链接后的工作空间路径，用于校验输出文件不会越出工作空间
+        self._workspace_path = Path(self._base_dir).resolve()
+    
+    def _render_markdown(self, markdown_content: str) -> str:
+        """
+        将Markdown转换为HTML，逐段查找缓存，未命中的段落才调用解析器
+        
+        Args:
+            markdown_content: Markdown内容
+        
+        Returns:
+            HTML片段
+        """
+        # 循环中用到的属性和函数预先绑定为局部变量，减少每段的属性查找
+        cache = self._seg_cache
+        lock = self._seg_cache_lock
+        blake2b = hashlib.blake2b
+        render = _MARKDOWN_PARSER.render
+        fragments = []
+        append = fragments.append
+        for segment in _split_markdown_segments(markdown_content):
+            key = blake2b(segment.encode("utf-8"), digest_size=16).digest()
+            with lock:
+                fragment = cache.get(key)
+                if fragment is not None:
+                    cache.move_to_end(key)
+            if fragment is None:
+                # 解析器每次渲染使用独立的状态，可在多个线程间共享
+                fragment = render(segment)
+                with lock:
+                    cache[key] = fragment
+                    if len(cache) > SEGMENT_CACHE_SIZE:
+                        cache.popitem(last=False)
+            append(fragment)
+        # 每段的HTML都以换行结尾，直接拼接即与整体转换的结果相同
+        return "".join(fragments)
     
     def _ensure_workspace_exists(self):
         """
@@ -35,28 +442,58 @@ class MCPTool:
             os.makedirs(self.workspace_dir)
             print(f"创建工作空间目录: {self.workspace_dir}")
     
-    def markdown_to_file(self, markdown_content: str, filename: Optional[str] = None) -> str:
+    def get_workspace_dir(self) -> str:
         """
-        将Markdown内容保存为Markdown文件
+        获取工作空间目录（确保目录存在，不生成任何文件）
+        
+        Returns:
+            工作空间目录路径
+        """
+        self._ensure_workspace_exists()
+        return self.workspace_dir
+    
+    def _output_path(self, filename: Optional[str], suffix: str, timestamp: Optional[str] = None) -> str:
+        """
+        构建输出文件的完整路径
         
         Args:
-            markdown_content: Markdown格式的内容
             filename: 文件名，如果为None则自动生成
+            suffix: 文件扩展名（如.md、.pdf）
+            timestamp: 已生成的时间戳，如果为None且需要自动生成文件名时才生成
         
         Returns:
-            保存的文件路径
+            文件路径
+        
+        Raises:
+            ValueError: 文件名指向工作空间之外的路径
         """
         # 如果没有提供文件名，则生成一个包含时间戳的文件名
         if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"analysis_{timestamp}.md"
+            filename = f"analysis_{timestamp or _timestamp()}{suffix}"
+        elif not filename.endswith(suffix):
+            # 确保文件名以指定扩展名结尾
+            filename += suffix
         
-        # 确保文件名以.md结尾
-        if not filename.endswith('.md'):
-            filename += '.md'
+        # 构建完整的文件路径，并阻止通过../或绝对路径写到工作空间之外
+        file_path = (self._workspace_path / filename).resolve()
+        if self._workspace_path not in file_path.parents:
+            raise ValueError(f"文件路径超出工作空间: {filename}")
+        return str(file_path)
+    
+    def markdown_to_file(self, markdown_content: str, filename: Optional[str] = None,
+                         timestamp: Optional[str] = None) -> str:
+        """
+        将Markdown内容保存为Markdown文件
         
-        # 构建完整的文件路径
-        file_path = os.path.join(self.workspace_dir, filename)
+        Args:
+            markdown_content: Markdown格式的内容
+            filename: 文件名，如果为None则自动生成
+            timestamp: 已生成的时间戳，用于自动生成文件名，避免重复生成
+        
+        Returns:
+            保存的文件路径
+        """
+        file_path = self._output_path(filename, '.md', timestamp)
         
         # 保存文件
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -65,129 +502,128 @@ class MCPTool:
         print(f"Markdown文件已保存: {file_path}")
         return file_path
     
+    async def amarkdown_to_file(self, markdown_content: str, filename: Optional[str] = None,
+                                timestamp: Optional[str] = None) -> str:
+        """
+        将Markdown内容保存为Markdown文件（异步版本，不阻塞事件循环）
+        
+        Args:
+            markdown_content: Markdown格式的内容
+            filename: 文件名，如果为None则自动生成
+            timestamp: 已生成的时间戳，用于自动生成文件名，避免重复生成
+        
+        Returns:
+            保存的文件路径
+        """
+        file_path = self._output_path(filename, '.md', timestamp)
+        
+        async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
+            await f.write(markdown_content)
+        
+        print(f"Markdown文件已保存: {file_path}")
+        return file_path
+    
+    def _resolve_base(self, base_url: Optional[str]) -> tuple:
+        """
+        解析相对路径图片的基础URL和对应的本地目录
+        
+        Args:
+            base_url: 基础URL（file://目录/），如果为None则使用工作空间目录
+        
+        Returns:
+            (基础URL, 本地目录)
+        """
+        if base_url is None or base_url == self._base_url:
+            return self._base_url, self._base_dir
+        if base_url.startswith("file://"):
+            return base_url, base_url[len("file://"):].rstrip("/") or "/"
+        return base_url, self._base_dir
+    
+    def _build_html(self, markdown_content: str) -> str:
+        """
+        将Markdown内容转换为完整的报告HTML
+        
+        Args:
+            markdown_content: Markdown格式的内容
+        
+        Returns:
+            完整的HTML内容
+        """
+        # 将Markdown转换为HTML（按段落缓存，重复的标题、表格和模板段落不再重复转换）
+        html_body = self._render_markdown(markdown_content)
+        # 去掉内容中嵌入的外部样式表
+        html_body = _STYLESHEET_LINK_RE.sub('', html_body)
+        
+        # 套上预先构建好的HTML头尾（含基本的CSS样式）
+        return _HTML_HEAD + html_body + _HTML_TAIL
+    
+    def _render_pdf(self, html_content: str, base_url: str, base_dir: str,
+                    pdf_path: Optional[str] = None) -> Optional[bytes]:
+        """
+        使用配置的渲染引擎将HTML渲染为PDF
+        
+        Args:
+            html_content: 完整的HTML内容
+            base_url: 解析相对路径图片的基础URL
+            base_dir: 基础URL对应的本地目录
+            pdf_path: PDF输出路径，如果为None则返回PDF字节
+        
+        Returns:
+            PDF字节内容（WeasyPrint写入文件时为None）
+        """
+        if self.pdf_engine == "chromium" and PLAYWRIGHT_AVAILABLE and not _chromium_unavailable:
+            try:
+                # 使用共享的浏览器实例渲染，避免每次启动新进程
+                return get_chromium_renderer().render(html_content, base_dir, pdf_path)
+            except ChromiumLaunchError as e:
+                # 只安装了playwright包而没有浏览器时回退到WeasyPrint
+                if not WEASYPRINT_AVAILABLE:
+                    raise
+                _disable_chromium(e)
+        if WEASYPRINT_AVAILABLE:
+            # 提交到常驻的渲染进程池，多个请求并行渲染且复用已预热的字体缓存
+            return get_pdf_process_pool().submit(_render_weasyprint_pdf, html_content, base_url, pdf_path).result()
+        raise RuntimeError("没有可用的PDF渲染引擎，请安装playwright或weasyprint")
+    
     def markdown_to_pdf(self, markdown_content: str, filename: Optional[str] = None, 
-                       md_file_path: Optional[str] = None) -> str:
+                       base_url: Optional[str] = None, timestamp: Optional[str] = None) -> str:
         """
         将Markdown内容转换为PDF文件
         
         Args:
             markdown_content: Markdown格式的内容
             filename: 文件名，如果为None则自动生成
-            md_file_path: 已存在的Markdown文件路径，如果提供则直接读取该文件
+            base_url: 解析相对路径图片的基础URL（file://目录/），如果为None则使用工作空间目录
+            timestamp: 已生成的时间戳，用于自动生成文件名，避免重复生成
         
         Returns:
             生成的PDF文件路径
         """
-        # 确保有Markdown文件路径，这对于正确解析相对路径的图片很重要
-        if md_file_path and os.path.exists(md_file_path):
-            # 如果提供了现有文件，使用它
-            actual_md_path = md_file_path
-            with open(md_file_path, 'r', encoding='utf-8') as f:
-                markdown_content = f.read()
-        else:
-            # 否则创建一个临时Markdown文件
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            temp_md_filename = f"temp_pdf_conversion_{timestamp}.md"
-            actual_md_path = os.path.join(self.workspace_dir, temp_md_filename)
-            with open(actual_md_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-        
-        # 如果没有提供文件名，则生成一个包含时间戳的文件名
-        if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"analysis_{timestamp}.pdf"
-        
-        # 确保文件名以.pdf结尾
-        if not filename.endswith('.pdf'):
-            filename += '.pdf'
+        # 相对路径的图片默认以工作空间目录为基准解析，内容直接在内存中转换，不再落地临时文件
+        base_url, base_dir = self._resolve_base(base_url)
         
         # 构建完整的文件路径
-        pdf_path = os.path.join(self.workspace_dir, filename)
-        
-        # 获取Markdown文件所在目录，作为图片的基础URL
-        base_url = f"file://{os.path.dirname(os.path.abspath(actual_md_path))}/"
-        
-        # 将Markdown转换为HTML
-        html_content = markdown.markdown(markdown_content, extensions=[
-            'fenced_code',  # 支持代码块
-            'tables',       # 支持表格
-            'toc',          # 支持目录
-            'attr_list',    # 支持属性列表
-            'md_in_html'    # 支持在HTML中嵌入Markdown
-        ])
-        
-        # 添加基本的CSS样式
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>消费分析报告</title>
-            <style>
-                body {{
-                    font-family: 'SimSun', 'Arial', sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 900px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                h1, h2, h3 {{
-                    color: #2c3e50;
-                    border-bottom: 1px solid #eee;
-                    padding-bottom: 10px;
-                }}
-                code {{
-                    font-family: 'Courier New', monospace;
-                    background-color: #f5f5f5;
-                    padding: 2px 4px;
-                    border-radius: 3px;
-                }}
-                pre {{
-                    background-color: #f5f5f5;
-                    padding: 15px;
-                    border-radius: 5px;
-                    overflow-x: auto;
-                }}
-                table {{
-                    border-collapse: collapse;
-                    width: 100%;
-                    margin: 20px 0;
-                }}
-                th, td {{
-                    border: 1px solid #ddd;
-                    padding: 8px 12px;
-                    text-align: left;
-                }}
-                th {{
-                    background-color: #f2f2f2;
-                }}
-                blockquote {{
-                    border-left: 4px solid #ddd;
-                    padding-left: 16px;
-                    margin-left: 0;
-                    color: #666;
-                }}
-                img {{
-                    max-width: 100%;
-                    height: auto;
-                    display: block;
-                    margin: 20px auto;
-                }}
-            </style>
-        </head>
-        <body>
-            {html_content}
-        </body>
-        </html>
-        """
+        pdf_path = self._output_path(filename, '.pdf', timestamp)
         
-        # 将HTML转换为PDF，使用base_url参数确保图片正确加载
-        HTML(string=html_content, base_url=base_url).write_pdf(pdf_path)
+        self._render_pdf(self._build_html(markdown_content), base_url, base_dir, pdf_path)
         
         print(f"PDF文件已生成: {pdf_path}")
         return pdf_path
     
+    def markdown_to_pdf_bytes(self, markdown_content: str, base_url: Optional[str] = None) -> bytes:
+        """
+        将Markdown内容转换为PDF字节，不写入工作空间，用于直接返回给客户端
+        
+        Args:
+            markdown_content: Markdown格式的内容
+            base_url: 解析相对路径图片的基础URL（file://目录/），如果为None则使用工作空间目录
+        
+        Returns:
+            PDF字节内容
+        """
+        base_url, base_dir = self._resolve_base(base_url)
+        return self._render_pdf(self._build_html(markdown_content), base_url, base_dir)
+    
     def convert_and_save(self, markdown_content: str, filename_prefix: Optional[str] = None) -> Dict[str, str]:
         """
         一步完成Markdown到文件的保存和PDF转换
@@ -201,13 +637,40 @@ class MCPTool:
         """
         # 生成文件名前缀
         if not filename_prefix:
-            filename_prefix = f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            filename_prefix = f"analysis_{_timestamp()}"
         
         # 保存Markdown文件
         md_path = self.markdown_to_file(markdown_content, f"{filename_prefix}.md")
         
-        # 转换为PDF文件，传入md_file_path参数以便正确处理图片路径
-        pdf_path = self.markdown_to_pdf(None, f"{filename_prefix}.pdf", md_file_path=md_path)
+        # 直接用内存中的内容转换为PDF，Markdown文件位于工作空间，图片以缓存的工作空间URL为基准
+        pdf_path = self.markdown_to_pdf(markdown_content, f"{filename_prefix}.pdf")
+        
+        return {
+            "md_path": md_path,
+            "pdf_path": pdf_path,
+            "workspace_dir": self.workspace_dir
+        }
+    
+    async def aconvert_and_save(self, markdown_content: str, filename_prefix: Optional[str] = None) -> Dict[str, str]:
+        """
+        一步完成Markdown到文件的保存和PDF转换（异步版本，供事件循环中的调用方使用）
+        
+        Args:
+            markdown_content: Markdown格式的内容
+            filename_prefix: 文件名前缀，如果为None则使用默认值
+        
+        Returns:
+            包含md_path和pdf_path的字典
+        """
+        # 生成文件名前缀
+        if not filename_prefix:
+            filename_prefix = f"analysis_{_timestamp()}"
+        
+        # 保存Markdown文件
+        md_path = await self.amarkdown_to_file(markdown_content, f"{filename_prefix}.md")
+        
+        # PDF渲染是阻塞的计算，放到线程中执行；直接使用内存中的内容，不再回读文件
+        pdf_path = await asyncio.to_thread(self.markdown_to_pdf, markdown_content, f"{filename_prefix}.pdf")
         
         return {
             "md_path": md_path,
@@ -232,4 +695,41 @@ def save_markdown_and_convert_to_pdf(markdown_content: str, filename_prefix: Opt
     Returns:
         包含md_path和pdf_path的字典
     """
-    return mcp_tool.convert_and_save(markdown_content, filename_prefix)
\ No newline at end of file
+    return mcp_tool.convert_and_save(markdown_content, filename_prefix)
+
+
+async def asave_markdown_and_convert_to_pdf(markdown_content: str, filename_prefix: Optional[str] = None) -> Dict[str, str]:
+    """
+    保存Markdown内容并转换为PDF的便捷函数（异步版本）
+    
+    Args:
+        markdown_content: Markdown格式的内容
+        filename_prefix: 文件名前缀
+    
+    Returns:
+        包含md_path和pdf_path的字典
+    """
+    return await mcp_tool.aconvert_and_save(markdown_content, filename_prefix)
+
+
+async def amarkdown_to_pdf_bytes(markdown_content: str) -> bytes:
+    """
+    将Markdown内容转换为PDF字节的便捷函数（异步版本，渲染在线程中执行）
+    
+    Args:
+        markdown_content: Markdown格式的内容
+    
+    Returns:
+        PDF字节内容
+    """
+    return await asyncio.to_thread(mcp_tool.markdown_to_pdf_bytes, markdown_content)
+
+
+def get_workspace_dir() -> str:
+    """
+    获取全局MCP工具工作空间目录的便捷函数
+    
+    Returns:
+        工作空间目录路径
+    """
+    return mcp_tool.get_workspace_dir()
@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from .user_router import user_router
 from .consumption_router import consumption_router
 from .consumption_analysis_router import consumption_analysis_router
+from .batch_router import batch_router
 
 # 创建主API路由器
 api_router = APIRouter()
@@ -11,5 +12,6 @@ api_router = APIRouter()
 api_router.include_router(user_router)
 api_router.include_router(consumption_router)
 api_router.include_router(consumption_analysis_router)
+api_router.include_router(batch_router)
 
 __all__ = ["api_router"]
\ No newline at end of file
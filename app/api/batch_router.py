@@ -0,0 +1,111 @@
+"""批量请求API接口 - 在一次HTTP请求中并发执行多个只读子请求"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import orjson
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+
+from app.schemas.batch_schemas import BatchRequest, BatchRequestItem
+from app.settings.response import success_response, error_response
+from app.utils.date_utils import parse_date
+from .user_router import get_user
+from .consumption_router import get_consumption, get_user_consumptions, get_user_consumption_statistics
+
+# 创建批量请求相关的路由器
+batch_router = APIRouter(prefix="/batch", tags=["batch"])
+
+logger = logging.getLogger(__name__)
+
+
+def _user_params(user_id: int) -> Tuple:
+    """子请求参数：获取用户详情"""
+    return (int(user_id),)
+
+
+def _consumption_params(consumption_id: int) -> Tuple:
+    """子请求参数：获取消费记录详情"""
+    return (int(consumption_id),)
+
+
+def _user_consumptions_params(user_id: int, page: int = 1, page_size: int = 20, cursor: Optional[str] = None) -> Tuple:
+    """子请求参数：获取用户的消费记录列表（参数范围与单独接口一致）"""
+    if cursor is not None and not isinstance(cursor, str):
+        raise TypeError("cursor必须是字符串")
+    return int(user_id), max(int(page), 1), min(max(int(page_size), 1), 100), cursor
+
+
+def _consumption_statistics_params(
+    user_id: int,
+    start_date: str,
+    end_date: str,
+    transaction_type: str = "支出"
+) -> Tuple:
+    """子请求参数：获取用户的消费统计数据"""
+    if not isinstance(transaction_type, str):
+        raise TypeError("transaction_type必须是字符串")
+    return int(user_id), parse_date(start_date), parse_date(end_date), transaction_type
+
+
+# 允许批量调用的只读接口：接口名 -> (参数转换函数, 路由函数)
+BATCH_ENDPOINTS: Dict[str, Tuple[Callable[..., Tuple], Callable[..., Any]]] = {
+    "user": (_user_params, get_user),
+    "consumption": (_consumption_params, get_consumption),
+    "user_consumptions": (_user_consumptions_params, get_user_consumptions),
+    "consumption_statistics": (_consumption_statistics_params, get_user_consumption_statistics),
+}
+
+
+async def _run_sub_request(item: BatchRequestItem) -> Dict[str, Any]:
+    """
+    执行单个子请求，直接调用对应的路由函数（不经过HTTP）
+    参数错误返回400，执行异常返回500，单个子请求失败不影响其他子请求
+    
+    Args:
+        item: 子请求
+    
+    Returns:
+        包含接口名、状态码（子接口响应的HTTP状态码）和响应内容的字典
+    """
+    endpoint = BATCH_ENDPOINTS.get(item.endpoint)
+    if endpoint is None:
+        response = error_response(code=4001, message=f"不支持的批量接口: {item.endpoint}", status_code=400)
+    else:
+        parse_params, handler = endpoint
+        try:
+            # 参数名不匹配（缺少或多余参数）、类型错误（如null）或值无法转换（如非数字的ID、格式错误的日期）
+            args = parse_params(**item.params)
+        except (TypeError, ValueError) as e:
+            response = error_response(code=4001, message=f"子请求参数错误: {e}", status_code=400)
+        else:
+            try:
+                response = await handler(*args)
+            except Exception as e:
+                logger.exception(f"批量子请求 {item.endpoint} 执行失败")
+                response = error_response(code=5000, message=f"子请求执行失败: {e}", status_code=500)
+    
+    # 子响应已经序列化过，作为JSON片段直接嵌入，避免再次解析和序列化
+    return {
+        "endpoint": item.endpoint,
+        "status_code": response.status_code,
+        "response": orjson.Fragment(response.body)
+    }
+
+
+@batch_router.post("/")
+async def batch(batch_request: BatchRequest) -> ORJSONResponse:
+    """
+    批量执行只读子请求（并发执行，按请求顺序返回各自的响应）
+    
+    Args:
+        batch_request: 批量请求
+    
+    Returns:
+        包含每个子请求响应的列表
+    """
+    results = await asyncio.gather(*(_run_sub_request(item) for item in batch_request.requests))
+    return success_response(
+        message="批量请求执行完成",
+        data=list(results)
+    )
@@ -1,25 +1,28 @@
 """消费行为分析和任务规划相关API接口"""
 from fastapi import APIRouter, Query, HTTPException, Body
-from typing import Optional, Dict, Any
+from fastapi.responses import ORJSONResponse, Response
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import date, datetime, timedelta
 from app.dao import ConsumptionDAO, UserDAO
+from app.models.consumption import ConsumptionView
 from app.settings.response import success_response, error_response
 from app.agents.consumption_analyzer import analyze_and_plan, execute_agent_task
 from app.agents.advanced_consumption_agent import AdvancedConsumptionAgent
+from app.agents.mcp_tool import amarkdown_to_pdf_bytes
+from app.utils.date_utils import parse_date
 
 # 创建消费行为分析相关的路由器
 consumption_analysis_router = APIRouter(prefix="/analysis", tags=["analysis"])
 
 
-@consumption_analysis_router.get("/user/{user_id}/consumption-patterns", response_model=dict)
-async def get_consumption_analysis(
+async def _load_analysis_inputs(
     user_id: int,
-    start_date: date = Query(..., description="开始日期"),
-    end_date: date = Query(..., description="结束日期"),
-    transaction_type: Optional[str] = Query("支出", description="交易类型（收入/支出）")
-) -> dict:
+    start_date: date,
+    end_date: date,
+    transaction_type: Optional[str]
+) -> Tuple[Any, List[ConsumptionView], Optional[Any]]:
     """
-    获取用户的消费行为分析和任务规划
+    校验用户和日期范围并获取待分析的消费记录（消费行为分析接口共用）
     
     Args:
         user_id: 用户ID
@@ -28,12 +31,12 @@ async def get_consumption_analysis(
         transaction_type: 交易类型（收入/支出）
     
     Returns:
-        包含消费分析和任务规划的响应
+        (用户, 消费记录列表, 错误响应)，校验通过时错误响应为None
     """
     # 验证用户是否存在
-    user = await UserDAO.get_by_id(user_id)
+    user = await UserDAO.get_cached_by_id(user_id)
     if not user:
-        return error_response(
+        return None, [], error_response(
             code=4004,
             message="用户不存在",
             status_code=404
@@ -41,14 +44,14 @@ async def get_consumption_analysis(
     
     # 验证日期范围
     if start_date > end_date:
-        return error_response(
+        return user, [], error_response(
             code=4003,
             message="开始日期不能晚于结束日期",
             status_code=400
         )
     
-    # 获取消费记录
-    consumptions = await ConsumptionDAO.get_by_date_range(
+    # 获取消费记录（只读视图，不实例化ORM对象）
+    consumptions = await ConsumptionDAO.get_views_by_date_range(
         user_id=user_id,
         start_date=start_date,
         end_date=end_date,
@@ -56,14 +59,40 @@ async def get_consumption_analysis(
     )
     
     if not consumptions:
-        return error_response(
+        return user, [], error_response(
             code=4005,
             message="该时间范围内没有消费记录",
             status_code=404
         )
     
+    return user, consumptions, None
+
+
+@consumption_analysis_router.get("/user/{user_id}/consumption-patterns")
+async def get_consumption_analysis(
+    user_id: int,
+    start_date: date = Query(..., description="开始日期"),
+    end_date: date = Query(..., description="结束日期"),
+    transaction_type: Optional[str] = Query("支出", description="交易类型（收入/支出）")
+) -> ORJSONResponse:
+    """
+    获取用户的消费行为分析和任务规划
+    
+    Args:
+        user_id: 用户ID
+        start_date: 开始日期
+        end_date: 结束日期
+        transaction_type: 交易类型（收入/支出）
+    
+    Returns:
+        包含消费分析和任务规划的响应
+    """
+    user, consumptions, error = await _load_analysis_inputs(user_id, start_date, end_date, transaction_type)
+    if error is not None:
+        return error
+    
     # 分析消费行为并生成任务规划（启用文件保存功能）
-    analysis_result = analyze_and_plan(user_id, consumptions, save_to_files=True)
+    analysis_result = await analyze_and_plan(user_id, consumptions, save_to_files=True)
     
     # 构建响应数据
     response_data = {
@@ -95,11 +124,47 @@ async def get_consumption_analysis(
     )
 
 
-@consumption_analysis_router.post("/execute-task", response_model=dict)
+@consumption_analysis_router.get("/user/{user_id}/consumption-patterns/pdf")
+async def get_consumption_analysis_pdf(
+    user_id: int,
+    start_date: date = Query(..., description="开始日期"),
+    end_date: date = Query(..., description="结束日期"),
+    transaction_type: Optional[str] = Query("支出", description="交易类型（收入/支出）")
+) -> Response:
+    """
+    生成用户的消费行为分析报告并直接以PDF返回（报告不保存到工作空间）
+    
+    Args:
+        user_id: 用户ID
+        start_date: 开始日期
+        end_date: 结束日期
+        transaction_type: 交易类型（收入/支出）
+    
+    Returns:
+        PDF报告响应（整份PDF已在内存中，直接作为响应体返回并带Content-Length）
+    """
+    user, consumptions, error = await _load_analysis_inputs(user_id, start_date, end_date, transaction_type)
+    if error is not None:
+        return error
+    
+    # 分析消费行为并生成报告（包含图表，但不保存Markdown和PDF文件）
+    analysis_result = await analyze_and_plan(user_id, consumptions, save_to_files=False, include_charts=True)
+    
+    # 在内存中渲染PDF并直接写入响应，省去写文件再读取的磁盘往返
+    pdf_bytes = await amarkdown_to_pdf_bytes(analysis_result["full_report"])
+    filename = f"user_{user_id}_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@consumption_analysis_router.post("/execute-task")
 async def execute_task(
     task_id: str = Query(..., description="任务ID"),
     task_description: str = Query(..., description="任务描述")
-) -> dict:
+) -> ORJSONResponse:
     """
     执行指定的任务
     
@@ -126,11 +191,11 @@ async def execute_task(
         )
 
 
-@consumption_analysis_router.get("/user/{user_id}/recent-analysis", response_model=dict)
+@consumption_analysis_router.get("/user/{user_id}/recent-analysis")
 async def get_recent_consumption_analysis(
     user_id: int,
     days: int = Query(30, ge=1, le=365, description="过去天数")
-) -> dict:
+) -> ORJSONResponse:
     """
     获取用户最近一段时间的消费行为分析
     
@@ -154,13 +219,13 @@ async def get_recent_consumption_analysis(
     )
 
 
-@consumption_analysis_router.post("/user/{user_id}/custom-analysis", response_model=dict)
+@consumption_analysis_router.post("/user/{user_id}/custom-analysis")
 async def custom_consumption_analysis(
     user_id: int,
     start_date: str = Body(..., description="开始日期，格式YYYY-MM-DD", example="2024-01-01"),
     end_date: str = Body(..., description="结束日期，格式YYYY-MM-DD", example="2024-12-31"),
     analysis_needs: str = Body(..., description="分析需求描述", example="分析我的饮食消费模式，找出省钱机会")
-) -> dict:
+) -> ORJSONResponse:
     """
     根据用户自定义需求进行消费分析
     
@@ -175,7 +240,7 @@ async def custom_consumption_analysis(
     """
     try:
         # 验证用户是否存在
-        user = await UserDAO.get_by_id(user_id)
+        user = await UserDAO.get_cached_by_id(user_id)
         if not user:
             return error_response(
                 code=4004,
@@ -184,8 +249,8 @@ async def custom_consumption_analysis(
         
         # 验证日期格式和范围
         try:
-            start = datetime.strptime(start_date, "%Y-%m-%d").date()
-            end = datetime.strptime(end_date, "%Y-%m-%d").date()
+            start = parse_date(start_date)
+            end = parse_date(end_date)
         except ValueError:
             return error_response(
                 code=4001,
@@ -234,16 +299,14 @@ async def custom_consumption_analysis(
             },
             "execution_plan": {
                 "task_count": len(results.get('plan', [])),
-                "execution_status": {
-                    task_id: "成功" if task_result['success'] else "失败" 
-                    for task_id, task_result in results.get('execution_results', {}).items()
-                }
+                "execution_status": results.get('execution_status', {})
             },
             "timestamp": datetime.now().isoformat()
         }
         
         # 添加报告路径信息
-        report_paths = results.get('report_paths', {})
+        result_data = results.get('result_data', {})
+        report_paths = result_data.get('report_paths', {})
         if report_paths:
             response_data["report_files"] = {
                 "markdown_path": report_paths.get('markdown_path', ""),
@@ -252,13 +315,17 @@ async def custom_consumption_analysis(
         
         # 添加失败任务的错误信息
         failed_tasks = {}
-        for task_id, task_result in results.get('execution_results', {}).items():
-            if not task_result['success']:
-                failed_tasks[task_id] = task_result.get('error', '未知错误')
+        for task_id, status in results.get('execution_status', {}).items():
+            if status != "成功":
+                failed_tasks[task_id] = status
         
         if failed_tasks:
             response_data["failed_tasks"] = failed_tasks
         
+        # 时间范围内没有数据时附带提示信息
+        if result_data.get('message'):
+            response_data["message"] = result_data['message']
+        
         return success_response(
             message="自定义消费分析完成",
             data=response_data
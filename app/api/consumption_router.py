@@ -1,22 +1,64 @@
 """消费行为相关API接口"""
+from operator import attrgetter
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
-from datetime import date
-from app.schemas.consumption_schemas import Consumption, ConsumptionCreate, ConsumptionUpdate
+from datetime import date, datetime
+from app.schemas.consumption_schemas import ConsumptionCreate, ConsumptionBulkCreate, ConsumptionUpdate
 from app.models.consumption import Consumption as ConsumptionModel
 from app.dao import ConsumptionDAO, UserDAO
 from app.settings.response import success_response, error_response, paginate_response
+from app.utils.cursor_utils import encode_cursor, decode_cursor
 
 # 创建消费行为相关的路由器
 consumption_router = APIRouter(prefix="/consumptions", tags=["consumptions"])
 
 
-@consumption_router.post("/", response_model=dict)
-async def create_consumption(consumption_data: ConsumptionCreate) -> dict:
+# 消费记录响应字段，单条记录和列表接口共用（列表接口按这些字段查询）
+CONSUMPTION_FIELDS = (
+    "id", "user_id", "transaction_time", "transaction_type", "amount",
+    "merchant_name", "category", "created_at", "updated_at", "is_deleted"
+)
+# 按CONSUMPTION_FIELDS顺序一次取出消费记录的全部字段值
+_consumption_getter = attrgetter(*CONSUMPTION_FIELDS)
+
+
+def consumption_to_dict(consumption: ConsumptionModel) -> dict:
+    """
+    将消费记录转换为响应数据字典
+    
+    Args:
+        consumption: 消费记录
+    
+    Returns:
+        可直接序列化的字典（datetime由orjson直接序列化为ISO格式，Decimal需转换为float）
+    """
+    data = dict(zip(CONSUMPTION_FIELDS, _consumption_getter(consumption)))
+    data["amount"] = float(data["amount"])
+    return data
+
+
+def consumption_rows_to_dicts(rows: List[dict]) -> List[dict]:
+    """
+    将QuerySet.values()查询得到的消费记录行批量转换为响应数据字典（原地转换）
+    datetime字段由orjson直接序列化，只需将Decimal金额转换为float
+    
+    Args:
+        rows: 包含CONSUMPTION_FIELDS字段的字典列表
+    
+    Returns:
+        可直接序列化的字典列表
+    """
+    for row in rows:
+        row["amount"] = float(row["amount"])
+    return rows
+
+
+@consumption_router.post("/")
+async def create_consumption(consumption_data: ConsumptionCreate) -> ORJSONResponse:
     """创建消费记录"""
     # 验证用户是否存在
-    user = await UserDAO.get_by_id(consumption_data.user_id)
-    if not user:
+    if not await UserDAO.exists(consumption_data.user_id):
         return error_response(
             code=4004,
             message="用户不存在",
@@ -27,19 +69,8 @@ async def create_consumption(consumption_data: ConsumptionCreate) -> dict:
     consumption_dict = consumption_data.dict()
     consumption = await ConsumptionDAO.create(consumption_dict)
     
-    # 手动构建响应数据，避免直接序列化datetime
-    data = {
-        "id": consumption.id,
-        "user_id": consumption.user_id,
-        "transaction_time": consumption.transaction_time.isoformat(),
-        "transaction_type": consumption.transaction_type,
-        "amount": float(consumption.amount),
-        "merchant_name": consumption.merchant_name,
-        "category": consumption.category,
-        "created_at": consumption.created_at.isoformat(),
-        "updated_at": consumption.updated_at.isoformat(),
-        "is_deleted": consumption.is_deleted
-    }
+    # 手动构建响应数据（datetime由orjson直接序列化）
+    data = consumption_to_dict(consumption)
     
     return success_response(
         message="消费记录创建成功",
@@ -47,8 +78,34 @@ async def create_consumption(consumption_data: ConsumptionCreate) -> dict:
     )
 
 
-@consumption_router.get("/{consumption_id}", response_model=dict)
-async def get_consumption(consumption_id: int) -> dict:
+@consumption_router.post("/bulk")
+async def bulk_create_consumptions(
+    bulk_data: ConsumptionBulkCreate,
+    skip_duplicates: bool = Query(False, description="是否跳过已存在或重复的记录（用户、交易时间、金额、对方户名都相同）")
+) -> ORJSONResponse:
+    """批量创建消费记录（用于导入，所有记录在一个事务中写入）"""
+    # 一次查询验证所有关联用户是否存在
+    user_ids = {item.user_id for item in bulk_data.items}
+    missing = user_ids - await UserDAO.existing_ids(list(user_ids))
+    if missing:
+        return error_response(
+            code=4004,
+            message="用户不存在",
+            data={"user_ids": sorted(missing)},
+            status_code=404
+        )
+    
+    # 批量创建消费记录
+    created = await ConsumptionDAO.bulk_create([item.dict() for item in bulk_data.items], skip_duplicates)
+    
+    return success_response(
+        message="消费记录批量创建成功",
+        data={"created": created, "skipped": len(bulk_data.items) - created}
+    )
+
+
+@consumption_router.get("/{consumption_id}")
+async def get_consumption(consumption_id: int) -> ORJSONResponse:
     """获取消费记录详情"""
     consumption = await ConsumptionDAO.get_by_id(consumption_id)
     if not consumption:
@@ -58,19 +115,8 @@ async def get_consumption(consumption_id: int) -> dict:
             status_code=404
         )
     
-    # 手动构建响应数据，避免直接序列化datetime
-    data = {
-        "id": consumption.id,
-        "user_id": consumption.user_id,
-        "transaction_time": consumption.transaction_time.isoformat(),
-        "transaction_type": consumption.transaction_type,
-        "amount": float(consumption.amount),
-        "merchant_name": consumption.merchant_name,
-        "category": consumption.category,
-        "created_at": consumption.created_at.isoformat(),
-        "updated_at": consumption.updated_at.isoformat(),
-        "is_deleted": consumption.is_deleted
-    }
+    # 手动构建响应数据（datetime由orjson直接序列化）
+    data = consumption_to_dict(consumption)
     
     return success_response(
         message="获取消费记录成功",
@@ -78,19 +124,18 @@ async def get_consumption(consumption_id: int) -> dict:
     )
 
 
-@consumption_router.put("/{consumption_id}", response_model=dict)
+@consumption_router.put("/{consumption_id}")
 async def update_consumption(
     consumption_id: int,
     consumption_update: ConsumptionUpdate
-) -> dict:
+) -> ORJSONResponse:
     """更新消费记录"""
-    # 构建更新数据（过滤掉None值）
-    update_data = {k: v for k, v in consumption_update.dict().items() if v is not None}
+    # 构建更新数据（只取请求中显式提供且不为None的字段）
+    update_data = consumption_update.dict(exclude_unset=True, exclude_none=True)
     
     # 如果更新了用户ID，验证用户是否存在
     if "user_id" in update_data:
-        user = await UserDAO.get_by_id(update_data["user_id"])
-        if not user:
+        if not await UserDAO.exists(update_data["user_id"]):
             return error_response(
             code=4004,
             message="用户不存在",
@@ -106,19 +151,8 @@ async def update_consumption(
             status_code=404
         )
     
-    # 手动构建响应数据，避免直接序列化datetime
-    data = {
-        "id": updated_consumption.id,
-        "user_id": updated_consumption.user_id,
-        "transaction_time": updated_consumption.transaction_time.isoformat(),
-        "transaction_type": updated_consumption.transaction_type,
-        "amount": float(updated_consumption.amount),
-        "merchant_name": updated_consumption.merchant_name,
-        "category": updated_consumption.category,
-        "created_at": updated_consumption.created_at.isoformat(),
-        "updated_at": updated_consumption.updated_at.isoformat(),
-        "is_deleted": updated_consumption.is_deleted
-    }
+    # 手动构建响应数据（datetime由orjson直接序列化）
+    data = consumption_to_dict(updated_consumption)
     
     return success_response(
         message="消费记录更新成功",
@@ -126,8 +160,8 @@ async def update_consumption(
     )
 
 
-@consumption_router.delete("/{consumption_id}", response_model=dict)
-async def delete_consumption(consumption_id: int) -> dict:
+@consumption_router.delete("/{consumption_id}")
+async def delete_consumption(consumption_id: int) -> ORJSONResponse:
     """删除消费记录（软删除）"""
     success = await ConsumptionDAO.delete(consumption_id)
     if not success:
@@ -139,47 +173,53 @@ async def delete_consumption(consumption_id: int) -> dict:
     )
 
 
-@consumption_router.get("/user/{user_id}", response_model=dict)
+@consumption_router.get("/user/{user_id}")
 async def get_user_consumptions(
     user_id: int,
     page: int = Query(1, ge=1, description="页码"),
-    page_size: int = Query(20, ge=1, le=100, description="每页数量")
-) -> dict:
-    """获取用户的消费记录列表"""
+    page_size: int = Query(20, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），提供时忽略页码")
+) -> ORJSONResponse:
+    """获取用户的消费记录列表（支持页码分页和游标分页，深分页建议使用游标）"""
     # 验证用户是否存在
-    user = await UserDAO.get_by_id(user_id)
-    if not user:
+    if not await UserDAO.exists(user_id):
         return error_response(
             code=4004,
             message="用户不存在",
             status_code=404
         )
     
-    # 获取消费记录列表
-    consumptions, total = await ConsumptionDAO.get_by_user(user_id, page, page_size)
-    
-    # 手动构建响应数据列表，避免直接序列化datetime
-    consumptions_pydantic = []
-    for consumption in consumptions:
-        consumption_data = {
-            "id": consumption.id,
-            "user_id": consumption.user_id,
-            "transaction_time": consumption.transaction_time.isoformat(),
-            "transaction_type": consumption.transaction_type,
-            "amount": float(consumption.amount),
-            "merchant_name": consumption.merchant_name,
-            "category": consumption.category,
-            "created_at": consumption.created_at.isoformat(),
-            "updated_at": consumption.updated_at.isoformat(),
-            "is_deleted": consumption.is_deleted
-        }
-        consumptions_pydantic.append(consumption_data)
-    
-    # 构建分页元数据
-    pagination_info = paginate_response(
-        page=page,
-        page_size=page_size,
-        total=total
+    # 解析游标：上一页最后一条记录的交易时间和ID
+    after = None
+    if cursor:
+        try:
+            last_time, last_id = decode_cursor(cursor)
+            after = (datetime.fromisoformat(last_time), int(last_id))
+        except (ValueError, TypeError):
+            return error_response(
+                code=4001,
+                message="分页游标无效",
+                status_code=400
+            )
+    
+    # 获取消费记录列表（使用游标时不统计总数）
+    rows, total = await ConsumptionDAO.get_values_by_user(user_id, CONSUMPTION_FIELDS, page, page_size, after)
+    
+    # 手动构建响应数据列表（datetime由orjson直接序列化）
+    consumptions_pydantic = consumption_rows_to_dicts(rows)
+    
+    # 构建分页元数据，满页时返回下一页的游标
+    if total is not None:
+        pagination_info = paginate_response(
+            page=page,
+            page_size=page_size,
+            total=total
+        )
+    else:
+        pagination_info = {"page_size": page_size}
+    last_row = consumptions_pydantic[-1] if len(consumptions_pydantic) == page_size else None
+    pagination_info["next_cursor"] = (
+        encode_cursor(last_row["transaction_time"], last_row["id"]) if last_row else None
     )
     
     return success_response(
@@ -189,17 +229,16 @@ async def get_user_consumptions(
     )
 
 
-@consumption_router.get("/user/{user_id}/statistics", response_model=dict)
+@consumption_router.get("/user/{user_id}/statistics")
 async def get_user_consumption_statistics(
     user_id: int,
     start_date: date = Query(..., description="开始日期"),
     end_date: date = Query(..., description="结束日期"),
     transaction_type: str = Query("支出", description="交易类型（收入/支出）")
-) -> dict:
+) -> ORJSONResponse:
     """获取用户的消费统计数据"""
     # 验证用户是否存在
-    user = await UserDAO.get_by_id(user_id)
-    if not user:
+    if not await UserDAO.exists(user_id):
         return error_response(
             code=4004,
             message="用户不存在",
@@ -1,22 +1,42 @@
 """用户相关API接口"""
+from operator import attrgetter
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from app.schemas.user_schemas import User, UserCreate, UserUpdate
-from tortoise.contrib.pydantic import pydantic_model_creator
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
+from app.schemas.user_schemas import UserCreate, UserUpdate
 from app.models.user import User as UserModel
 from app.dao import UserDAO
 from app.settings.response import success_response, error_response, paginate_response
+from app.utils.cursor_utils import encode_cursor, decode_cursor
 
 # 创建用户相关的路由器
 user_router = APIRouter(prefix="/users", tags=["users"])
 
 
-@user_router.post("/", response_model=dict)
-async def create_user(user_data: UserCreate) -> dict:
+# 用户响应字段，单个用户和列表接口共用（列表接口按这些字段查询，结果可直接序列化）
+USER_FIELDS = ("id", "name", "gender", "phone", "created_at", "updated_at", "is_deleted")
+# 按USER_FIELDS顺序一次取出用户的全部字段值
+_user_getter = attrgetter(*USER_FIELDS)
+
+
+def user_to_dict(user: UserModel) -> dict:
+    """
+    将用户转换为响应数据字典
+    
+    Args:
+        user: 用户
+    
+    Returns:
+        可直接序列化的字典（datetime由orjson直接序列化为ISO格式）
+    """
+    return dict(zip(USER_FIELDS, _user_getter(user)))
+
+
+@user_router.post("/")
+async def create_user(user_data: UserCreate) -> ORJSONResponse:
     """创建新用户"""
     # 检查手机号是否已存在
-    existing_user = await UserDAO.get_by_phone(user_data.phone)
-    if existing_user:
+    if await UserDAO.phone_exists(user_data.phone):
         return error_response(
             code=4001,
             message="手机号已被注册",
@@ -27,16 +47,8 @@ async def create_user(user_data: UserCreate) -> dict:
     user_dict = user_data.dict()
     user = await UserDAO.create(user_dict)
     
-    # 手动构建响应数据，避免直接序列化datetime
-    data = {
-        "id": user.id,
-        "name": user.name,
-        "gender": user.gender,
-        "phone": user.phone,
-        "created_at": user.created_at.isoformat(),
-        "updated_at": user.updated_at.isoformat(),
-        "is_deleted": user.is_deleted
-    }
+    # 手动构建响应数据（datetime由orjson直接序列化）
+    data = user_to_dict(user)
     
     return success_response(
         message="用户创建成功",
@@ -44,8 +56,8 @@ async def create_user(user_data: UserCreate) -> dict:
     )
 
 
-@user_router.get("/{user_id}", response_model=dict)
-async def get_user(user_id: int) -> dict:
+@user_router.get("/{user_id}")
+async def get_user(user_id: int) -> ORJSONResponse:
     """获取用户详情"""
     user = await UserDAO.get_by_id(user_id)
     if not user:
@@ -55,16 +67,8 @@ async def get_user(user_id: int) -> dict:
             status_code=404
         )
     
-    # 手动构建响应数据，避免直接序列化datetime
-    data = {
-        "id": user.id,
-        "name": user.name,
-        "gender": user.gender,
-        "phone": user.phone,
-        "created_at": user.created_at.isoformat(),
-        "updated_at": user.updated_at.isoformat(),
-        "is_deleted": user.is_deleted
-    }
+    # 手动构建响应数据（datetime由orjson直接序列化）
+    data = user_to_dict(user)
     
     return success_response(
         message="获取用户成功",
@@ -72,16 +76,15 @@ async def get_user(user_id: int) -> dict:
     )
 
 
-@user_router.put("/{user_id}", response_model=dict)
-async def update_user(user_id: int, user_update: UserUpdate) -> dict:
+@user_router.put("/{user_id}")
+async def update_user(user_id: int, user_update: UserUpdate) -> ORJSONResponse:
     """更新用户信息"""
-    # 构建更新数据（过滤掉None值）
-    update_data = {k: v for k, v in user_update.dict().items() if v is not None}
+    # 构建更新数据（只取请求中显式提供且不为None的字段）
+    update_data = user_update.dict(exclude_unset=True, exclude_none=True)
     
     # 检查手机号是否已被其他用户使用
     if "phone" in update_data:
-        existing_user = await UserDAO.get_by_phone(update_data["phone"])
-        if existing_user and existing_user.id != user_id:
+        if await UserDAO.phone_exists(update_data["phone"], exclude_user_id=user_id):
             return error_response(
             code=4002,
             message="手机号已被其他用户使用",
@@ -97,16 +100,8 @@ async def update_user(user_id: int, user_update: UserUpdate) -> dict:
             status_code=404
         )
     
-    # 手动构建响应数据，避免直接序列化datetime
-    data = {
-        "id": updated_user.id,
-        "name": updated_user.name,
-        "gender": updated_user.gender,
-        "phone": updated_user.phone,
-        "created_at": updated_user.created_at.isoformat(),
-        "updated_at": updated_user.updated_at.isoformat(),
-        "is_deleted": updated_user.is_deleted
-    }
+    # 手动构建响应数据（datetime由orjson直接序列化）
+    data = user_to_dict(updated_user)
     
     return success_response(
         message="用户更新成功",
@@ -114,8 +109,8 @@ async def update_user(user_id: int, user_update: UserUpdate) -> dict:
     )
 
 
-@user_router.delete("/{user_id}", response_model=dict)
-async def delete_user(user_id: int) -> dict:
+@user_router.delete("/{user_id}")
+async def delete_user(user_id: int) -> ORJSONResponse:
     """删除用户（软删除）"""
     success = await UserDAO.delete(user_id)
     if not success:
@@ -131,41 +126,49 @@ async def delete_user(user_id: int) -> dict:
     )
 
 
-@user_router.get("/", response_model=dict)
-async def list_users(page: int = 1, page_size: int = 10) -> dict:
-    """获取用户列表（分页）"""
+@user_router.get("/")
+async def list_users(page: int = 1, page_size: int = 10, cursor: Optional[str] = None) -> ORJSONResponse:
+    """获取用户列表（支持页码分页和游标分页，提供cursor时忽略页码）"""
     # 参数验证
     if page < 1:
         page = 1
     if page_size < 1 or page_size > 100:
         page_size = 10
     
-    # 获取用户列表
-    users, total = await UserDAO.list_users(page, page_size)
-    
-    # 手动构建响应数据列表，避免直接序列化datetime
-    users_pydantic = []
-    for user in users:
-        user_data = {
-            "id": user.id,
-            "name": user.name,
-            "gender": user.gender,
-            "phone": user.phone,
-            "created_at": user.created_at.isoformat(),
-            "updated_at": user.updated_at.isoformat(),
-            "is_deleted": user.is_deleted
-        }
-        users_pydantic.append(user_data)
-    
-    # 构建分页元数据
-    pagination_info = paginate_response(
-        page=page,
-        page_size=page_size,
-        total=total
+    # 解析游标：上一页最后一个用户的ID
+    after_id = None
+    if cursor:
+        try:
+            (after_id,) = decode_cursor(cursor)
+            after_id = int(after_id)
+        except (ValueError, TypeError):
+            return error_response(
+                code=4001,
+                message="分页游标无效",
+                status_code=400
+            )
+    
+    # 获取用户列表（使用游标时不统计总数，只取需要的字段，不实例化ORM对象）
+    rows, total = await UserDAO.list_users_values(USER_FIELDS, page, page_size, after_id)
+    
+    # 查询结果只含可直接序列化的字段（datetime由orjson直接序列化）
+    users_pydantic = rows
+    
+    # 构建分页元数据，满页时返回下一页的游标
+    if total is not None:
+        pagination_info = paginate_response(
+            page=page,
+            page_size=page_size,
+            total=total
+        )
+    else:
+        pagination_info = {"page_size": page_size}
+    pagination_info["next_cursor"] = (
+        encode_cursor(rows[-1]["id"]) if len(rows) == page_size else None
     )
     
     return success_response(
         message="获取用户列表成功",
         data=users_pydantic,
         pagination=pagination_info
-    )
\ No newline at end of file
+    )
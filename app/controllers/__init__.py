@@ -1,19 +1,2 @@
-# Controllers package for handling business logic and routes
-from app import app
-from fastapi import APIRouter
-
-# Create router
-router = APIRouter()
-
-@router.get("/")
-async def root():
-    """Root endpoint for the Consumer Assistant API"""
-    return {"message": "Welcome to Consumer Assistant API"}
-
-@router.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
-
-# Register routes with main app
-app.include_router(router)
\ No newline at end of file
+# Controllers package for handling business logic
+# 路由统一通过 app.api.api_router 注册，本包不再在导入时向应用注册重复的根路径和健康检查端点
\ No newline at end of file
@@ -1,9 +1,136 @@
 """消费行为数据访问对象"""
-from typing import List, Optional
+import time
+import asyncio
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, date
-from tortoise.expressions import Q
-from app.models.consumption import Consumption
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F, Q
+from tortoise.functions import Sum
+from tortoise.transactions import in_transaction
+from app.models.consumption import Consumption, ConsumptionDailyAgg, ConsumptionView
 from app.database import ensure_db_connection
+from app.settings.config import config
+
+
+# 日期范围查询使用的一天起止时间（模块加载时创建一次）
+_MIN_TIME = datetime.min.time()
+_MAX_TIME = datetime.max.time()
+
+
+# 用户消费记录总数缓存（用户ID -> (写入时间, 总数)），LRU淘汰，创建和删除时增量维护
+_consumption_count_cache: "OrderedDict[int, Tuple[float, int]]" = OrderedDict()
+
+
+async def _cached_consumption_count(user_id: int) -> int:
+    """获取用户未删除的消费记录总数，TTL内复用缓存结果，过期后重新COUNT"""
+    entry = _consumption_count_cache.get(user_id)
+    if entry is not None:
+        if time.monotonic() - entry[0] < config.COUNT_CACHE_TTL:
+            _consumption_count_cache.move_to_end(user_id)
+            return entry[1]
+        del _consumption_count_cache[user_id]
+    
+    total = await Consumption.filter(user_id=user_id, is_deleted=False).count()
+    _consumption_count_cache[user_id] = (time.monotonic(), total)
+    while len(_consumption_count_cache) > config.USER_CACHE_SIZE:
+        _consumption_count_cache.popitem(last=False)
+    return total
+
+
+def _adjust_consumption_count(user_id: int, delta: int):
+    """增量调整已缓存的用户消费记录总数（未缓存时不处理，下次查询时再COUNT）"""
+    entry = _consumption_count_cache.get(user_id)
+    if entry is not None:
+        _consumption_count_cache[user_id] = (entry[0], entry[1] + delta)
+
+
+def _daily_agg_key(consumption: Consumption) -> Tuple[int, date, str, str]:
+    """消费记录在日汇总表中对应的键（用户ID, 日期, 交易类型, 分类）"""
+    return (
+        consumption.user_id,
+        consumption.transaction_time.date(),
+        consumption.transaction_type,
+        consumption.category or "未分类"
+    )
+
+
+# PostgreSQL下日汇总累加使用单条UPSERT：不存在时插入，存在（或被并发插入）时原地累加
+_DAILY_AGG_UPSERT = (
+    "INSERT INTO consumption_daily_agg (user_id, day, transaction_type, category, sum_amount, cnt) "
+    "VALUES ($1, $2, $3, $4, $5, $6) "
+    "ON CONFLICT (user_id, day, transaction_type, category) DO UPDATE SET "
+    "sum_amount = consumption_daily_agg.sum_amount + EXCLUDED.sum_amount, "
+    "cnt = consumption_daily_agg.cnt + EXCLUDED.cnt"
+)
+
+
+# 重建日汇总表：按(用户, 日期, 交易类型, 分类)聚合未删除的消费记录，空分类记为“未分类”
+_DAILY_AGG_REBUILD = (
+    "INSERT INTO consumption_daily_agg (user_id, day, transaction_type, category, sum_amount, cnt) "
+    "SELECT user_id, {day}, transaction_type, COALESCE(category, '未分类'), SUM(amount), COUNT(*) "
+    "FROM consumptions WHERE is_deleted = false GROUP BY 1, 2, 3, 4"
+)
+# 交易时间取日期的表达式（与_daily_agg_key一致按UTC取日期，SQLite的date()会把带时区的时间换算为UTC）
+_DAILY_AGG_DAY_EXPR = {
+    "postgres": "(transaction_time AT TIME ZONE 'UTC')::date",
+}
+
+
+async def _apply_daily_delta(key: Tuple[int, date, str, str], amount_delta: Decimal, count_delta: int):
+    """
+    将金额和笔数的增量累加到日汇总表（PostgreSQL使用INSERT ... ON CONFLICT一条语句完成，
+    其他数据库先原地累加，不存在时在保存点内插入）
+    
+    Args:
+        key: 汇总键（用户ID, 日期, 交易类型, 分类）
+        amount_delta: 金额增量
+        count_delta: 笔数增量
+    """
+    # 模型的数据库连接在事务中即为当前事务的连接
+    db = ConsumptionDailyAgg._meta.db
+    if db.capabilities.dialect == "postgres":
+        await db.execute_query(_DAILY_AGG_UPSERT, [*key, amount_delta, count_delta])
+        return
+    
+    user_id, day, transaction_type, category = key
+    lookup = {"user_id": user_id, "day": day, "transaction_type": transaction_type, "category": category}
+    updated = await ConsumptionDailyAgg.filter(**lookup).update(
+        sum_amount=F("sum_amount") + amount_delta,
+        cnt=F("cnt") + count_delta
+    )
+    if updated:
+        return
+    try:
+        # 嵌套事务即保存点，插入冲突只回滚这一步，外层事务仍可继续
+        async with in_transaction():
+            await ConsumptionDailyAgg.create(**lookup, sum_amount=amount_delta, cnt=count_delta)
+    except IntegrityError:
+        # 并发请求已插入同一行，改为累加
+        await ConsumptionDailyAgg.filter(**lookup).update(
+            sum_amount=F("sum_amount") + amount_delta,
+            cnt=F("cnt") + count_delta
+        )
+
+
+def _import_key(user_id: int, transaction_time: datetime, amount: Any, merchant_name: str) -> Tuple[int, datetime, Decimal, str]:
+    """导入去重使用的键（用户ID, 交易时间, 金额, 对方户名），时间统一为默认时区下不带时区的时间"""
+    if transaction_time.tzinfo is not None:
+        transaction_time = transaction_time.astimezone(timezone.get_default_timezone()).replace(tzinfo=None)
+    return user_id, transaction_time, Decimal(amount).quantize(Decimal("0.01")), merchant_name
+
+
+async def _existing_import_keys(consumptions: List[Consumption]) -> set:
+    """一次查询取出导入时间范围内已存在的记录键（只查询涉及的用户）"""
+    times = [consumption.transaction_time for consumption in consumptions]
+    rows = await Consumption.filter(
+        user_id__in={consumption.user_id for consumption in consumptions},
+        is_deleted=False,
+        transaction_time__range=(min(times), max(times))
+    ).values_list("user_id", "transaction_time", "amount", "merchant_name")
+    return {_import_key(*row) for row in rows}
 
 
 class ConsumptionDAO:
@@ -19,27 +146,111 @@ class ConsumptionDAO:
     async def create(consumption_data: dict) -> Consumption:
         """创建消费记录"""
         await ensure_db_connection()
-        return await Consumption.create(**consumption_data)
+        async with in_transaction():
+            consumption = await Consumption.create(**consumption_data)
+            await _apply_daily_delta(_daily_agg_key(consumption), Decimal(consumption.amount), 1)
+        _adjust_consumption_count(consumption.user_id, 1)
+        return consumption
+    
+    @staticmethod
+    async def bulk_create(items: List[dict], skip_duplicates: bool = False) -> int:
+        """
+        批量创建消费记录（每批一条多行INSERT），日汇总按汇总键合并后各更新一次
+        
+        Args:
+            items: 消费记录数据列表
+            skip_duplicates: 是否跳过重复记录（用户、交易时间、金额、对方户名都相同的记录，
+                包括已存在的记录和本次导入中的重复项），用于重复导入同一份账单
+        
+        Returns:
+            创建的记录数
+        """
+        await ensure_db_connection()
+        consumptions = [Consumption(**item) for item in items]
+        if not consumptions:
+            return 0
+        
+        async with in_transaction():
+            if skip_duplicates:
+                # 一次查询取出已存在的记录键，在插入前过滤（保持日汇总和总数与实际插入的记录一致）
+                seen = await _existing_import_keys(consumptions)
+                unique = []
+                for consumption in consumptions:
+                    key = _import_key(
+                        consumption.user_id, consumption.transaction_time,
+                        consumption.amount, consumption.merchant_name
+                    )
+                    if key not in seen:
+                        seen.add(key)
+                        unique.append(consumption)
+                consumptions = unique
+            
+            # 按汇总键合并金额和笔数，每个键只更新一次日汇总
+            deltas: Dict[Tuple[int, date, str, str], List[Any]] = {}
+            user_counts: Dict[int, int] = {}
+            for consumption in consumptions:
+                key = _daily_agg_key(consumption)
+                entry = deltas.get(key)
+                if entry is None:
+                    deltas[key] = [Decimal(consumption.amount), 1]
+                else:
+                    entry[0] += Decimal(consumption.amount)
+                    entry[1] += 1
+                user_counts[consumption.user_id] = user_counts.get(consumption.user_id, 0) + 1
+            
+            if consumptions:
+                await Consumption.bulk_create(consumptions, batch_size=1000)
+            for key, (amount, count) in deltas.items():
+                await _apply_daily_delta(key, amount, count)
+        
+        for user_id, count in user_counts.items():
+            _adjust_consumption_count(user_id, count)
+        return len(consumptions)
     
     @staticmethod
     async def update(consumption_id: int, update_data: dict) -> Optional[Consumption]:
         """更新消费记录"""
         await ensure_db_connection()
-        consumption = await Consumption.get_or_none(id=consumption_id, is_deleted=False)
-        if consumption:
-            await consumption.update_from_dict(update_data)
-            await consumption.save()
+        async with in_transaction():
+            # 锁定该行直到事务结束，并发更新同一记录时依次基于最新的值计算汇总增量
+            consumption = await Consumption.select_for_update().get_or_none(id=consumption_id, is_deleted=False)
+            if consumption:
+                old_key, old_amount = _daily_agg_key(consumption), Decimal(consumption.amount)
+                await consumption.update_from_dict(update_data)
+                # 只写入本次修改的列
+                await consumption.save(update_fields=[*update_data, "updated_at"])
+                
+                # 同步日汇总：汇总键不变时只累加金额差，否则从旧行移到新行
+                new_key, new_amount = _daily_agg_key(consumption), Decimal(consumption.amount)
+                if new_key == old_key:
+                    if new_amount != old_amount:
+                        await _apply_daily_delta(new_key, new_amount - old_amount, 0)
+                else:
+                    await _apply_daily_delta(old_key, -old_amount, -1)
+                    await _apply_daily_delta(new_key, new_amount, 1)
+                # 记录转移到其他用户时同步两边的总数
+                if new_key[0] != old_key[0]:
+                    _adjust_consumption_count(old_key[0], -1)
+                    _adjust_consumption_count(new_key[0], 1)
         return consumption
     
     @staticmethod
     async def delete(consumption_id: int) -> bool:
         """软删除消费记录"""
         await ensure_db_connection()
-        consumption = await Consumption.get_or_none(id=consumption_id, is_deleted=False)
-        if consumption:
-            await consumption.soft_delete()
-            return True
-        return False
+        async with in_transaction():
+            # 一条带is_deleted条件的UPDATE完成查找和软删除，并发重复删除时只有一个请求会成功
+            affected = await Consumption.bulk_soft_delete(id=consumption_id, is_deleted=False)
+            if not affected:
+                return False
+            # 删除成功后再读取日汇总需要的字段（该行已被本事务锁定）
+            user_id, transaction_time, transaction_type, category, amount = await Consumption.filter(
+                id=consumption_id
+            ).first().values_list("user_id", "transaction_time", "transaction_type", "category", "amount")
+            key = (user_id, transaction_time.date(), transaction_type, category or "未分类")
+            await _apply_daily_delta(key, -Decimal(amount), -1)
+        _adjust_consumption_count(user_id, -1)
+        return True
     
     @staticmethod
     async def get_by_user(user_id: int, page: int = 1, page_size: int = 20) -> tuple[List[Consumption], int]:
@@ -47,34 +258,67 @@ class ConsumptionDAO:
         await ensure_db_connection()
         offset = (page - 1) * page_size
         
-        # 查询总数
-        total = await Consumption.filter(user_id=user_id, is_deleted=False).count()
+        queryset = Consumption.filter(user_id=user_id, is_deleted=False)
         
-        # 查询分页数据，按交易时间倒序
-        consumptions = await Consumption.filter(user_id=user_id, is_deleted=False)\
-            .order_by("-transaction_time")\
-            .offset(offset)\
-            .limit(page_size)\
-            .all()
+        # 查询分页数据（按交易时间倒序）和总数（TTL内使用缓存），两个查询互不依赖，并发执行
+        consumptions, total = await asyncio.gather(
+            queryset.order_by("-transaction_time").offset(offset).limit(page_size).all(),
+            _cached_consumption_count(user_id)
+        )
         
         return consumptions, total
     
     @staticmethod
-    async def get_by_date_range(
+    async def get_values_by_user(
+        user_id: int,
+        fields: Tuple[str, ...],
+        page: int = 1,
+        page_size: int = 20,
+        after: Optional[Tuple[datetime, int]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        获取用户的消费记录列表（只取指定字段的字典，不实例化ORM对象），按交易时间和ID倒序
+        提供after（上一页最后一条记录的交易时间和ID）时使用键集分页，直接从索引位置继续读取，
+        不再扫描并丢弃前面的行，此时不统计总数；否则按页码分页，总数与分页数据并发查询
+        """
+        await ensure_db_connection()
+        queryset = Consumption.filter(user_id=user_id, is_deleted=False)
+        
+        if after is not None:
+            last_time, last_id = after
+            rows = await queryset.filter(
+                Q(transaction_time__lt=last_time) | Q(transaction_time=last_time, id__lt=last_id)
+            ).order_by("-transaction_time", "-id").limit(page_size).values(*fields)
+            return rows, None
+        
+        # 查询总数（TTL内使用缓存）和分页数据
+        offset = (page - 1) * page_size
+        rows, total = await asyncio.gather(
+            queryset.order_by("-transaction_time", "-id").offset(offset).limit(page_size).values(*fields),
+            _cached_consumption_count(user_id)
+        )
+        return rows, total
+    
+    @staticmethod
+    def _date_range_conditions(
         user_id: int,
         start_date: date,
         end_date: date,
         transaction_type: Optional[str] = None,
-        category: Optional[str] = None
-    ) -> List[Consumption]:
-        """按日期范围查询消费记录"""
-        await ensure_db_connection()
-        # 构建查询条件
+        category: Optional[str] = None,
+        categories: Optional[List[str]] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        keywords: Optional[List[str]] = None
+    ) -> Q:
+        """构建按日期范围查询的条件，可选的分类、金额和关键词条件直接下推到SQL"""
         conditions = Q(user_id=user_id) & Q(is_deleted=False)
         
-        # 添加日期范围条件
-        conditions &= Q(transaction_time__gte=datetime.combine(start_date, datetime.min.time()))
-        conditions &= Q(transaction_time__lte=datetime.combine(end_date, datetime.max.time()))
+        # 添加日期范围条件（单个BETWEEN，包含起止时间）
+        conditions &= Q(transaction_time__range=(
+            datetime.combine(start_date, _MIN_TIME),
+            datetime.combine(end_date, _MAX_TIME)
+        ))
         
         # 添加交易类型条件（如果提供）
         if transaction_type:
@@ -84,9 +328,69 @@ class ConsumptionDAO:
         if category:
             conditions &= Q(category=category)
         
+        # 添加多分类条件（如果提供）
+        if categories:
+            conditions &= Q(category__in=categories)
+        
+        # 添加金额范围条件（如果提供）
+        if min_amount is not None:
+            conditions &= Q(amount__gte=min_amount)
+        if max_amount is not None:
+            conditions &= Q(amount__lte=max_amount)
+        
+        # 添加商户名关键词条件（任一关键词匹配即可）
+        if keywords:
+            keyword_conditions = Q(merchant_name__icontains=keywords[0])
+            for keyword in keywords[1:]:
+                keyword_conditions |= Q(merchant_name__icontains=keyword)
+            conditions &= keyword_conditions
+        
+        return conditions
+    
+    @staticmethod
+    async def get_by_date_range(
+        user_id: int,
+        start_date: date,
+        end_date: date,
+        transaction_type: Optional[str] = None,
+        category: Optional[str] = None,
+        categories: Optional[List[str]] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        keywords: Optional[List[str]] = None
+    ) -> List[Consumption]:
+        """按日期范围查询消费记录，可选的分类、金额和关键词条件直接下推到SQL"""
+        await ensure_db_connection()
+        conditions = ConsumptionDAO._date_range_conditions(
+            user_id, start_date, end_date, transaction_type, category,
+            categories, min_amount, max_amount, keywords
+        )
+        
         # 执行查询
         return await Consumption.filter(conditions).order_by("-transaction_time").all()
     
+    @staticmethod
+    async def get_views_by_date_range(
+        user_id: int,
+        start_date: date,
+        end_date: date,
+        transaction_type: Optional[str] = None,
+        category: Optional[str] = None,
+        categories: Optional[List[str]] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        keywords: Optional[List[str]] = None
+    ) -> List[ConsumptionView]:
+        """按日期范围查询消费记录，只取需要的字段并返回轻量只读视图（不实例化ORM对象）"""
+        await ensure_db_connection()
+        conditions = ConsumptionDAO._date_range_conditions(
+            user_id, start_date, end_date, transaction_type, category,
+            categories, min_amount, max_amount, keywords
+        )
+        
+        rows = await Consumption.filter(conditions).order_by("-transaction_time").values(*ConsumptionView.FIELDS)
+        return [ConsumptionView(**row) for row in rows]
+    
     @staticmethod
     async def get_statistics_by_category(
         user_id: int,
@@ -94,40 +398,59 @@ class ConsumptionDAO:
         end_date: date,
         transaction_type: str = "支出"
     ) -> dict:
-        """获取按分类统计的消费数据"""
+        """获取按分类统计的消费数据（读取日汇总表，扫描行数只与天数和分类数有关）"""
         await ensure_db_connection()
-        # 查询指定条件的所有记录
-        records = await ConsumptionDAO.get_by_date_range(
+        queryset = ConsumptionDailyAgg.filter(
             user_id=user_id,
-            start_date=start_date,
-            end_date=end_date,
-            transaction_type=transaction_type
+            day__gte=start_date,
+            day__lte=end_date,
+            cnt__gt=0
         )
+        if transaction_type:
+            queryset = queryset.filter(transaction_type=transaction_type)
+        rows = await queryset\
+            .annotate(category_amount=Sum("sum_amount"), category_count=Sum("cnt"))\
+            .group_by("category")\
+            .order_by("-category_amount")\
+            .values("category", "category_amount", "category_count")
         
-        # 按分类统计
-        stats = {}
-        total = 0
-        
-        for record in records:
-            category_name = record.category or "未分类"
-            if category_name not in stats:
-                stats[category_name] = {
-                    "amount": 0,
-                    "count": 0
-                }
-            
-            stats[category_name]["amount"] += float(record.amount)
-            stats[category_name]["count"] += 1
-            total += float(record.amount)
+        # 按分类统计（汇总表中空分类已记为“未分类”），每个分类只转换一次数值
+        totals = [
+            (row["category"], float(row["category_amount"] or 0), int(row["category_count"] or 0))
+            for row in rows
+        ]
+        total = sum(amount for _, amount, _ in totals)
+        total_count = sum(count for _, _, count in totals)
         
-        # 计算百分比
-        for category_name in stats:
-            stats[category_name]["percentage"] = (
-                (stats[category_name]["amount"] / total * 100) if total > 0 else 0
-            )
+        # 计算百分比（总额只需判断一次）
+        scale = 100 / total if total > 0 else 0
+        stats = {
+            category_name: {"amount": amount, "count": count, "percentage": amount * scale}
+            for category_name, amount, count in totals
+        }
         
         return {
             "by_category": stats,
             "total_amount": total,
-            "total_count": len(records)
-        }
\ No newline at end of file
+            "total_count": total_count
+        }
+    
+    @staticmethod
+    async def rebuild_daily_agg() -> int:
+        """
+        根据现有的消费记录重建日汇总表（用于首次上线或数据修复）
+        
+        Returns:
+            生成的汇总行数
+        """
+        await ensure_db_connection()
+        async with in_transaction() as conn:
+            # 在同一事务中清空并由数据库直接聚合写入，重建期间的写入不会丢失
+            dialect = conn.capabilities.dialect
+            if dialect == "postgres":
+                # 阻塞并发的汇总增量写入直到重建提交，已开始的写入事务先提交后才会被本次聚合读到
+                await conn.execute_query("LOCK TABLE consumption_daily_agg IN EXCLUSIVE MODE")
+            day_expr = _DAILY_AGG_DAY_EXPR.get(dialect, "date(transaction_time)")
+            await conn.execute_query("DELETE FROM consumption_daily_agg")
+            await conn.execute_query(_DAILY_AGG_REBUILD.format(day=day_expr))
+            return await ConsumptionDailyAgg.all().count()
@@ -1,7 +1,44 @@
 """用户数据访问对象"""
-from typing import Optional, List
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional, List, Tuple
 from app.models.user import User
 from app.database import ensure_db_connection
+from app.settings.config import config
+
+
+# 用户查询缓存（用户ID -> (写入时间, 用户)），LRU淘汰，更新和删除时失效
+_user_cache: "OrderedDict[int, Tuple[float, User]]" = OrderedDict()
+# 用户存在性缓存（用户ID -> 确认存在的时间），只记录存在的用户，LRU淘汰
+_user_exists_cache: "OrderedDict[int, float]" = OrderedDict()
+
+
+# 未删除用户总数缓存（写入时间, 总数），创建和删除时增量维护
+_user_count_cache: Optional[Tuple[float, int]] = None
+
+
+async def _cached_user_count() -> int:
+    """获取未删除的用户总数，TTL内复用缓存结果，过期后重新COUNT"""
+    global _user_count_cache
+    if _user_count_cache is not None and time.monotonic() - _user_count_cache[0] < config.COUNT_CACHE_TTL:
+        return _user_count_cache[1]
+    total = await User.filter(is_deleted=False).count()
+    _user_count_cache = (time.monotonic(), total)
+    return total
+
+
+def _adjust_user_count(delta: int):
+    """增量调整已缓存的用户总数（未缓存时不处理）"""
+    global _user_count_cache
+    if _user_count_cache is not None:
+        _user_count_cache = (_user_count_cache[0], _user_count_cache[1] + delta)
+
+
+def _invalidate_user(user_id: int):
+    """使指定用户的缓存失效"""
+    _user_cache.pop(user_id, None)
+    _user_exists_cache.pop(user_id, None)
 
 
 class UserDAO:
@@ -13,6 +50,58 @@ class UserDAO:
         await ensure_db_connection()
         return await User.get_or_none(id=user_id, is_deleted=False)
     
+    @staticmethod
+    async def get_cached_by_id(user_id: int) -> Optional[User]:
+        """根据ID获取用户，TTL内复用缓存结果（用于只需校验用户是否存在的接口）"""
+        entry = _user_cache.get(user_id)
+        if entry is not None:
+            if time.monotonic() - entry[0] < config.USER_CACHE_TTL:
+                _user_cache.move_to_end(user_id)
+                return entry[1]
+            del _user_cache[user_id]
+        
+        user = await UserDAO.get_by_id(user_id)
+        # 只缓存存在的用户，新建的用户可以立即查询到
+        if user is not None:
+            _user_cache[user_id] = (time.monotonic(), user)
+            while len(_user_cache) > config.USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
+        return user
+    
+    @staticmethod
+    async def exists(user_id: int) -> bool:
+        """判断用户是否存在（只查询SELECT 1，TTL内复用确认存在的结果）"""
+        checked_at = _user_exists_cache.get(user_id)
+        if checked_at is not None:
+            if time.monotonic() - checked_at < config.USER_CACHE_TTL:
+                _user_exists_cache.move_to_end(user_id)
+                return True
+            del _user_exists_cache[user_id]
+        
+        await ensure_db_connection()
+        found = await User.exists(id=user_id, is_deleted=False)
+        # 只缓存存在的用户，新建的用户可以立即查询到
+        if found:
+            _user_exists_cache[user_id] = time.monotonic()
+            while len(_user_exists_cache) > config.USER_CACHE_SIZE:
+                _user_exists_cache.popitem(last=False)
+        return found
+    
+    @staticmethod
+    async def existing_ids(user_ids: List[int]) -> set:
+        """返回给定用户ID中实际存在（未删除）的ID集合，一次查询完成"""
+        await ensure_db_connection()
+        return set(await User.filter(id__in=set(user_ids), is_deleted=False).values_list("id", flat=True))
+    
+    @staticmethod
+    async def phone_exists(phone: str, exclude_user_id: Optional[int] = None) -> bool:
+        """判断手机号是否已被（除exclude_user_id以外的）用户使用，只查询SELECT 1"""
+        await ensure_db_connection()
+        queryset = User.filter(phone=phone, is_deleted=False)
+        if exclude_user_id is not None:
+            queryset = queryset.exclude(id=exclude_user_id)
+        return await queryset.exists()
+    
     @staticmethod
     async def get_by_phone(phone: str) -> Optional[User]:
         """根据手机号获取用户"""
@@ -23,7 +112,9 @@ class UserDAO:
     async def create(user_data: dict) -> User:
         """创建用户"""
         await ensure_db_connection()
-        return await User.create(**user_data)
+        user = await User.create(**user_data)
+        _adjust_user_count(1)
+        return user
     
     @staticmethod
     async def update(user_id: int, update_data: dict) -> Optional[User]:
@@ -32,29 +123,68 @@ class UserDAO:
         user = await User.get_or_none(id=user_id, is_deleted=False)
         if user:
             await user.update_from_dict(update_data)
-            await user.save()
+            # 只写入本次修改的列
+            await user.save(update_fields=[*update_data, "updated_at"])
+            _invalidate_user(user_id)
         return user
     
     @staticmethod
     async def delete(user_id: int) -> bool:
         """软删除用户"""
         await ensure_db_connection()
-        user = await User.get_or_none(id=user_id, is_deleted=False)
-        if user:
-            await user.soft_delete()
-            return True
-        return False
+        # 一条带条件的UPDATE完成查找和软删除，无需先查询
+        updated = await User.bulk_soft_delete(id=user_id, is_deleted=False)
+        if updated:
+            _invalidate_user(user_id)
+            _adjust_user_count(-1)
+        return bool(updated)
     
     @staticmethod
-    async def list_users(page: int = 1, page_size: int = 10) -> tuple[List[User], int]:
-        """获取用户列表（分页）"""
+    async def list_users(
+        page: int = 1,
+        page_size: int = 10,
+        after_id: Optional[int] = None
+    ) -> tuple[List[User], Optional[int]]:
+        """获取用户列表（分页，按ID排序；提供after_id时使用键集分页且不统计总数）"""
+        queryset = User.filter(is_deleted=False)
+        
+        if after_id is not None:
+            users = await queryset.filter(id__gt=after_id).order_by("id").limit(page_size).all()
+            return users, None
+        
         # 计算偏移量
         offset = (page - 1) * page_size
         
-        # 查询总数
-        total = await User.filter(is_deleted=False).count()
+        # 查询分页数据和总数（TTL内使用缓存，两个查询互不依赖，并发执行以重叠数据库往返）
+        users, total = await asyncio.gather(
+            queryset.order_by("id").offset(offset).limit(page_size).all(),
+            _cached_user_count()
+        )
+        
+        return users, total
+    
+    @staticmethod
+    async def list_users_values(
+        fields: Tuple[str, ...],
+        page: int = 1,
+        page_size: int = 10,
+        after_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """获取用户列表（只取指定字段的字典，不实例化ORM对象；提供after_id时使用键集分页且不统计总数）"""
+        await ensure_db_connection()
+        queryset = User.filter(is_deleted=False)
+        
+        if after_id is not None:
+            rows = await queryset.filter(id__gt=after_id).order_by("id").limit(page_size).values(*fields)
+            return rows, None
+        
+        # 计算偏移量
+        offset = (page - 1) * page_size
         
-        # 查询分页数据
-        users = await User.filter(is_deleted=False).offset(offset).limit(page_size).all()
+        # 查询分页数据和总数（TTL内使用缓存，两个查询互不依赖，并发执行以重叠数据库往返）
+        rows, total = await asyncio.gather(
+            queryset.order_by("id").offset(offset).limit(page_size).values(*fields),
+            _cached_user_count()
+        )
         
-        return users, total
\ No newline at end of file
+        return rows, total
@@ -1,12 +1,18 @@
 """数据库配置和连接管理"""
 from contextlib import asynccontextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from tortoise import Tortoise, connections
 from tortoise.exceptions import OperationalError
+from tortoise.transactions import in_transaction
+from tortoise.utils import get_schema_sql
 import asyncio
+import logging
 
 # 导入配置
 from app.settings.config import config
 
+logger = logging.getLogger(__name__)
+
 # 使用全局配置作为数据库设置
 db_settings = config
 
@@ -15,11 +21,35 @@ db_settings = config
 _db_initialized = False
 
 
+def _with_pool_params(db_url: str) -> str:
+    """
+    为PostgreSQL连接URL补充连接池大小和预编译语句缓存参数（URL中已指定的参数保持不变）
+    
+    Args:
+        db_url: 数据库连接URL
+    
+    Returns:
+        补充参数后的连接URL
+    """
+    parts = urlsplit(db_url)
+    if parts.scheme not in ("postgres", "asyncpg", "psycopg"):
+        return db_url
+    params = dict(parse_qsl(parts.query))
+    params.setdefault("minsize", str(db_settings.DATABASE_POOL_MIN))
+    params.setdefault("maxsize", str(db_settings.DATABASE_POOL_MAX))
+    # asyncpg按连接缓存预编译语句，热点查询只需解析和规划一次
+    if parts.scheme in ("postgres", "asyncpg"):
+        params.setdefault("statement_cache_size", str(db_settings.DATABASE_STATEMENT_CACHE_SIZE))
+        params.setdefault("max_cached_statement_lifetime", str(db_settings.DATABASE_STATEMENT_CACHE_LIFETIME))
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
 def get_tortoise_config() -> dict:
     """获取Tortoise ORM配置"""
     return {
         "connections": {
-            "default": db_settings.DATABASE_URL
+            # 连接池在初始化时即建立minsize个连接，请求高峰时不必现场建连
+            "default": _with_pool_params(db_settings.DATABASE_URL)
         },
         "apps": {
             "models": {
@@ -31,7 +61,7 @@ def get_tortoise_config() -> dict:
                 "default_connection": "default"
             }
         },
-        "generate_schemas": True,  # 自动生成数据库表结构（开发环境）
+        "generate_schemas": db_settings.DATABASE_GENERATE_SCHEMAS,  # 自动生成数据库表结构（开发环境）
         "add_exception_handlers": True
     }
 
@@ -40,29 +70,80 @@ def get_tortoise_config() -> dict:
 DB_CONFIG = get_tortoise_config()
 
 
+# 早期版本在PostgreSQL上额外创建的部分索引，与Consumption.Meta中的复合索引服务相同的查询，
+# 只保留可移植的复合索引，建表时删除这两个索引，避免每次写入重复维护
+REDUNDANT_INDEXES = ("consumption_user_tx_time", "consumption_user_type_tx")
+
+
+async def apply_schema():
+    """
+    生成并执行建表脚本（表结构和多余索引的清理合并为一个脚本，一次往返执行，重复执行不会报错）
+    """
+    conn = connections.get("default")
+    statements = [get_schema_sql(conn, safe=True).strip().rstrip(";")]
+    if conn.capabilities.dialect == "postgres":
+        statements.extend(f"DROP INDEX IF EXISTS {name}" for name in REDUNDANT_INDEXES)
+    await conn.execute_script(";\n".join(statement for statement in statements if statement) + ";")
+
+
+async def init_schema():
+    """
+    单独连接数据库执行一次建表脚本（多进程部署时在启动工作进程前调用，避免各进程并发执行DDL）
+    """
+    await Tortoise.init(config=get_tortoise_config())
+    try:
+        await apply_schema()
+    finally:
+        await Tortoise.close_connections()
+
+
+async def warm_statements():
+    """
+    预热热点查询的预编译语句缓存（PostgreSQL）
+    每个常驻连接在一个事务中执行一遍热点查询（事务会固定占用一个连接），参数不匹配任何记录
+    """
+    if connections.get("default").capabilities.dialect != "postgres":
+        return
+    from app.models import Consumption, User
+    
+    async def _warm_connection():
+        async with in_transaction():
+            await User.get_or_none(id=0, is_deleted=False)
+            await User.get_or_none(phone="", is_deleted=False)
+            await User.exists(id=0, is_deleted=False)
+            await User.filter(is_deleted=False).count()
+            await Consumption.filter(user_id=0, is_deleted=False).count()
+    
+    await asyncio.gather(*(_warm_connection() for _ in range(db_settings.DATABASE_POOL_MIN)))
+
+
 async def init_db():
     """初始化数据库连接"""
     global _db_initialized
     
     # 检查是否已经初始化
     if _db_initialized:
-        print("数据库连接已经初始化")
+        logger.debug("数据库连接已经初始化")
         return
     
     try:
         # 初始化Tortoise ORM
         await Tortoise.init(config=get_tortoise_config())
         
-        # 生成数据库表结构
-        await Tortoise.generate_schemas()
+        # 生成数据库表结构（生产环境可关闭，改为部署时执行 python app/utils/init_database.py create）
+        if db_settings.DATABASE_GENERATE_SCHEMAS:
+            await apply_schema()
+        
+        # 预热连接池中各连接的预编译语句缓存
+        await warm_statements()
         
         # 验证连接
         await connections.get("default").execute_query("SELECT 1")
         
         _db_initialized = True
-        print("数据库连接已成功初始化")
+        logger.info("数据库连接已成功初始化")
     except Exception as e:
-        print(f"数据库初始化失败: {e}")
+        logger.error(f"数据库初始化失败: {e}")
         raise
 
 
@@ -72,9 +153,9 @@ async def close_db():
     try:
         await Tortoise.close_connections()
         _db_initialized = False
-        print("数据库连接已关闭")
+        logger.info("数据库连接已关闭")
     except Exception as e:
-        print(f"关闭数据库连接时出错: {e}")
+        logger.error(f"关闭数据库连接时出错: {e}")
 
 
 @asynccontextmanager
@@ -87,7 +168,7 @@ async def get_db():
     try:
         yield Tortoise
     except Exception as e:
-        print(f"数据库操作错误: {e}")
+        logger.error(f"数据库操作错误: {e}")
         raise
     finally:
         # 不要在这里关闭连接，让应用生命周期管理处理
@@ -102,16 +183,16 @@ async def ensure_db_connection():
 
 
 async def check_database_connection():
-    """检查数据库连接"""
+    """检查数据库连接（只在尚未初始化时初始化，之后只执行一次SELECT 1往返）"""
     try:
-        # 尝试连接数据库
-        await init_db()
-        print(f"数据库 {db_settings.DATABASE_NAME} 连接成功")
+        await ensure_db_connection()
+        await connections.get("default").execute_query("SELECT 1")
+        logger.info(f"数据库 {db_settings.DATABASE_NAME} 连接成功")
         return True
     except OperationalError as e:
-        print(f"数据库操作错误: {e}")
-        print("请确保PostgreSQL服务正在运行，且数据库已创建")
+        logger.error(f"数据库操作错误: {e}")
+        logger.error("请确保PostgreSQL服务正在运行，且数据库已创建")
         return False
     except Exception as e:
-        print(f"数据库连接错误: {e}")
+        logger.error(f"数据库连接错误: {e}")
         return False
\ No newline at end of file
@@ -1,10 +1,12 @@
 """数据模型包"""
 from .base import BaseModel
 from .user import User
-from .consumption import Consumption
+from .consumption import Consumption, ConsumptionDailyAgg, ConsumptionView
 
 __all__ = [
     "BaseModel",
     "User",
-    "Consumption"
+    "Consumption",
+    "ConsumptionDailyAgg",
+    "ConsumptionView"
 ]
\ No newline at end of file
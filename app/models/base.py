@@ -1,11 +1,11 @@
 """基础模型类定义"""
-from tortoise import models, fields
+from tortoise import models, fields, timezone
 from datetime import datetime
 
 
 class BaseModel(models.Model):
     """所有模型的基类，包含通用字段"""
-    id = fields.IntField(pk=True, index=True, description="主键ID")
+    id = fields.BigIntField(pk=True, description="主键ID")
     created_at = fields.DatetimeField(auto_now_add=True, description="创建时间")
     updated_at = fields.DatetimeField(auto_now=True, description="更新时间")
     is_deleted = fields.BooleanField(default=False, index=True, description="是否删除")
@@ -14,9 +14,22 @@ class BaseModel(models.Model):
         abstract = True  # 抽象类，不会创建实际的表
     
     def soft_delete(self):
-        """软删除方法"""
+        """软删除方法（只写入is_deleted和updated_at两列）"""
         self.is_deleted = True
-        return self.save()
+        return self.save(update_fields=["is_deleted", "updated_at"])
+    
+    @classmethod
+    async def bulk_soft_delete(cls, **filters) -> int:
+        """
+        按条件批量软删除（一条UPDATE语句，只写入is_deleted和updated_at两列）
+        
+        Args:
+            **filters: 过滤条件
+        
+        Returns:
+            受影响的行数
+        """
+        return await cls.filter(**filters).update(is_deleted=True, updated_at=timezone.now())
     
     def __str__(self):
         """字符串表示"""
@@ -1,33 +1,77 @@
 """消费行为模型定义"""
-from tortoise import fields
+from tortoise import fields, models
 
+from dataclasses import dataclass
 from datetime import datetime, date
+from decimal import Decimal
+from typing import Optional
 from .base import BaseModel
 
 
 class Consumption(BaseModel):
     """消费行为表模型"""
     user = fields.ForeignKeyField("models.User", related_name="consumptions", description="关联用户")
-    transaction_time = fields.DatetimeField(index=True, description="交易时间")
+    transaction_time = fields.DatetimeField(description="交易时间")
     transaction_type = fields.CharField(
         max_length=10, 
         choices=["收入", "支出"], 
         default="支出", 
-        index=True,
         description="交易类型"
     )
-    amount = fields.DecimalField(max_digits=10, decimal_places=2, index=True, description="金额")
+    amount = fields.DecimalField(max_digits=10, decimal_places=2, description="金额")
     merchant_name = fields.CharField(max_length=100, description="对方户名（商户/分类）")
-    category = fields.CharField(max_length=50, null=True, index=True, description="分类")
+    category = fields.CharField(max_length=50, null=True, description="分类")
     
     class Meta:
         table = "consumptions"
         description = "消费行为记录表"
+        # 用户消费记录列表的键集分页按(user_id, is_deleted, transaction_time, id)顺序读取索引
+        # 分类统计按(user_id, is_deleted, transaction_type, transaction_time)过滤后按category分组
+        # 所有查询都以user_id（或主键）开头，不再为交易时间、类型、金额、分类单独建索引，减少写入时的索引维护
+        indexes = (
+            ("user_id", "is_deleted", "transaction_time", "id"),
+            ("user_id", "is_deleted", "transaction_type", "transaction_time", "category"),
+        )
     
     def __str__(self):
         """字符串表示"""
         return f"Consumption(id={self.id}, user_id={self.user_id}, type={self.transaction_type}, amount={self.amount})"
 
 
+
+class ConsumptionDailyAgg(models.Model):
+    """消费日汇总表模型：按用户、日期、交易类型和分类预聚合金额和笔数，随消费记录的增删改增量维护"""
+    id = fields.IntField(pk=True, description="主键ID")
+    user_id = fields.BigIntField(description="用户ID")
+    day = fields.DateField(description="交易日期")
+    transaction_type = fields.CharField(max_length=10, description="交易类型")
+    category = fields.CharField(max_length=50, description="分类（空分类记为“未分类”）")
+    sum_amount = fields.DecimalField(max_digits=14, decimal_places=2, default=0, description="金额合计")
+    cnt = fields.IntField(default=0, description="笔数")
+    
+    class Meta:
+        table = "consumption_daily_agg"
+        description = "消费日汇总表"
+        unique_together = (("user_id", "day", "transaction_type", "category"),)
+    
+    def __str__(self):
+        """字符串表示"""
+        return f"ConsumptionDailyAgg(user_id={self.user_id}, day={self.day}, category={self.category}, sum={self.sum_amount})"
+
+@dataclass(slots=True, frozen=True)
+class ConsumptionView:
+    """消费记录的轻量只读视图，用于分析流程中替代完整的ORM对象"""
+    id: int
+    user_id: int
+    transaction_time: datetime
+    transaction_type: str
+    amount: Decimal
+    merchant_name: str
+    category: Optional[str]
+    
+    # 通过QuerySet.values()查询的字段，与上面的属性一一对应
+    FIELDS = ("id", "user_id", "transaction_time", "transaction_type", "amount", "merchant_name", "category")
+
+
 # 已迁移到 schemas 模块中定义
 # 请使用 from app.schemas.consumption_schemas import Consumption, ConsumptionCreate, ConsumptionUpdate
\ No newline at end of file
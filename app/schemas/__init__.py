@@ -1,7 +1,8 @@
 """数据验证和序列化模型模块"""
 
 from .user_schemas import User, UserCreate, UserUpdate
-from .consumption_schemas import Consumption, ConsumptionCreate, ConsumptionUpdate
+from .consumption_schemas import Consumption, ConsumptionCreate, ConsumptionBulkCreate, ConsumptionUpdate
+from .batch_schemas import BatchRequest, BatchRequestItem
 
 __all__ = [
     "User",
@@ -9,5 +10,8 @@ __all__ = [
     "UserUpdate",
     "Consumption",
     "ConsumptionCreate",
-    "ConsumptionUpdate"
+    "ConsumptionBulkCreate",
+    "ConsumptionUpdate",
+    "BatchRequest",
+    "BatchRequestItem"
 ]
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""批量请求数据验证模型"""
+
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List
+
+
+class BatchRequestItem(BaseModel):
+    """批量请求中的单个子请求"""
+    endpoint: str = Field(..., description="子请求的接口名（user、user_consumptions、consumption_statistics、consumption）")
+    params: Dict[str, Any] = Field(default_factory=dict, description="子请求参数")
+
+
+class BatchRequest(BaseModel):
+    """批量请求模型"""
+    requests: List[BatchRequestItem] = Field(..., min_length=1, max_length=20, description="子请求列表（最多20个）")
@@ -1,12 +1,14 @@
 """用户数据验证和序列化模型"""
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 from datetime import datetime
 
 
 class UserBase(BaseModel):
     """用户基础模型"""
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
     name: str = Field(..., max_length=50, description="姓名")
     gender: str = Field(default="未知", pattern="^(男|女|未知)$", description="性别")
     phone: str = Field(..., max_length=20, description="手机号")
@@ -19,6 +21,8 @@ class UserCreate(UserBase):
 
 class UserUpdate(BaseModel):
     """用户更新模型"""
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
     name: Optional[str] = Field(None, max_length=50, description="姓名")
     gender: Optional[str] = Field(None, pattern="^(男|女|未知)$", description="性别")
     phone: Optional[str] = Field(None, max_length=20, description="手机号")
@@ -31,5 +35,5 @@ class User(UserBase):
     updated_at: datetime = Field(..., description="更新时间")
     is_deleted: bool = Field(..., description="是否删除")
     
-    class Config:
-        from_attributes = True  # Pydantic V2 语法，替代旧版的 orm_mode = True
\ No newline at end of file
+    # 响应模型只读，可从ORM对象属性构建
+    model_config = ConfigDict(from_attributes=True, frozen=True, str_strip_whitespace=True)
\ No newline at end of file
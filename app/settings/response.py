@@ -1,6 +1,6 @@
 # Views package for handling presentation layer in FastAPI context
 from typing import Dict, Any, Optional, List
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 
 def create_response(
@@ -12,8 +12,9 @@ def create_response(
     # 分页参数，可直接传入而无需先调用paginate_response
     page: Optional[int] = None,
     page_size: Optional[int] = None,
-    total: Optional[int] = None
-) -> JSONResponse:
+    total: Optional[int] = None,
+    status_code: int = 200
+) -> ORJSONResponse:
     """
     通用响应函数，支持直接传入分页参数或已构建的分页对象
     
@@ -26,18 +27,14 @@ def create_response(
         page: 当前页码（如果提供，则自动计算分页信息）
         page_size: 每页大小（如果提供，则自动计算分页信息）
         total: 总记录数（如果提供，则自动计算分页信息）
+        status_code: HTTP状态码
         
     Returns:
-        标准化格式的JSONResponse
+        标准化格式的ORJSONResponse
     """
     # 如果提供了分页参数且没有提供pagination对象，则自动计算分页信息
-    if pagination is None and all(param is not None for param in [page, page_size, total]):
-        pagination = {
-            "page": page,
-            "page_size": page_size,
-            "total": total,
-            "total_pages": (total + page_size - 1) // page_size
-        }
+    if pagination is None and page is not None and page_size is not None and total is not None:
+        pagination = paginate_response(page, page_size, total)
     
     response_data = {
         "success": success,
@@ -47,7 +44,7 @@ def create_response(
         "pagination": pagination  # 始终存在，可为null
     }
     
-    return JSONResponse(content=response_data)
+    return ORJSONResponse(content=response_data, status_code=status_code)
 
 
 def paginate_response(
@@ -70,7 +67,8 @@ def paginate_response(
         "page": page,
         "page_size": page_size,
         "total": total,
-        "total_pages": (total + page_size - 1) // page_size
+        # 向上取整计算总页数
+        "total_pages": -(-total // page_size)
     }
 
 
@@ -82,7 +80,7 @@ def success_response(
     page: Optional[int] = None,
     page_size: Optional[int] = None,
     total: Optional[int] = None
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     成功响应辅助函数，支持直接传入分页参数
     
@@ -95,7 +93,7 @@ def success_response(
         total: 总记录数
         
     Returns:
-        成功格式的JSONResponse
+        成功格式的ORJSONResponse
     """
     return create_response(
         success=True,
@@ -112,8 +110,9 @@ def success_response(
 def error_response(
     code: int,
     message: str,
-    data: Optional[Any] = None
-) -> JSONResponse:
+    data: Optional[Any] = None,
+    status_code: int = 200
+) -> ORJSONResponse:
     """
     错误响应辅助函数
     
@@ -121,14 +120,16 @@ def error_response(
         code: 错误码
         message: 错误消息
         data: 可选的错误数据
+        status_code: HTTP状态码（默认200，错误信息只体现在响应体的code中，与原有接口保持一致）
         
     Returns:
-        错误格式的JSONResponse
+        错误格式的ORJSONResponse
     """
     return create_response(
         success=False,
         code=code,
         message=message,
         data=data,
-        pagination=None
+        pagination=None,
+        status_code=status_code
     )
\ No newline at end of file
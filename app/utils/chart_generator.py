@@ -1,18 +1,217 @@
 """图表生成工具模块 - 用于生成消费数据的可视化图表"""
+import io
 import os
+import time
+import itertools
 import json
-from typing import List, Dict, Any
-from datetime import datetime
-import matplotlib.pyplot as plt
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # 使用非交互式后端
 
-# 更可靠的字体配置方法，尝试多种中文字体
-plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang SC', 'Hiragino Sans GB', 'SimHei', 'WenQuanYi Micro Hei']
-plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
-plt.rcParams['savefig.facecolor'] = 'white'  # 确保保存的图片背景是白色
+from app.models.consumption import Consumption, ConsumptionView
+from app.settings.config import config
 
-from app.models.consumption import Consumption
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+
+# 绘图相关的matplotlib模块（会加载字体管理器）在第一次绘图时才导入，不绘图的进程不承担这部分开销
+_Figure = None
+_FigureCanvasAgg = None
+
+
+def _ensure_chart_backend():
+    """第一次绘图时导入Figure和Agg画布，并配置中文字体（每个进程只执行一次）"""
+    global _Figure, _FigureCanvasAgg
+    if _Figure is not None:
+        return
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    
+    # 更可靠的字体配置方法，尝试多种中文字体
+    matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang SC', 'Hiragino Sans GB', 'SimHei', 'WenQuanYi Micro Hei']
+    matplotlib.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
+    matplotlib.rcParams['savefig.facecolor'] = 'white'  # 确保保存的图片背景是白色
+    _Figure, _FigureCanvasAgg = Figure, FigureCanvasAgg
+
+
+def _amounts_array(consumptions: List[Consumption]) -> np.ndarray:
+    """
+    将消费记录的金额转换为连续的float64数组
+    
+    Args:
+        consumptions: 消费记录列表
+    
+    Returns:
+        金额数组
+    """
+    return np.fromiter((consumption.amount for consumption in consumptions), dtype=np.float64, count=len(consumptions))
+
+
+def _sum_by_key(keys: List[Any], amounts: np.ndarray) -> Tuple[List[Any], np.ndarray]:
+    """
+    按键对金额分组求和（键按首次出现的顺序编号，求和由np.bincount在C循环中完成）
+    
+    Args:
+        keys: 每条记录的分组键
+        amounts: 与keys一一对应的金额数组
+    
+    Returns:
+        (分组键列表, 各分组的金额合计)
+    """
+    index: Dict[Any, int] = {}
+    group_ids = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.intp, count=len(keys))
+    return list(index), np.bincount(group_ids, weights=amounts, minlength=len(index))
+
+
+def aggregate_chart_data(consumptions: List[Consumption]) -> Dict[str, Tuple[Any, ...]]:
+    """
+    一次性计算默认图表需要的全部汇总数据（金额数组只构建一次，三张图表共用）
+    
+    Args:
+        consumptions: 消费记录列表
+    
+    Returns:
+        绘图方法名 -> 绘图参数，参数只包含汇总后的少量数据
+    """
+    amounts = _amounts_array(consumptions)
+    
+    # 各类别消费金额（按金额从高到低排列，饼图扇区顺序固定）
+    categories, category_sums = _sum_by_key(
+        [consumption.category or '未分类' for consumption in consumptions], amounts
+    )
+    category_order = np.argsort(-category_sums, kind='stable')
+    
+    # 按日期分组统计并排序
+    dates, daily_sums = _sum_by_key(
+        [f"{consumption.transaction_time:%Y-%m-%d}" for consumption in consumptions], amounts
+    )
+    order = np.argsort(dates, kind='stable')
+    
+    # 收入和支出总额（按交易类型构建掩码后一次性求和）
+    is_income = np.fromiter(
+        (consumption.transaction_type == '收入' for consumption in consumptions),
+        dtype=bool, count=len(consumptions)
+    )
+    
+    return {
+        "plot_category_chart": ([categories[i] for i in category_order], category_sums[category_order].tolist()),
+        "plot_time_series_chart": ([dates[i] for i in order], daily_sums[order].tolist()),
+        "plot_income_expense_chart": (float(amounts[is_income].sum()), float(amounts[~is_income].sum())),
+    }
+
+
+def _draw_category_chart(fig: "Figure", categories: List[str], category_sums: List[float]):
+    """绘制消费类别分布饼图"""
+    ax = fig.add_subplot()
+    ax.pie(
+        category_sums,
+        labels=categories,
+        autopct='%1.1f%%',
+        startangle=90,
+        shadow=True
+    )
+    ax.axis('equal')
+    ax.set_title('消费类别分布', fontsize=14, fontweight='bold')
+    fig.tight_layout()
+
+
+def _draw_time_series_chart(fig: "Figure", sorted_dates: List[str], sorted_amounts: List[float]):
+    """绘制每日消费趋势折线图"""
+    ax = fig.add_subplot()
+    ax.plot(sorted_dates, sorted_amounts, marker='o', linestyle='-', color='#3498db')
+    ax.set_title('每日消费趋势', fontsize=14, fontweight='bold')
+    ax.set_xlabel('日期', fontsize=12)
+    ax.set_ylabel('消费金额(元)', fontsize=12)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    fig.tight_layout()
+
+
+def _draw_income_expense_chart(fig: "Figure", total_income: float, total_expense: float):
+    """绘制收支总览柱状图（不使用tight_layout，而是使用自定义的边距）"""
+    # 设置子图边距，避免标签被截断
+    fig.subplots_adjust(bottom=0.15, top=0.9, left=0.1, right=0.9)
+    ax = fig.add_subplot()
+    ax.bar(['收入', '支出'], [total_income, total_expense], color=['#2ecc71', '#e74c3c'])
+    ax.set_title('收支总览', fontsize=14, fontweight='bold')
+    ax.set_ylabel('金额(元)', fontsize=12)
+    
+    # 在柱状图上显示具体数值，并调整位置避免超出图表范围
+    max_value = max(total_income, total_expense)
+    for i, v in enumerate([total_income, total_expense]):
+        # 根据最大值动态调整文本位置，避免超出图表范围
+        text_offset = max_value * 0.02  # 使用百分比而不是固定值
+        ax.text(i, v + text_offset, f'{v:.2f}', ha='center')
+
+
+# 本进程的图表序号，与时间戳和进程ID一起保证文件名唯一（同一秒内并发生成也不会覆盖）
+_chart_seq = itertools.count()
+
+
+def _chart_file_suffix() -> str:
+    """生成图表文件名后缀：纳秒时间戳_进程ID_序号"""
+    return f"{time.time_ns():x}_{os.getpid()}_{next(_chart_seq)}"
+
+
+# 绘图方法名 -> (图表尺寸, 绘制函数)
+_CHART_DRAWERS: Dict[str, Tuple[Tuple[int, int], Callable[..., None]]] = {
+    "plot_category_chart": ((10, 6), _draw_category_chart),
+    "plot_time_series_chart": ((12, 6), _draw_time_series_chart),
+    "plot_income_expense_chart": ((10, 7), _draw_income_expense_chart),
+}
+
+# 每个线程中每种图表复用的Figure（Agg画布只创建一次，每次绘制前清空；按线程隔离，避免并发绘制同一Figure）
+_figure_cache = threading.local()
+
+
+def _draw_chart(method_name: str, args: Tuple[Any, ...]) -> "Figure":
+    """
+    在复用的Figure上绘制指定图表（不经过pyplot的全局状态）
+    
+    Args:
+        method_name: 绘图方法名
+        args: 绘图参数
+    
+    Returns:
+        绘制完成的Figure
+    """
+    figsize, drawer = _CHART_DRAWERS[method_name]
+    figures = getattr(_figure_cache, "figures", None)
+    if figures is None:
+        figures = _figure_cache.figures = {}
+    fig = figures.get(method_name)
+    if fig is None:
+        _ensure_chart_backend()
+        fig = _Figure(figsize=figsize)
+        _FigureCanvasAgg(fig)
+        figures[method_name] = fig
+    else:
+        fig.clear()
+    drawer(fig, *args)
+    return fig
+
+
+def render_chart_png(method_name: str, args: Tuple[Any, ...]) -> bytes:
+    """
+    将图表直接渲染为内存中的PNG（用于直接返回图片的接口，不写磁盘）
+    
+    Args:
+        method_name: 绘图方法名
+        args: aggregate_chart_data返回的对应绘图参数
+    
+    Returns:
+        PNG图片内容
+    """
+    buffer = io.BytesIO()
+    _draw_chart(method_name, args).savefig(buffer, format='png')
+    return buffer.getvalue()
 
 
 class ChartGenerator:
@@ -34,9 +233,12 @@ class ChartGenerator:
         """
         确保输出目录存在
         """
-        if not os.path.exists(self.output_dir):
+        # 直接尝试创建，已存在时忽略（省去单独的存在性检查，并发创建也不会出错）
+        try:
             os.makedirs(self.output_dir)
             print(f"创建图表输出目录: {self.output_dir}")
+        except FileExistsError:
+            pass
     
     def generate_category_chart(self, consumptions: List[Consumption]) -> str:
         """
@@ -48,34 +250,20 @@ class ChartGenerator:
         Returns:
             生成的图表文件路径
         """
-        # 统计各类别消费金额
-        category_amounts = {}
-        for consumption in consumptions:
-            category = consumption.category or '未分类'
-            if category not in category_amounts:
-                category_amounts[category] = 0
-            category_amounts[category] += float(consumption.amount)
-        
-        # 创建饼图
-        plt.figure(figsize=(10, 6))
-        plt.pie(
-            category_amounts.values(),
-            labels=category_amounts.keys(),
-            autopct='%1.1f%%',
-            startangle=90,
-            shadow=True
-        )
-        plt.axis('equal')
-        plt.title('消费类别分布', fontsize=14, fontweight='bold')
-        
-        # 保存图表
-        chart_path = os.path.join(self.output_dir, f'category_chart_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
-        plt.tight_layout()
-        plt.savefig(chart_path)
-        plt.close()
-        
-        print(f"消费类别分布图已生成: {chart_path}")
-        return chart_path
+        return self.plot_category_chart(*aggregate_chart_data(consumptions)["plot_category_chart"])
+    
+    def plot_category_chart(self, categories: List[str], category_sums: List[float]) -> str:
+        """
+        根据已汇总的数据绘制消费类别分布图
+        
+        Args:
+            categories: 类别列表
+            category_sums: 各类别的消费金额
+        
+        Returns:
+            生成的图表文件路径
+        """
+        return self._save_chart("plot_category_chart", (categories, category_sums), "category_chart", "消费类别分布图")
     
     def generate_time_series_chart(self, consumptions: List[Consumption]) -> str:
         """
@@ -87,35 +275,20 @@ class ChartGenerator:
         Returns:
             生成的图表文件路径
         """
-        # 按日期分组统计消费金额
-        daily_amounts = {}
-        for consumption in consumptions:
-            date_str = consumption.transaction_time.strftime('%Y-%m-%d')
-            if date_str not in daily_amounts:
-                daily_amounts[date_str] = 0
-            daily_amounts[date_str] += float(consumption.amount)
-        
-        # 按日期排序
-        sorted_dates = sorted(daily_amounts.keys())
-        sorted_amounts = [daily_amounts[date] for date in sorted_dates]
-        
-        # 创建折线图
-        plt.figure(figsize=(12, 6))
-        plt.plot(sorted_dates, sorted_amounts, marker='o', linestyle='-', color='#3498db')
-        plt.title('每日消费趋势', fontsize=14, fontweight='bold')
-        plt.xlabel('日期', fontsize=12)
-        plt.ylabel('消费金额(元)', fontsize=12)
-        plt.xticks(rotation=45)
-        plt.grid(True, linestyle='--', alpha=0.7)
-        
-        # 保存图表
-        chart_path = os.path.join(self.output_dir, f'time_series_chart_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
-        plt.tight_layout()
-        plt.savefig(chart_path)
-        plt.close()
-        
-        print(f"消费趋势图已生成: {chart_path}")
-        return chart_path
+        return self.plot_time_series_chart(*aggregate_chart_data(consumptions)["plot_time_series_chart"])
+    
+    def plot_time_series_chart(self, sorted_dates: List[str], sorted_amounts: List[float]) -> str:
+        """
+        根据已汇总的数据绘制消费趋势时间序列图
+        
+        Args:
+            sorted_dates: 按日期排序的日期列表
+            sorted_amounts: 与日期对应的每日消费金额
+        
+        Returns:
+            生成的图表文件路径
+        """
+        return self._save_chart("plot_time_series_chart", (sorted_dates, sorted_amounts), "time_series_chart", "消费趋势图")
     
     def generate_income_expense_chart(self, consumptions: List[Consumption]) -> str:
         """
@@ -127,40 +300,37 @@ class ChartGenerator:
         Returns:
             生成的图表文件路径
         """
-        # 统计收入和支出总额
-        total_income = 0
-        total_expense = 0
-        
-        for consumption in consumptions:
-            amount = float(consumption.amount)
-            if consumption.transaction_type == '收入':
-                total_income += amount
-            else:
-                total_expense += amount
-        
-        # 创建柱状图，使用稍大的图表尺寸
-        plt.figure(figsize=(10, 7))
-        
-        # 设置子图边距，避免标签被截断
-        plt.subplots_adjust(bottom=0.15, top=0.9, left=0.1, right=0.9)
+        return self.plot_income_expense_chart(*aggregate_chart_data(consumptions)["plot_income_expense_chart"])
+    
+    def plot_income_expense_chart(self, total_income: float, total_expense: float) -> str:
+        """
+        根据已汇总的数据绘制收入支出对比图
         
-        plt.bar(['收入', '支出'], [total_income, total_expense], color=['#2ecc71', '#e74c3c'])
-        plt.title('收支总览', fontsize=14, fontweight='bold')
-        plt.ylabel('金额(元)', fontsize=12)
+        Args:
+            total_income: 收入总额
+            total_expense: 支出总额
         
-        # 在柱状图上显示具体数值，并调整位置避免超出图表范围
-        max_value = max(total_income, total_expense)
-        for i, v in enumerate([total_income, total_expense]):
-            # 根据最大值动态调整文本位置，避免超出图表范围
-            text_offset = max_value * 0.02  # 使用百分比而不是固定值
-            plt.text(i, v + text_offset, f'{v:.2f}', ha='center')
+        Returns:
+            生成的图表文件路径
+        """
+        return self._save_chart("plot_income_expense_chart", (total_income, total_expense), "income_expense_chart", "收支总览图")
+    
+    def _save_chart(self, method_name: str, args: Tuple[Any, ...], file_prefix: str, label: str) -> str:
+        """
+        绘制图表并保存到输出目录
         
-        # 保存图表，不使用tight_layout，而是使用自定义的subplots_adjust
-        chart_path = os.path.join(self.output_dir, f'income_expense_chart_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
-        plt.savefig(chart_path)
-        plt.close()
+        Args:
+            method_name: 绘图方法名（对应_CHART_DRAWERS中的绘制函数）
+            args: 绘图参数
+            file_prefix: 图表文件名前缀
+            label: 日志中显示的图表名称
         
-        print(f"收支总览图已生成: {chart_path}")
+        Returns:
+            生成的图表文件路径
+        """
+        chart_path = os.path.join(self.output_dir, f'{file_prefix}_{_chart_file_suffix()}.png')
+        _draw_chart(method_name, args).savefig(chart_path)
+        print(f"{label}已生成: {chart_path}")
         return chart_path
     
     def generate_all_charts(self, consumptions: List[Consumption]) -> List[str]:
@@ -173,20 +343,16 @@ class ChartGenerator:
         Returns:
             生成的图表文件路径列表
         """
-        chart_paths = []
-        
-        # 生成各类图表
-        chart_paths.append(self.generate_category_chart(consumptions))
-        chart_paths.append(self.generate_time_series_chart(consumptions))
-        chart_paths.append(self.generate_income_expense_chart(consumptions))
-        
-        return chart_paths
+        # 汇总数据只计算一次，各图表共用
+        chart_data = aggregate_chart_data(consumptions)
+        return [getattr(self, method_name)(*chart_data[method_name]) for method_name in DEFAULT_CHART_METHODS]
 
 
 # 创建全局图表生成器实例函数
+@lru_cache(maxsize=32)
 def get_chart_generator(workspace_dir: str) -> ChartGenerator:
     """
-    获取图表生成器实例
+    获取图表生成器实例（按工作空间目录缓存，同一目录复用同一个实例）
     
     Args:
         workspace_dir: 工作空间目录
@@ -196,4 +362,99 @@ def get_chart_generator(workspace_dir: str) -> ChartGenerator:
     """
     # 在工作空间中创建一个专门用于保存图表的目录
     charts_dir = os.path.join(workspace_dir, 'charts')
-    return ChartGenerator(charts_dir)
\ No newline at end of file
+    return ChartGenerator(charts_dir)
+
+
+# 图表渲染进程池（由应用生命周期管理，未启动时按需创建）
+_chart_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_chart_process_pool() -> ProcessPoolExecutor:
+    """
+    获取图表渲染进程池
+    
+    Returns:
+        进程池实例
+    """
+    global _chart_process_pool
+    if _chart_process_pool is None:
+        _chart_process_pool = ProcessPoolExecutor(max_workers=config.PROCESS_POOL_WORKERS)
+    return _chart_process_pool
+
+
+def shutdown_chart_process_pool():
+    """关闭图表渲染进程池"""
+    global _chart_process_pool
+    if _chart_process_pool is not None:
+        _chart_process_pool.shutdown(wait=True)
+        _chart_process_pool = None
+
+
+def to_chart_record(consumption: Consumption) -> Any:
+    """
+    将消费记录投影为可跨进程传递的轻量对象，只保留绘图需要的字段
+    
+    Args:
+        consumption: 消费记录
+    
+    Returns:
+        轻量记录对象
+    """
+    # 只读视图本身即可序列化，无需再次投影
+    if isinstance(consumption, ConsumptionView):
+        return consumption
+    return SimpleNamespace(
+        category=consumption.category,
+        amount=consumption.amount,
+        transaction_time=consumption.transaction_time,
+        transaction_type=consumption.transaction_type
+    )
+
+
+# 默认图表对应的绘图方法，顺序与generate_all_charts返回的图表顺序一致
+DEFAULT_CHART_METHODS = ("plot_category_chart", "plot_time_series_chart", "plot_income_expense_chart")
+# 默认图表的标题，与DEFAULT_CHART_METHODS一一对应
+DEFAULT_CHART_TITLES = ("消费类别分布", "消费趋势分析", "收支总览")
+
+
+@lru_cache(maxsize=32)
+def _chart_generator_for(output_dir: str) -> ChartGenerator:
+    """工作进程中按输出目录缓存的图表生成器（输出目录只检查一次）"""
+    return ChartGenerator(output_dir)
+
+
+def render_chart(output_dir: str, method_name: str, args: Tuple[Any, ...]) -> str:
+    """
+    在工作进程中根据汇总数据绘制单张默认图表
+    
+    Args:
+        output_dir: 图表保存目录
+        method_name: ChartGenerator上的绘图方法名
+        args: aggregate_chart_data返回的对应绘图参数
+    
+    Returns:
+        生成的图表文件路径
+    """
+    return getattr(_chart_generator_for(output_dir), method_name)(*args)
+
+
+async def render_all_charts(output_dir: str, records: List[SimpleNamespace]) -> List[str]:
+    """
+    生成所有默认图表：先在一个工作进程中汇总数据（记录列表只跨进程传递一次），
+    再把每张图表作为独立任务提交到进程池并行渲染，绘图任务只传递汇总后的少量数据
+    （pyplot不是线程安全的，因此使用进程而不是线程）
+    
+    Args:
+        output_dir: 图表保存目录
+        records: 轻量消费记录列表
+    
+    Returns:
+        生成的图表文件路径列表
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_chart_process_pool()
+    chart_data = await loop.run_in_executor(pool, aggregate_chart_data, records)
+    return list(await asyncio.gather(*(
+        loop.run_in_executor(pool, render_chart, output_dir, method_name, chart_data[method_name])
+        for method_name in DEFAULT_CHART_METHODS
+    )))
@@ -1,25 +1,58 @@
 import pandas as pd
 import re
 
+# 标准列名（不同平台的导出列名不同，按列顺序统一命名）
+FINANCIAL_COLUMNS = ['trade_time', 'type', 'amount', 'counterparty', 'category']
+
+# 金额中需要去除的货币符号和千分位分隔符
+_AMOUNT_JUNK = re.compile(r'[¥,]')
+
+
+def _parse_amount(value: str) -> float:
+    """在CSV读取阶段解析金额，空值记为NaN（清洗时会被过滤）"""
+    value = _AMOUNT_JUNK.sub('', value).strip()
+    return float(value) if value else float('nan')
+
+
+def read_financial_csv(path: str) -> pd.DataFrame:
+    """
+    读取原始财务CSV文件，列名、时间、金额和类型在C解析器读取时一并处理，
+    clean_financial_data无需再对这些列做字符串转换
+    :param path: CSV文件路径
+    :return: 读取后的DataFrame
+    """
+    return pd.read_csv(
+        path,
+        header=0,
+        names=FINANCIAL_COLUMNS,
+        parse_dates=['trade_time'],
+        dtype={'type': 'category', 'counterparty': str, 'category': str},
+        converters={'amount': _parse_amount}
+    )
+
+
 def clean_financial_data(df):
     """
     清洗财务数据的函数
-    :param df: 从原始CSV文件读取的DataFrame
+    :param df: 从原始CSV文件读取的DataFrame（read_financial_csv读取时已解析的列不会重复转换）
     :return: 清洗后的DataFrame
     """
     # 1. 列名标准化（不同平台的导出列名不同）
-    df.columns = ['trade_time', 'type', 'amount', 'counterparty', 'category']
+    df.columns = FINANCIAL_COLUMNS
     
-    # 2. 处理金额：去除货币符号，转换为浮点数
-    df['amount'] = df['amount'].astype(str).str.replace('¥', '').str.replace(',', '').astype(float)
+    # 2. 处理金额：一次正则替换去除货币符号和千分位，转换为浮点数
+    if not pd.api.types.is_numeric_dtype(df['amount']):
+        df['amount'] = df['amount'].astype(str).str.replace(_AMOUNT_JUNK, '', regex=True).astype(float)
     
     # 3. 处理时间：转换为标准datetime对象
-    df['trade_time'] = pd.to_datetime(df['trade_time'])
+    if not pd.api.types.is_datetime64_any_dtype(df['trade_time']):
+        df['trade_time'] = pd.to_datetime(df['trade_time'])
     
     # 4. 处理类型：统一收入/支出的标识（如“收入”、“支出”、“转账”）
     # 将类型映射为标准值：'income'（收入）, 'expense'（支出）, 'transfer'（转账忽略）
+    # 结果只有少量取值，使用分类类型存储
     type_mapping = {'收入': 'income', '支出': 'expense', '转账支出': 'expense', '转账收入': 'income'}
-    df['type'] = df['type'].map(type_mapping)
+    df['type'] = df['type'].map(type_mapping).astype('category')
     
     # 5. 处理商户名（对方户名）：去除空格等无关字符
     df['counterparty'] = df['counterparty'].astype(str).str.strip()
@@ -33,8 +66,8 @@ def clean_financial_data(df):
     return df
 
 if __name__ == "__main__":
-    # 读取原始CSV文件
-    raw_df = pd.read_csv('your_raw_financial_data.csv')
+    # 读取原始CSV文件（读取时即完成类型解析）
+    raw_df = read_financial_csv('your_raw_financial_data.csv')
     
     # 清洗数据
     cleaned_df = clean_financial_data(raw_df)
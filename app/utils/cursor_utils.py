@@ -0,0 +1,40 @@
+"""分页游标工具模块 - 用于键集（keyset）分页的游标编码和解码"""
+import base64
+from typing import Any, List
+
+import orjson
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    将上一页最后一条记录的排序键编码为不透明的游标字符串
+    
+    Args:
+        values: 排序键的值（datetime会被序列化为ISO格式字符串）
+    
+    Returns:
+        URL安全的游标字符串
+    """
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    解码游标字符串
+    
+    Args:
+        cursor: encode_cursor生成的游标字符串
+    
+    Returns:
+        排序键的值列表
+    
+    Raises:
+        ValueError: 游标格式不正确
+    """
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeEncodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return values
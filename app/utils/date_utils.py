@@ -0,0 +1,22 @@
+"""日期处理工具模块"""
+from datetime import datetime, date
+
+
+def parse_date(value: str) -> date:
+    """
+    解析YYYY-MM-DD日期字符串，优先使用C实现的fromisoformat
+    
+    Args:
+        value: 日期字符串
+    
+    Returns:
+        日期对象
+    
+    Raises:
+        ValueError: 日期格式不正确
+    """
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        # 非严格ISO格式（如2024-1-5）时回退到strptime
+        return datetime.strptime(value, "%Y-%m-%d").date()
@@ -1,36 +1,308 @@
 """动态图表生成器模块 - 允许大模型根据分析需求动态生成图表"""
 import os
-import json
-import sys
 import io
-import contextlib
-import matplotlib
-matplotlib.use('Agg')  # 使用非交互式后端
-import matplotlib.pyplot as plt
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-import numpy as np
-import pandas as pd
-from app.models.consumption import Consumption
+import json
+import re
+import time
+import itertools
+import threading
 import traceback
-# 导入LLM相关库
-try:
-    from langchain.llms import OpenAI
-    from langchain.chat_models import ChatOpenAI
-    from langchain.schema import HumanMessage, SystemMessage
-    LANGCHAIN_AVAILABLE = True
-except ImportError:
-    print("警告: langchain库不可用，将使用备用方法生成图表代码")
-    LANGCHAIN_AVAILABLE = False
-
-# 配置matplotlib字体支持中文
-plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang SC', 'Hiragino Sans GB', 'SimHei', 'WenQuanYi Micro Hei']
-plt.rcParams['axes.unicode_minus'] = False  # 正常显示负号
-plt.rcParams['savefig.facecolor'] = 'white'  # 确保保存的图片背景是白色
+from collections import OrderedDict
+from operator import attrgetter
+from typing import TYPE_CHECKING, List, Dict, Any, Literal, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field
+from app.models.consumption import Consumption, ConsumptionView
+from app.settings.config import config
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from matplotlib.axes import Axes
+
+# matplotlib、numpy、pandas和langchain导入较慢，第一次生成图表时才导入（见_ensure_chart_libs和_langchain_available）
+np = None
+pd = None
+Figure = None
+FigureCanvasAgg = None
+OpenAI = ChatOpenAI = HumanMessage = SystemMessage = None
+LANGCHAIN_AVAILABLE: Optional[bool] = None
+
+
+def _ensure_chart_libs():
+    """第一次生成图表时导入绘图和数据处理库，并配置Agg后端和中文字体（每个进程只执行一次）"""
+    global np, pd, Figure, FigureCanvasAgg
+    if Figure is not None:
+        return
+    import matplotlib
+    matplotlib.use('Agg')  # 使用非交互式后端
+    import numpy
+    import pandas
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as _FigureCanvasAgg
+    from matplotlib.figure import Figure as _Figure
+    
+    # 配置matplotlib字体支持中文
+    matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang SC', 'Hiragino Sans GB', 'SimHei', 'WenQuanYi Micro Hei']
+    matplotlib.rcParams['axes.unicode_minus'] = False  # 正常显示负号
+    matplotlib.rcParams['savefig.facecolor'] = 'white'  # 确保保存的图片背景是白色
+    np, pd, FigureCanvasAgg = numpy, pandas, _FigureCanvasAgg
+    Figure = _Figure
+
+
+def _langchain_available() -> bool:
+    """第一次需要LLM时导入langchain，返回是否可用"""
+    global OpenAI, ChatOpenAI, HumanMessage, SystemMessage, LANGCHAIN_AVAILABLE
+    if LANGCHAIN_AVAILABLE is None:
+        # 导入LLM相关库
+        try:
+            from langchain.llms import OpenAI
+            from langchain.chat_models import ChatOpenAI
+            from langchain.schema import HumanMessage, SystemMessage
+            LANGCHAIN_AVAILABLE = True
+        except ImportError:
+            print("警告: langchain库不可用，将使用默认图表规格")
+            LANGCHAIN_AVAILABLE = False
+    return LANGCHAIN_AVAILABLE
+
+
+# 模型输出中JSON对象的起始位置
+_JSON_START = re.compile(r"\{")
+_JSON_DECODER = json.JSONDecoder()
+
+# 可用于分组的列及其中文名称
+_GROUP_COLUMNS = {
+    'category': '类别',
+    'merchant_name': '商家',
+    'transaction_type': '交易类型',
+    'transaction_date': '交易日期',
+    'transaction_month': '交易月份',
+}
+# 聚合方式的中文名称
+_AGG_LABELS = {'sum': '金额合计', 'count': '笔数', 'mean': '平均金额'}
+
+
+class ChartSpec(BaseModel):
+    """大模型输出的图表规格，由预置的绘图模板渲染，不执行任何生成的代码"""
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
+    chart_type: Literal['bar', 'pie', 'line'] = Field(description="图表类型：柱状图/饼图/折线图")
+    x: Literal['category', 'merchant_name', 'transaction_type', 'transaction_date', 'transaction_month'] = Field(
+        description="分组列"
+    )
+    agg: Literal['sum', 'count', 'mean'] = Field('sum', description="对金额的聚合方式")
+    filters: Dict[Literal['category', 'merchant_name', 'transaction_type'], str] = Field(
+        default_factory=dict, description="按列取值相等筛选"
+    )
+    top_n: Optional[int] = Field(None, ge=1, le=50, description="只保留聚合值最大的前N组（折线图不适用）")
+    title: str = Field('消费分析', max_length=100, description="图表标题")
+
+
+# 图表文件名：模块导入时间 + 进程ID + 本进程序号，同一秒内并发生成也不会重名（多工作进程共用输出目录时由进程ID区分）
+_CHART_PREFIX = str(int(time.time()))
+_CHART_SEQ = itertools.count()
+
+
+def next_chart_id() -> str:
+    """生成图表文件名中的唯一编号"""
+    return f"{_CHART_PREFIX}_{os.getpid()}_{next(_CHART_SEQ)}"
+
+
+# PNG编码参数：zlib压缩级别1，编码耗时远低于默认级别，文件略大
+_PNG_DPI = 100
+_PNG_PIL_KWARGS = {'compress_level': 1}
+
+
+def _write_png(fig: "Figure", chart_path: str):
+    """
+    将Figure编码为PNG并一次性写入文件
+    
+    Args:
+        fig: 绘制完成的Figure
+        chart_path: 图表保存路径
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=_PNG_DPI, pil_kwargs=_PNG_PIL_KWARGS)
+    with open(chart_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+
+
+# 每个线程中每种图表复用的Figure（Agg画布只创建一次，每次绘制前清空；按线程隔离，避免并发绘制同一Figure）
+_figure_cache = threading.local()
+
+
+def _chart_figure(kind: str, figsize: Tuple[int, int]) -> "Figure":
+    """
+    获取当前线程中指定种类图表复用的Figure（已清空）
+    
+    Args:
+        kind: 图表种类（图表类型或提示图）
+        figsize: 第一次创建时的图表尺寸
+    
+    Returns:
+        可直接绘制的Figure
+    """
+    figures = getattr(_figure_cache, "figures", None)
+    if figures is None:
+        figures = _figure_cache.figures = {}
+    fig = figures.get(kind)
+    if fig is None:
+        _ensure_chart_libs()
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        figures[kind] = fig
+    else:
+        fig.clear()
+    return fig
+
+
+def _save_message_chart(chart_path: str, message: str, fontsize: int = 12, color: str = 'red', title: Optional[str] = None):
+    """
+    保存只包含一行提示文字的图表（在复用的Figure上绘制，不经过pyplot的全局状态）
+    
+    Args:
+        chart_path: 图表保存路径
+        message: 提示文字
+        fontsize: 字号
+        color: 文字颜色
+        title: 图表标题
+    """
+    fig = _chart_figure('message', (10, 6))
+    ax = fig.add_subplot(111)
+    ax.text(0.5, 0.5, message, ha='center', va='center', fontsize=fontsize, color=color)
+    if title:
+        ax.set_title(title, fontsize=16)
+    ax.axis('off')
+    _write_png(fig, chart_path)
+
+
+def fast_group_sum(codes: "np.ndarray", amounts: "np.ndarray", ncat: int) -> "np.ndarray":
+    """
+    按整数分组编码对金额求和（编码由pd.factorize得到，求和由np.bincount在C循环中完成，省去groupby的构建开销）
+    
+    Args:
+        codes: 每条记录的分组编码（0到ncat-1）
+        amounts: 与codes一一对应的金额数组
+        ncat: 分组数量
+    
+    Returns:
+        各分组的金额合计，下标即分组编码
+    """
+    return np.bincount(codes, weights=amounts, minlength=ncat)
+
+
+class _ChartData:
+    """按列存储的图表数据：金额数组和各分组列的整数编码（构建后只读，不保留DataFrame和原始记录）"""
+    __slots__ = ('amounts', 'groups')
+    
+    def __init__(self, amounts: "np.ndarray", groups: Dict[str, Tuple["np.ndarray", "pd.Index"]]):
+        self.amounts = amounts
+        # 分组列 -> (每条记录的分组编码, 按键排序的分组键)
+        self.groups = groups
+    
+    def filter_mask(self, filters: Dict[str, str]) -> Optional["np.ndarray"]:
+        """
+        计算按列取值相等筛选的布尔掩码（直接比较整数编码）
+        
+        Args:
+            filters: 筛选条件
+        
+        Returns:
+            布尔掩码，没有筛选条件时为None
+        """
+        mask = None
+        for column, value in filters.items():
+            codes, keys = self.groups[column]
+            position = keys.get_indexer([value])[0]
+            matched = codes == position if position >= 0 else np.zeros(len(codes), dtype=bool)
+            mask = matched if mask is None else mask & matched
+        return mask
+
+
+def _aggregate(data: _ChartData, spec: ChartSpec) -> Tuple[List[str], "np.ndarray"]:
+    """
+    按图表规格筛选并分组聚合金额
+    
+    Args:
+        data: 按列存储的图表数据
+        spec: 图表规格
+    
+    Returns:
+        (分组标签列表, 各分组的聚合值)，折线图按分组键排序，其余按聚合值降序
+    """
+    codes, keys = data.groups[spec.x]
+    amounts = data.amounts
+    mask = data.filter_mask(spec.filters)
+    if mask is not None:
+        codes, amounts = codes[mask], amounts[mask]
+    
+    counts = np.bincount(codes, minlength=len(keys))
+    if spec.agg == 'count':
+        values = counts.astype(np.float64)
+    else:
+        values = fast_group_sum(codes, amounts, len(keys))
+    # 只保留筛选后仍有记录的分组
+    present = np.flatnonzero(counts)
+    values, keys = values[present], keys[present]
+    if spec.agg == 'mean':
+        values = values / counts[present]
+    
+    if spec.x == 'transaction_date':
+        labels = list(keys.strftime('%Y-%m-%d'))
+    else:
+        labels = [str(key) for key in keys]
+    if spec.chart_type != 'line':
+        order = np.argsort(-values, kind='stable')
+        if spec.top_n:
+            order = order[:spec.top_n]
+        labels = [labels[i] for i in order]
+        values = values[order]
+    return labels, values
+
+
+def _render_bar(ax: "Axes", spec: ChartSpec, labels: List[str], values: "np.ndarray"):
+    """绘制柱状图"""
+    bars = ax.bar(labels, values, color='#4c72b0')
+    ax.bar_label(bars, fmt='%d' if spec.agg == 'count' else '%.2f', fontsize=9)
+    ax.set_xlabel(_GROUP_COLUMNS[spec.x])
+    ax.set_ylabel(_AGG_LABELS[spec.agg])
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, axis='y', alpha=0.3)
+
+
+def _render_pie(ax: "Axes", spec: ChartSpec, labels: List[str], values: "np.ndarray"):
+    """绘制饼图"""
+    ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')  # 确保饼图是圆形的
+
+
+def _render_line(ax: "Axes", spec: ChartSpec, labels: List[str], values: "np.ndarray"):
+    """绘制折线图"""
+    ax.plot(labels, values, marker='o', linestyle='-', color='#1f77b4')
+    ax.set_xlabel(_GROUP_COLUMNS[spec.x])
+    ax.set_ylabel(_AGG_LABELS[spec.agg])
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, alpha=0.3)
+
+
+# 图表类型 -> (图表尺寸, 绘制函数)
+_CHART_RENDERERS = {
+    'bar': ((12, 6), _render_bar),
+    'pie': ((12, 8), _render_pie),
+    'line': ((12, 6), _render_line),
+}
+
+
+# 构建DataFrame时一次取出每条记录的全部字段（ORM对象和只读视图都有这些属性）
+_consumption_row = attrgetter(*ConsumptionView.FIELDS)
+
+# 空值或空字符串时使用的默认值
+_COLUMN_DEFAULTS = {'category': '未分类', 'transaction_type': '支出', 'merchant_name': '未知'}
+
+# 每个生成器缓存的消费记录列表数量（同一批数据连续生成多张图表时复用已构建的图表数据）
+_DATA_CACHE_SIZE = 4
 
 class DynamicChartGenerator:
     """
-    动态图表生成器类，允许执行大模型生成的Python代码来创建自定义图表
+    动态图表生成器类，由大模型根据分析需求给出图表规格，再用预置的绘图模板渲染
     """
     
     def __init__(self, output_dir: str):
@@ -42,7 +314,11 @@ class DynamicChartGenerator:
         """
         self.output_dir = output_dir
         self._ensure_output_dir_exists()
-        self.llm = self._init_llm() if LANGCHAIN_AVAILABLE else None
+        # 图表数据缓存：(id(consumptions), len(consumptions)) -> (consumptions, 图表数据)
+        # 同时持有列表引用，保证列表存活期间id不会被复用
+        self._data_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._data_cache_lock = threading.Lock()
+        self.llm = self._init_llm() if _langchain_available() else None
     
     def _ensure_output_dir_exists(self):
         """确保输出目录存在"""
@@ -50,159 +326,95 @@ class DynamicChartGenerator:
             os.makedirs(self.output_dir)
             print(f"创建图表输出目录: {self.output_dir}")
     
-    def _prepare_safe_execution_environment(self, consumptions: List[Consumption]) -> Dict[str, Any]:
+    def clear_cache(self):
+        """清空图表数据缓存（消费记录列表被原地修改后调用）"""
+        self._data_cache.clear()
+    
+    def _prepare_chart_data(self, consumptions: List[Consumption]) -> _ChartData:
         """
-        准备安全的执行环境，提供必要的工具和数据
+        获取消费记录的图表数据，同一消费记录列表重复生成图表时复用已构建的数据
         
         Args:
             consumptions: 消费记录列表
-            
+        
         Returns:
-            安全的执行环境字典
+            按列存储的图表数据（只读）
         """
-        # 将消费数据转换为pandas DataFrame便于操作
-        data = []
-        for consumption in consumptions:
-            data.append({
-                'id': consumption.id,
-                'user_id': getattr(consumption, 'user_id', None),
-                'amount': float(consumption.amount),
-                'category': consumption.category or '未分类',
-                'description': getattr(consumption, 'description', '') or '',
-                'transaction_time': consumption.transaction_time,
-                'transaction_type': consumption.transaction_type or '支出',
-                'payment_method': getattr(consumption, 'payment_method', '') or '其他',
-                'merchant_name': consumption.merchant_name or '未知'
-            })
-        
-        df = pd.DataFrame(data)
-        df['transaction_date'] = pd.to_datetime(df['transaction_time']).dt.date
-        df['transaction_month'] = pd.to_datetime(df['transaction_time']).dt.to_period('M')
-        
-        # 安全的执行环境，只提供必要的库和数据
-        safe_env = {
-            'os': os,
-            'plt': plt,
-            'np': np,
-            'pd': pd,
-            'datetime': datetime,
-            'consumptions': consumptions,
-            'df': df,
-            'output_dir': self.output_dir,
-            'chart_filename': '',  # 将由生成的代码设置
-            'plt.figure': plt.figure,
-            'plt.savefig': plt.savefig,
-            'plt.close': plt.close,
-            'plt.tight_layout': plt.tight_layout,
-            '__builtins__': {
-                'abs': abs,
-                'all': all,
-                'any': any,
-                '__import__': __import__,  # 添加__import__函数以支持图表代码执行
-                'bool': bool,
-                'dict': dict,
-                'float': float,
-                'int': int,
-                'len': len,
-                'list': list,
-                'max': max,
-                'min': min,
-                'range': range,
-                'round': round,
-                'sorted': sorted,
-                'str': str,
-                'sum': sum,
-                'tuple': tuple,
-                'zip': zip,
-                'print': print,
-                'Exception': Exception,
-                'ValueError': ValueError,
-                'KeyError': KeyError,
-                'TypeError': TypeError,
-            }
-        }
-        
-        return safe_env
+        key = (id(consumptions), len(consumptions))
+        with self._data_cache_lock:
+            cached = self._data_cache.get(key)
+            if cached is not None and cached[0] is consumptions:
+                self._data_cache.move_to_end(key)
+                return cached[1]
+            data = self._build_chart_data(consumptions)
+            self._data_cache[key] = (consumptions, data)
+            if len(self._data_cache) > _DATA_CACHE_SIZE:
+                self._data_cache.popitem(last=False)
+            return data
     
-    def _extract_chart_filename(self, code: str) -> str:
+    def _build_chart_data(self, consumptions: List[Consumption]) -> _ChartData:
         """
-        从代码中提取图表文件名，如果没有则生成默认名称
+        将消费记录转换为按列存储的图表数据：先构建pandas DataFrame完成默认值填充和时间解析，
+        再一次性对各分组列编码，只保留NumPy数组
         
         Args:
-            code: Python代码字符串
-            
+            consumptions: 消费记录列表
+        
         Returns:
-            图表文件名
+            按列存储的图表数据
         """
-        import re
-        # 尝试从代码中提取文件名设置
-        match = re.search(r'chart_filename\s*=\s*[\'"]([^\'"]*)[\'"]', code)
-        if match:
-            return match.group(1)
+        _ensure_chart_libs()
+        
+        # 用attrgetter一次取出每条记录的字段元组后构建pandas DataFrame，默认值按列批量填充
+        df = pd.DataFrame([_consumption_row(c) for c in consumptions], columns=list(ConsumptionView.FIELDS))
+        df['amount'] = df['amount'].astype(float)
+        # 类别、交易类型、商家取值很少，填充默认值后存为分类类型，编码时直接使用分类编码
+        for column, default in _COLUMN_DEFAULTS.items():
+            df[column] = df[column].replace('', None).fillna(default).astype('category')
+        # 交易时间只解析一次，日期和月份共用同一个Series；带时区时按本地时间取日期
+        transaction_time = pd.to_datetime(df['transaction_time'], cache=True)
+        if transaction_time.dt.tz is not None:
+            transaction_time = transaction_time.dt.tz_localize(None)
+        # 日期列使用datetime64数组而不是逐行的datetime.date对象，分组时按整数哈希
+        df['transaction_date'] = transaction_time.values.astype('datetime64[D]')
+        df['transaction_month'] = transaction_time.dt.to_period('M')
         
-        # 生成默认文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"dynamic_chart_{timestamp}.png"
+        groups = {column: pd.factorize(df[column], sort=True) for column in _GROUP_COLUMNS}
+        return _ChartData(df['amount'].to_numpy(), groups)
     
-    def execute_chart_code(self, code: str, consumptions: List[Consumption]) -> str:
+    def render_chart_spec(self, spec: ChartSpec, consumptions: List[Consumption]) -> str:
         """
-        安全执行大模型生成的图表代码
+        按图表规格用预置的绘图模板渲染图表（在当前线程复用的Figure上绘制，不经过pyplot的全局状态）
         
         Args:
-            code: Python代码字符串
+            spec: 图表规格
             consumptions: 消费记录列表
-            
+        
         Returns:
             生成的图表文件路径
         """
-        # 准备安全的执行环境
-        env = self._prepare_safe_execution_environment(consumptions)
-        
-        # 提取或生成图表文件名
-        chart_filename = self._extract_chart_filename(code)
-        env['chart_filename'] = chart_filename
+        chart_filename = f"chart_{spec.chart_type}_{spec.x}_{next_chart_id()}.png"
         chart_path = os.path.join(self.output_dir, chart_filename)
         
-        # 执行代码，捕获输出和错误
-        stdout = io.StringIO()
-        stderr = io.StringIO()
-        error_occurred = False
-        
         try:
-            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
-                # 安全执行代码
-                exec(code, env)
-                
-                # 如果代码没有保存图表，则自动保存
-                if not os.path.exists(chart_path):
-                    plt.savefig(chart_path)
-                    print(f"自动保存图表到: {chart_path}")
+            labels, values = _aggregate(self._prepare_chart_data(consumptions), spec)
+            if not labels:
+                _save_message_chart(chart_path, '筛选后没有可用的消费数据', fontsize=14, color='#666666', title=spec.title)
+                return chart_path
+            
+            figsize, render = _CHART_RENDERERS[spec.chart_type]
+            fig = _chart_figure(spec.chart_type, figsize)
+            ax = fig.add_subplot(111)
+            render(ax, spec, labels, values)
+            ax.set_title(spec.title)
+            fig.tight_layout()
+            _write_png(fig, chart_path)
         except Exception as e:
-            error_occurred = True
-            print(f"执行图表代码时出错: {str(e)}")
-            print(traceback.format_exc())
-        finally:
-            # 确保关闭图表
-            plt.close('all')
-        
-        # 获取执行输出
-        stdout_content = stdout.getvalue()
-        stderr_content = stderr.getvalue()
-        
-        if stdout_content:
-            print(f"图表代码执行输出: {stdout_content}")
-        if stderr_content:
-            print(f"图表代码执行错误: {stderr_content}")
-        
-        # 检查图表是否成功生成
-        if error_occurred or not os.path.exists(chart_path):
+            print(f"渲染图表时出错: {str(e)}")
+            if config.CHART_DEBUG:
+                print(traceback.format_exc())
             # 生成一个错误提示图表
-            plt.figure(figsize=(10, 6))
-            plt.text(0.5, 0.5, f"图表生成失败\n错误: {str(e)[:100]}..." if error_occurred else "图表未生成", 
-                    ha='center', va='center', fontsize=12, color='red')
-            plt.axis('off')
-            plt.savefig(chart_path)
-            plt.close()
+            _save_message_chart(chart_path, f"图表生成失败\n错误: {str(e)[:100]}...")
             print(f"已生成错误提示图表: {chart_path}")
         
         return chart_path
@@ -226,18 +438,18 @@ class DynamicChartGenerator:
                 print(f"初始化OpenAI失败: {str(e2)}")
                 return None
     
-    def _generate_chart_code_with_llm(self, analysis_needs: str, sample_data: List[Dict[str, Any]]) -> str:
+    def _generate_chart_spec_with_llm(self, analysis_needs: str, sample_data: List[Dict[str, Any]]) -> ChartSpec:
         """
-        使用LLM生成图表代码
+        使用LLM生成图表规格
         
         Args:
             analysis_needs: 用户的分析需求
             sample_data: 示例数据
-            
+        
         Returns:
-            生成的Python代码
+            图表规格（模型输出无法解析时返回默认规格）
         """
-        prompt = self.generate_chart_code_prompt(analysis_needs, sample_data)
+        prompt = self.generate_chart_spec_prompt(analysis_needs, sample_data)
         
         try:
             # 根据LLM类型生成响应
@@ -248,76 +460,37 @@ class DynamicChartGenerator:
                     HumanMessage(content=prompt)
                 ]
                 response = self.llm(messages)
-                code = response.content
+                content = response.content
             else:
                 # 传统OpenAI模型
-                code = self.llm(prompt)
+                content = self.llm(prompt)
             
-            # 清理代码（去除可能的代码块标记）
-            import re
-            code = re.sub(r'^```python\n|```$', '', code, flags=re.MULTILINE)
-            return code
+            # 从第一个"{"开始解析JSON对象（忽略代码块标记和前后的说明文字）
+            match = _JSON_START.search(content)
+            if match is None:
+                raise ValueError("模型输出中没有JSON对象")
+            spec_data, _ = _JSON_DECODER.raw_decode(content, match.start())
+            return ChartSpec.model_validate(spec_data)
         except Exception as e:
-            print(f"使用LLM生成图表代码失败: {str(e)}")
-            # 返回默认图表代码
-            return self._get_default_chart_code(analysis_needs)
+            print(f"使用LLM生成图表规格失败: {str(e)}")
+            # 返回默认图表规格
+            return self._get_default_chart_spec(analysis_needs)
     
-    def _get_default_chart_code(self, analysis_needs: str) -> str:
+    def _get_default_chart_spec(self, analysis_needs: str) -> ChartSpec:
         """
-        获取默认图表代码
+        获取默认图表规格
         
         Args:
             analysis_needs: 用户的分析需求
-            
+        
         Returns:
-            默认的Python代码
+            默认的图表规格
         """
-        chart_type = "category" if "类别" in analysis_needs or "分类" in analysis_needs else "trend"
-        
-        if chart_type == "category":
-            return """
-# 创建消费类别分布图
-plt.figure(figsize=(12, 8))
-category_counts = df['category'].value_counts()
-category_amounts = df.groupby('category')['amount'].sum().sort_values(ascending=False)
-
-# 创建饼图
-plt.pie(category_amounts, labels=category_amounts.index, autopct='%1.1f%%', startangle=90)
-plt.title('消费类别分布')
-plt.axis('equal')  # 确保饼图是圆形的
-
-# 设置文件名
-chart_filename = f"chart_category_distribution_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-
-# 保存图表
-plt.tight_layout()
-plt.savefig(os.path.join(output_dir, chart_filename))
-plt.close()
-            """
-        else:
-            return """
-# 创建消费趋势图
-plt.figure(figsize=(12, 6))
-
-# 按日期分组并计算每日总消费
-daily_spending = df.groupby('transaction_date')['amount'].sum().reset_index()
-
-# 绘制趋势线
-plt.plot(daily_spending['transaction_date'], daily_spending['amount'], marker='o', linestyle='-', color='#1f77b4')
-plt.title('消费趋势分析')
-plt.xlabel('日期')
-plt.ylabel('消费金额')
-plt.grid(True, alpha=0.3)
-plt.xticks(rotation=45)
-
-# 设置文件名
-chart_filename = f"chart_spending_trend_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-
-# 保存图表
-plt.tight_layout()
-plt.savefig(os.path.join(output_dir, chart_filename))
-plt.close()
-            """
+        if "类别" in analysis_needs or "分类" in analysis_needs:
+            # 消费类别分布饼图
+            return ChartSpec(chart_type='pie', x='category', title='消费类别分布')
+        # 每日消费趋势折线图
+        return ChartSpec(chart_type='line', x='transaction_date', title='消费趋势分析')
     
     def generate_charts_by_needs(self, consumptions: List[Consumption], analysis_needs: str) -> Dict[str, str]:
         """
@@ -326,38 +499,40 @@ plt.close()
         Args:
             consumptions: 消费记录列表
             analysis_needs: 用户的分析需求
-            
+        
         Returns:
             图表路径字典
         """
-        print(f"根据分析需求生成图表: {analysis_needs}")
+        if config.CHART_DEBUG:
+            print(f"根据分析需求生成图表: {analysis_needs}")
         
         # 如果没有数据，创建空图表
         if not consumptions:
             print("警告：没有消费数据，创建空数据集默认图表")
             return self._create_empty_data_chart()
         
-        # 准备示例数据（用于提示词）
-        sample_data = []
-        for consumption in consumptions[:3]:  # 只取前3条作为示例
-            sample_data.append({
-                'amount': consumption.amount,
-                'category': consumption.category,
-                'transaction_time': consumption.transaction_time.isoformat() if consumption.transaction_time else '',
-                'merchant_name': consumption.merchant_name
-            })
-        
-        # 生成图表代码
-        if LANGCHAIN_AVAILABLE and self.llm:
-            chart_code = self._generate_chart_code_with_llm(analysis_needs, sample_data)
+        # 生成图表规格
+        if self.llm:
+            # 准备示例数据（用于提示词，只取前3条作为示例）
+            sample_data = [
+                {
+                    'amount': consumption.amount,
+                    'category': consumption.category,
+                    'transaction_time': consumption.transaction_time.isoformat() if consumption.transaction_time else '',
+                    'merchant_name': consumption.merchant_name
+                }
+                for consumption in consumptions[:3]
+            ]
+            spec = self._generate_chart_spec_with_llm(analysis_needs, sample_data)
         else:
             # 使用备用方法
-            chart_code = self._get_default_chart_code(analysis_needs)
+            spec = self._get_default_chart_spec(analysis_needs)
         
-        print(f"生成的图表代码:\n{chart_code}")
+        if config.CHART_DEBUG:
+            print(f"生成的图表规格: {spec.model_dump_json()}")
         
-        # 执行图表代码
-        chart_path = self.execute_chart_code(chart_code, consumptions)
+        # 按规格渲染图表
+        chart_path = self.render_chart_spec(spec, consumptions)
         
         # 返回图表路径字典
         return {'main_chart': chart_path}
@@ -369,71 +544,46 @@ plt.close()
         Returns:
             图表路径字典
         """
-        plt.figure(figsize=(10, 6))
-        plt.text(0.5, 0.5, '没有可用的消费数据', ha='center', va='center', fontsize=14, color='#666666')
-        plt.title('无数据可视化', fontsize=16)
-        plt.axis('off')
-        
         # 保存图表
-        chart_filename = f"chart_no_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+        chart_filename = f"chart_no_data_{next_chart_id()}.png"
         chart_path = os.path.join(self.output_dir, chart_filename)
-        plt.savefig(chart_path)
-        plt.close()
+        _save_message_chart(chart_path, '没有可用的消费数据', fontsize=14, color='#666666', title='无数据可视化')
         
         return {'empty_data_chart': chart_path}
     
-    def generate_chart_code_prompt(self, analysis_needs: str, sample_data: List[Dict[str, Any]]) -> str:
+    def generate_chart_spec_prompt(self, analysis_needs: str, sample_data: List[Dict[str, Any]]) -> str:
         """
-        生成用于让大模型创建图表代码的提示词
+        生成用于让大模型给出图表规格的提示词
         
         Args:
             analysis_needs: 用户的分析需求
             sample_data: 示例数据（用于让模型了解数据结构）
-            
+        
         Returns:
             提示词字符串
         """
         return f"""
-作为Python数据可视化专家，请根据用户的分析需求，生成用于创建相关图表的Python代码。
+作为数据可视化专家，请根据用户的分析需求，给出最能体现该需求的一张图表的规格。
 
 用户分析需求: {analysis_needs}
 
-可用的数据结构:
-- df: pandas DataFrame，包含消费记录数据
-- consumptions: 原始消费记录对象列表
-
-数据字段说明:
-- df包含以下列: id, user_id, amount(金额), category(类别), description(描述), transaction_time(交易时间), 
-  'transaction_type(交易类型: 收入/支出), payment_method(支付方式), merchant_name(商家), transaction_date(交易日期), transaction_month(交易月份)
-
-代码要求:
-1. 只生成完整的Python代码，不要添加其他解释
-2. 确保代码能够安全执行，不要引入外部依赖
-3. 创建与用户分析需求直接相关的可视化图表
-4. 设置有意义的标题、标签和图例
-5. 使用美观的配色方案
-6. 指定图表文件名，格式为: chart_<图表类型>_<时间戳>.png
-7. 必须保存图表到环境变量中的output_dir目录
-8. 代码示例结构:
-```python
-# 创建图表
-plt.figure(figsize=(10, 6))
-# 绘制图表的代码...
-plt.title('有意义的标题')
-plt.xlabel('X轴标签')
-plt.ylabel('Y轴标签')
-plt.legend()
-
-# 设置文件名
-chart_filename = f"chart_<图表类型>_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-
-# 保存图表
-plt.tight_layout()
-plt.savefig(os.path.join(output_dir, chart_filename))
-plt.close()
-```
-
-请生成与用户需求{analysis_needs}最相关的图表代码。
+示例数据: {json.dumps(sample_data, ensure_ascii=False, default=str)}
+
+规格字段说明:
+- chart_type: 图表类型，可选 "bar"(柱状图)、"pie"(饼图)、"line"(折线图，适合按日期或月份展示趋势)
+- x: 分组列，可选 "category"(类别)、"merchant_name"(商家)、"transaction_type"(交易类型: 收入/支出)、
+  "transaction_date"(交易日期)、"transaction_month"(交易月份)
+- agg: 对金额的聚合方式，可选 "sum"(合计)、"count"(笔数)、"mean"(平均)，默认 "sum"
+- filters: 按列取值相等筛选，键可选 "category"、"merchant_name"、"transaction_type"，例如 {{"category": "餐饮"}}
+- top_n: 只保留聚合值最大的前N组（1-50，可省略，折线图不适用）
+- title: 有意义的中文图表标题
+
+输出要求:
+1. 只输出一个JSON对象，不要添加其他解释
+2. 示例:
+{{"chart_type": "bar", "x": "merchant_name", "agg": "sum", "filters": {{"category": "餐饮"}}, "top_n": 10, "title": "餐饮消费商家排行"}}
+
+请给出与用户需求{analysis_needs}最相关的图表规格。
 """
 
 
@@ -449,4 +599,4 @@ def get_dynamic_chart_generator(workspace_dir: str) -> DynamicChartGenerator:
         动态图表生成器实例
     """
     charts_dir = os.path.join(workspace_dir, 'charts')
-    return DynamicChartGenerator(charts_dir)
\ No newline at end of file
+    return DynamicChartGenerator(charts_dir)
@@ -9,40 +9,68 @@ import asyncpg
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
 from tortoise import Tortoise, run_async
-from app.database import DB_CONFIG, db_settings
+from app.database import DB_CONFIG, db_settings, apply_schema
 from app.models import *  # 导入所有模型
 
 
-async def create_database_if_not_exists():
+# 管理命令共用的asyncpg连接池（按数据库名区分），同一命令内多次访问同一数据库时不必重复建连和认证
+_pools = {}
+
+
+async def _get_pool(database: str) -> asyncpg.Pool:
     """
-    如果数据库不存在，则创建数据库
+    获取指定数据库的管理连接池（第一次使用时创建）
+    
+    Args:
+        database: 数据库名
+    
+    Returns:
+        asyncpg连接池
     """
-    try:
-        print(f"检查数据库 '{db_settings.database_name}' 是否存在...")
-        
-        # 先尝试连接到postgres默认数据库
-        conn = await asyncpg.connect(
+    pool = _pools.get(database)
+    if pool is None:
+        pool = await asyncpg.create_pool(
             host=db_settings.database_host,
             port=db_settings.database_port,
             user=db_settings.database_user,
             password=db_settings.database_password,
-            database='postgres'  # 使用默认的postgres数据库
+            database=database,
+            min_size=1,
+            max_size=4
         )
+        _pools[database] = pool
+    return pool
+
+
+async def close_pools():
+    """关闭管理命令的连接池（连接池绑定事件循环，每个命令结束前调用）"""
+    while _pools:
+        _, pool = _pools.popitem()
+        await pool.close()
+
+
+async def create_database_if_not_exists():
+    """
+    如果数据库不存在，则创建数据库
+    """
+    try:
+        print(f"检查数据库 '{db_settings.database_name}' 是否存在...")
         
-        # 检查数据库是否存在
-        result = await conn.fetchval(
-            "SELECT 1 FROM pg_database WHERE datname = $1",
-            db_settings.database_name
-        )
-        
-        if not result:
-            print(f"数据库 '{db_settings.database_name}' 不存在，正在创建...")
-            await conn.execute(f"CREATE DATABASE {db_settings.database_name}")
-            print(f"数据库 '{db_settings.database_name}' 创建成功！")
-        else:
-            print(f"数据库 '{db_settings.database_name}' 已存在")
-        
-        await conn.close()
+        # 先尝试连接到postgres默认数据库
+        pool = await _get_pool('postgres')  # 使用默认的postgres数据库
+        async with pool.acquire() as conn:
+            # 检查数据库是否存在
+            result = await conn.fetchval(
+                "SELECT 1 FROM pg_database WHERE datname = $1",
+                db_settings.database_name
+            )
+            
+            if not result:
+                print(f"数据库 '{db_settings.database_name}' 不存在，正在创建...")
+                await conn.execute(f"CREATE DATABASE {db_settings.database_name}")
+                print(f"数据库 '{db_settings.database_name}' 创建成功！")
+            else:
+                print(f"数据库 '{db_settings.database_name}' 已存在")
         return True
     except Exception as e:
         print(f"创建数据库失败: {e}")
@@ -56,6 +84,7 @@ def init_db_schemas():
     async def _init_db():
         # 先检查并创建数据库
         await create_database_if_not_exists()
+        await close_pools()
         
         print("正在连接数据库...")
         
@@ -64,7 +93,7 @@ def init_db_schemas():
         
         # 创建或更新数据库表结构
         print("开始创建数据库表结构...")
-        await Tortoise.generate_schemas()
+        await apply_schema()
         print("数据库表结构创建完成！")
         
         # 关闭连接
@@ -102,7 +131,7 @@ def drop_and_recreate_db():
         
         # 重新创建表结构
         print("正在重新创建数据库表结构...")
-        await Tortoise.generate_schemas()
+        await apply_schema()
         print("数据库表结构重新创建完成！")
         
         # 关闭连接
@@ -129,15 +158,9 @@ async def check_db_connection():
         print("正在测试数据库连接...")
         
         # 先尝试直接连接数据库
-        conn = await asyncpg.connect(
-            host=db_settings.database_host,
-            port=db_settings.database_port,
-            user=db_settings.database_user,
-            password=db_settings.database_password,
-            database=db_settings.database_name
-        )
-        await conn.fetchval("SELECT 1")
-        await conn.close()
+        pool = await _get_pool(db_settings.database_name)
+        async with pool.acquire() as conn:
+            await conn.fetchval("SELECT 1")
         
         print("数据库连接正常！")
         
@@ -151,6 +174,8 @@ async def check_db_connection():
     except Exception as e:
         print(f"数据库连接失败: {e}")
         return False
+    finally:
+        await close_pools()
 
 
 def list_models():
@@ -174,6 +199,26 @@ def list_models():
     run_async(_list_models())
 
 
+def backfill_daily_agg():
+    """
+    根据现有消费记录回填消费日汇总表（首次部署日汇总表或数据修复时执行）
+    """
+    async def _backfill():
+        from app.database import init_db, close_db
+        from app.dao.consumption_dao import ConsumptionDAO
+        
+        # 使用应用的连接管理初始化（同时生成日汇总表结构），DAO不会重复初始化
+        await init_db()
+        
+        print("正在根据消费记录重建日汇总表...")
+        count = await ConsumptionDAO.rebuild_daily_agg()
+        print(f"日汇总表重建完成，共 {count} 行")
+        
+        await close_db()
+    
+    run_async(_backfill())
+
+
 if __name__ == "__main__":
     """
     命令行入口
@@ -186,6 +231,7 @@ if __name__ == "__main__":
     - drop   : 删除并重新创建数据库表结构（谨慎使用）
     - check  : 检查数据库连接
     - models : 列出所有注册的模型
+    - backfill : 根据消费记录回填消费日汇总表
     """
     
     # 获取命令行参数
@@ -208,6 +254,8 @@ if __name__ == "__main__":
         run_async(check_db_connection())
     elif command == "models":
         list_models()
+    elif command == "backfill":
+        backfill_daily_agg()
     else:
         print("未知命令")
         print("\n使用方式：")
@@ -216,4 +264,5 @@ if __name__ == "__main__":
         print("- create 或不提供参数: 创建或更新数据库表结构")
         print("- drop   : 删除并重新创建数据库表结构（谨慎使用）")
         print("- check  : 检查数据库连接")
-        print("- models : 列出所有注册的模型")
\ No newline at end of file
+        print("- models : 列出所有注册的模型")
+        print("- backfill : 根据消费记录回填消费日汇总表")
\ No newline at end of file
@@ -37,11 +37,29 @@ def run_fastapi_server():
         print(f"API文档: http://{config.HOST}:{config.PORT}/docs")
         print(f"重新加载: {config.DEBUG}")
         
+        # 图表生成等CPU密集的请求在多个工作进程间分摊；自动重载只支持单进程
+        # 各进程的缓存（计数、用户、图表生成器）相互独立，均为可重建的只读缓存
+        if config.DEBUG:
+            workers = 1
+        else:
+            workers = config.WORKERS or max(2, (os.cpu_count() or 2) // 2)
+        print(f"工作进程数: {workers}")
+        # 工作进程按实际进程数平分CPU核数和数据库连接数
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+        
+        if workers > 1 and config.DATABASE_GENERATE_SCHEMAS:
+            # 建表脚本在启动工作进程前执行一次，工作进程启动时不再重复执行DDL
+            import asyncio
+            from app.database import init_schema
+            asyncio.run(init_schema())
+            os.environ["DATABASE_GENERATE_SCHEMAS"] = "False"
+        
         uvicorn.run(
             "app:app",
             host=config.HOST,
             port=config.PORT,
-            reload=config.DEBUG
+            reload=config.DEBUG,
+            workers=workers
         )
     except ImportError as e:
         print(f"导入错误: {e}")
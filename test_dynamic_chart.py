@@ -5,6 +5,7 @@
 """
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from app.models.consumption import Consumption
 from app.utils.dynamic_chart_generator import get_dynamic_chart_generator
@@ -59,21 +60,30 @@ def main():
         "比较不同类别的消费金额"
     ]
     
-    for i, need in enumerate(test_needs):
-        print(f"\n=== 测试 {i+1}: {need} ===")
+    def generate(need):
+        """生成单个需求的图表（在线程池中执行，LLM调用和图表渲染可以重叠）"""
         try:
-            # 生成图表
-            chart_paths = dynamic_chart_generator.generate_charts_by_needs(consumptions, need)
-            print(f"生成的图表路径: {chart_paths}")
-            
-            # 检查图表文件是否存在
-            for chart_name, chart_path in chart_paths.items():
-                if os.path.exists(chart_path):
-                    print(f"✓ 图表 {chart_name} 已成功生成: {os.path.basename(chart_path)}")
-                else:
-                    print(f"✗ 图表 {chart_name} 生成失败: {chart_path}")
+            return dynamic_chart_generator.generate_charts_by_needs(consumptions, need), None
         except Exception as e:
-            print(f"生成图表时出错: {str(e)}")
+            return None, e
+    
+    # 三个需求相互独立，并发生成图表
+    with ThreadPoolExecutor(max_workers=len(test_needs)) as executor:
+        results = list(executor.map(generate, test_needs))
+    
+    for i, (need, (chart_paths, error)) in enumerate(zip(test_needs, results)):
+        print(f"\n=== 测试 {i+1}: {need} ===")
+        if error is not None:
+            print(f"生成图表时出错: {str(error)}")
+            continue
+        print(f"生成的图表路径: {chart_paths}")
+        
+        # 检查图表文件是否存在
+        for chart_name, chart_path in chart_paths.items():
+            if os.path.exists(chart_path):
+                print(f"✓ 图表 {chart_name} 已成功生成: {os.path.basename(chart_path)}")
+            else:
+                print(f"✗ 图表 {chart_name} 生成失败: {chart_path}")
     
     print("\n===== 测试完成 =====")
 
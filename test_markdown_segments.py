@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试Markdown分段转换：逐段转换后拼接的HTML应与整篇转换的结果一致
+"""
+from app.agents.mcp_tool import _MARKDOWN_PARSER, _split_markdown_segments
+
+# 覆盖需要合并或不能拆分的情况
+SAMPLES = {
+    "普通段落和标题": "# 标题\n\n第一段\n\n## 小节\n\n第二段",
+    "空行分隔的列表": "- 第一项\n\n- 第二项\n\n  续行\n\n结尾",
+    "带空行的代码块": "```python\nx = 1\n\ny = 2\n```\n\n正文",
+    "链接引用定义": "See [report][1].\n\n[1]: http://example.com",
+    "带空行的style块": "<style>\np { color: red; }\n\nh1 { color: blue; }\n</style>\n\n正文",
+    "带空行的pre块": "<pre>\n第一行\n\n第二行\n</pre>\n\n正文",
+    "带空行的注释": "<!-- 注释\n\n仍是注释 -->\n\n正文",
+    "表格": "| 分类 | 金额 |\n| --- | --- |\n| 餐饮 | 10 |\n\n正文",
+}
+
+
+def render_segmented(markdown_content):
+    """逐段转换后拼接"""
+    return "".join(_MARKDOWN_PARSER.render(segment) for segment in _split_markdown_segments(markdown_content))
+
+
+def test_segmented_render_matches_whole_render():
+    """逐段转换与整篇转换结果一致"""
+    for name, markdown_content in SAMPLES.items():
+        assert render_segmented(markdown_content) == _MARKDOWN_PARSER.render(markdown_content), name
+
+
+def main():
+    """主函数"""
+    print("===== 测试Markdown分段转换 =====")
+    for name, markdown_content in SAMPLES.items():
+        same = render_segmented(markdown_content) == _MARKDOWN_PARSER.render(markdown_content)
+        print(f"{'✓' if same else '✗'} {name}")
+    print("\n===== 测试完成 =====")
+
+if __name__ == "__main__":
+    main()